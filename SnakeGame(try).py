@@ -5,7 +5,12 @@ Last modification in January 2024 by José Carlos Pulido
 Machine Learning Classes - University Carlos III of Madrid
 """
 
-import pygame, sys, time, random
+import pygame, sys, time
+from snake_engine import FRAME_SIZE_X, FRAME_SIZE_Y, SnakeEngine, get_safe_moves
+from policies import move_flood_fill
+from renderer import Renderer, font as cached_font
+from game_loop import GameLoop
+from instrumentation import Instrumentation
 
 
 # DIFFICULTY settings
@@ -16,9 +21,20 @@ import pygame, sys, time, random
 # Impossible->  120
 DIFFICULTY = 440
 
-# Window size
-FRAME_SIZE_X = 480
-FRAME_SIZE_Y = 480
+# DIFFICULTY is the simulation rate (ticks per second); the screen is refreshed
+# at most RENDER_FPS times per second, skipping frames when the game falls behind.
+# With UNCAPPED the game runs as fast as possible and is still drawn RENDER_FPS
+# times per second
+RENDER_FPS = 60
+UNCAPPED = False
+
+# Time spent in every phase of a tick, summarised (p50/p95/p99) every
+# INSTRUMENT_EVERY seconds and optionally appended to INSTRUMENT_DUMP as JSON lines.
+# VERBOSE prints the whole game state every tick (slow on long games)
+INSTRUMENT = True
+INSTRUMENT_EVERY = 5.0
+INSTRUMENT_DUMP = None
+VERBOSE = False
 
 # Colors (R, G, B)
 BLACK = pygame.Color(51, 51, 51)
@@ -27,22 +43,10 @@ RED = pygame.Color(204, 51, 0)
 GREEN = pygame.Color(204, 255, 153)
 BLUE = pygame.Color(0, 51, 102)
 
-# GAME STATE CLASS
-class GameState:
-    def __init__(self, FRAME_SIZE):
-        self.snake_pos = [100, 50]
-        self.snake_body = [[100, 50], [100-10, 50], [100-(2*10), 50]]
-        self.food_pos = [random.randrange(1, (FRAME_SIZE[0]//10)) * 10, random.randrange(1, (FRAME_SIZE[1]//10)) * 10]
-        self.food_spawn = True
-        self.direction = 'RIGHT'
-        self.change_to = self.direction
-        self.score = 0
-        self.outcome = "continue"
-
 # Game Over
 def game_over(game):
     print_line_data(game)
-    my_font = pygame.font.SysFont('times new roman', 90)
+    my_font = cached_font('times new roman', 90)
     game_over_surface = my_font.render('YOU DIED', True, WHITE)
     game_over_rect = game_over_surface.get_rect()
     game_over_rect.midtop = (FRAME_SIZE_X/2, FRAME_SIZE_Y/4)
@@ -50,13 +54,14 @@ def game_over(game):
     game_window.blit(game_over_surface, game_over_rect)
     show_score(game, 0, WHITE, 'times', 20)
     pygame.display.flip()
+    timings.close()
     time.sleep(3)
     pygame.quit()
     sys.exit()
 
 # Score
 def show_score(game, choice, color, font, size):
-    score_font = pygame.font.SysFont(font, size)
+    score_font = cached_font(font, size)
     score_surface = score_font.render('Score : ' + str(game.score), True, color)
     score_rect = score_surface.get_rect()
     if choice == 1:
@@ -82,102 +87,6 @@ def move_keyboard(game, event):
             change_to = 'RIGHT'
     return change_to
 
-def get_safe_moves(game):
-
-    left_safe  = False
-    right_safe = False
-    up_safe    = False
-    down_safe  = False
-
-    if game.direction != 'RIGHT':
-        left_safe  = (game.snake_pos[0] - 10 >= 0) and ([game.snake_pos[0] - 10, game.snake_pos[1]] not in game.snake_body)
-    if game.direction != 'LEFT':
-        right_safe = (game.snake_pos[0] + 10 < FRAME_SIZE_X) and ([game.snake_pos[0] + 10, game.snake_pos[1]] not in game.snake_body)
-    if game.direction != 'DOWN':
-        up_safe    = (game.snake_pos[1] - 10 >= 0) and ([game.snake_pos[0], game.snake_pos[1] - 10] not in game.snake_body)
-    if game.direction != 'UP':
-        down_safe  = (game.snake_pos[1] + 10 < FRAME_SIZE_Y) and ([game.snake_pos[0], game.snake_pos[1] + 10] not in game.snake_body)
-
-    return {
-        "LEFT": left_safe,
-        "RIGHT": right_safe,
-        "UP": up_safe,
-        "DOWN": down_safe
-    }
-
-
-from collections import deque
-
-
-def simulate_move(pos, direction):
-    # Returns the new head position if a move is made in the given direction.
-    x, y = pos
-    if direction == 'UP':
-        return (x, y - 10)
-    if direction == 'DOWN':
-        return (x, y + 10)
-    if direction == 'LEFT':
-        return (x - 10, y)
-    if direction == 'RIGHT':
-        return (x + 10, y)
-    return pos
-
-
-def flood_fill_count(game, start):
-    # Counts how many free cells are reachable from start, treating snake_body as obstacles.
-    grid_w = FRAME_SIZE_X
-    grid_h = FRAME_SIZE_Y
-    cell_size = 10
-    visited = set()
-    queue = deque([start])
-    # Create a set for fast lookup of snake body cells.
-    snake_set = set(tuple(x) for x in game.snake_body)
-    count = 0
-    while queue:
-        pos = queue.popleft()
-        if pos in visited:
-            continue
-        visited.add(pos)
-        count += 1
-        for dx, dy in [(10, 0), (-10, 0), (0, 10), (0, -10)]:
-            new_pos = (pos[0] + dx, pos[1] + dy)
-            if (0 <= new_pos[0] < grid_w and 0 <= new_pos[1] < grid_h and
-                    new_pos not in snake_set and new_pos not in visited):
-                queue.append(new_pos)
-    return count
-
-
-def move_tutorial_1(game):
-    """
-    Improved AI: For every safe move from the current head position,
-    simulate the next move and count how many grid cells are reachable using flood-fill.
-    Then choose the move that maximizes the free area.
-    In case of a tie, choose the one that minimizes the Manhattan distance to the food.
-    """
-    safe_moves = get_safe_moves(game)
-    current_head = tuple(game.snake_pos)
-
-    candidates = []
-    for direction, is_safe in safe_moves.items():
-        if is_safe:
-            new_head = simulate_move(current_head, direction)
-            # Evaluate available free area after this move.
-            area = flood_fill_count(game, new_head)
-            # Manhattan distance to food (smaller is better)
-            food_distance = abs(game.food_pos[0] - new_head[0]) + abs(game.food_pos[1] - new_head[1])
-            candidates.append((direction, area, food_distance))
-
-    # If no safe move is available, fall back (this will trigger game over soon).
-    if not candidates:
-        return game.direction
-
-    # Choose the move with the largest flood fill area.
-    # In case of ties, choose the one that minimizes distance to the food.
-    candidates.sort(key=lambda item: (item[1], -item[2]), reverse=True)
-    best_move = candidates[0][0]
-    return best_move
-
-
 # PRINTING DATA FROM GAME STATE
 def print_state(game):
     print("--------GAME STATE--------")
@@ -263,15 +172,26 @@ else:
 pygame.display.set_caption('Snake Eater - Machine Learning (UC3M)')
 game_window = pygame.display.set_mode((FRAME_SIZE_X, FRAME_SIZE_Y))
 
-# FPS (frames per second) controller
-fps_controller = pygame.time.Clock()
+# Draws the board incrementally
+renderer = Renderer(game_window, background=BLUE, snake=GREEN, food=RED, text=WHITE)
+
+timings = Instrumentation(INSTRUMENT, report_every=INSTRUMENT_EVERY, dump=INSTRUMENT_DUMP)
 
 # Main logic
-game = GameState((FRAME_SIZE_X,FRAME_SIZE_Y))
-while True:
+engine = SnakeEngine((FRAME_SIZE_X, FRAME_SIZE_Y))
+game = engine.new_game()
+renderer.redraw(game)
+
 
+def handle_events():
+    with timings.phase("events"):
+        poll_events()
+
+
+def poll_events():
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            timings.close()
             pygame.quit()
             sys.exit()
         if event.type == pygame.KEYDOWN:
@@ -281,68 +201,41 @@ while True:
         # CALLING MOVE METHOD
         #game.direction = move_keyboard(game, event)
 
+
+# One simulation tick
+def tick():
+    global game
+
     # UNCOMMENT WHEN METHOD IS IMPLEMENTED
-    game.direction = move_tutorial_1(game)
+    with timings.phase("decision"):
+        game.direction = move_flood_fill(game)
 
     # Save Current State
-    print_line_data(game)
+    with timings.phase("logging"):
+        print_line_data(game)
 
 
     # Moving the snake
-    if game.direction == 'UP':
-        game.snake_pos[1] -= 10
-    if game.direction == 'DOWN':
-        game.snake_pos[1] += 10
-    if game.direction == 'LEFT':
-        game.snake_pos[0] -= 10
-    if game.direction == 'RIGHT':
-        game.snake_pos[0] += 10
-
-    # Snake body growing mechanism
-    game.snake_body.insert(0, list(game.snake_pos))
-    if game.snake_pos[0] == game.food_pos[0] and game.snake_pos[1] == game.food_pos[1]:
-        game.score += 100
-        game.food_spawn = False
-    else:
-        game.snake_body.pop()
-        game.score -= 1
-
-    # Spawning food on the screen
-    if not game.food_spawn:
-        game.food_pos = [random.randrange(1, (FRAME_SIZE_X//10)) * 10, random.randrange(1, (FRAME_SIZE_Y//10)) * 10]
-    game.food_spawn = True
-
-    # GFX
-    game_window.fill(BLUE)
-    for pos in game.snake_body:
-        # Snake body
-        # .draw.rect(play_surface, color, xy-coordinate)
-        # xy-coordinate -> .Rect(x, y, size_x, size_y)
-        pygame.draw.rect(game_window, GREEN, pygame.Rect(pos[0], pos[1], 10, 10))
-
-    # Snake food
-    pygame.draw.rect(game_window, RED, pygame.Rect(game.food_pos[0], game.food_pos[1], 10, 10))
+    with timings.phase("simulation"):
+        game, reward, done = engine.step(game, game.direction)
 
     # Game Over conditions
-    # Getting out of bounds
-    if game.snake_pos[0] < 0 or game.snake_pos[0] > FRAME_SIZE_X-10:
-        game.outcome = "gameover"
-        game_over(game)
-    if game.snake_pos[1] < 0 or game.snake_pos[1] > FRAME_SIZE_Y-10:
-        game.outcome = "gameover"
+    if done:
         game_over(game)
-    # Touching the snake body
-    for block in game.snake_body[1:]:
-        if game.snake_pos[0] == block[0] and game.snake_pos[1] == block[1]:
-            game.outcome = "gameover"
-            game_over(game)
-
-    show_score(game, 1, WHITE, 'consolas', 15)
-    # Refresh game screen
-    pygame.display.update()
-    # Refresh rate
-    fps_controller.tick(DIFFICULTY)
+
     # PRINTING STATE
-    print_state(game)
+    if VERBOSE:
+        print_state(game)
+    timings.tick()
+
+
+# GFX: repaints the cells that changed (head, tail, food) and the score,
+# and refreshes only those areas of the screen
+def render():
+    with timings.phase("render"):
+        renderer.draw(game)
 
 
+# DIFFICULTY ticks per second, at most RENDER_FPS frames per second
+loop = GameLoop(DIFFICULTY, RENDER_FPS, uncapped=UNCAPPED)
+loop.run(handle_events, tick, render)
@@ -5,13 +5,30 @@ Last modification in January 2024 by José Carlos Pulido
 Machine Learning Classes - University Carlos III of Madrid
 """
 
-import pygame, sys, time, random
-from wekaI import Weka
-
-# Initialize the Weka instance
-weka = Weka()
-weka.start_jvm()
-
+import pygame, sys, time
+from snake_engine import FRAME_SIZE_X, FRAME_SIZE_Y, SnakeEngine
+from policies import move_tutorial_1
+from features import extract, logged_features, arff_header, arff_row, LABEL_DIRECTION
+from arff_logger import ArffLogger
+from binlog import BinaryLogWriter
+from tree_engine import TreePredictor, use_compiled
+from decision_pipeline import DecisionPipeline
+from prediction_cache import PredictionCache
+from renderer import Renderer, font as cached_font
+from game_loop import GameLoop
+from instrumentation import Instrumentation
+from action_trace import TraceRecorder
+
+# Start of the process, for the startup-to-first-move report
+START_TIME = time.perf_counter()
+
+# Who plays: "weka", "tutorial" (move_tutorial_1) or "keyboard"
+# Only "weka" starts a JVM
+POLICY = "weka"
+
+# Model used by the Weka agent and the dataset it was trained on
+MODEL_PATH = "RT7.model"
+DATASET_PATH = "snake_game_log_hand.arff"
 
 # DIFFICULTY settings
 # Easy      ->  10
@@ -21,9 +38,24 @@ weka.start_jvm()
 # Impossible->  120
 DIFFICULTY = 10
 
-# Window size
-FRAME_SIZE_X = 480
-FRAME_SIZE_Y = 480
+# DIFFICULTY is the simulation rate (ticks per second); the screen is refreshed
+# at most RENDER_FPS times per second, skipping frames when the game falls behind.
+# With UNCAPPED the game runs as fast as possible and is still drawn RENDER_FPS
+# times per second
+RENDER_FPS = 60
+UNCAPPED = False
+
+# Time spent in every phase of a tick, summarised (p50/p95/p99) every
+# INSTRUMENT_EVERY seconds and optionally appended to INSTRUMENT_DUMP as JSON lines.
+# VERBOSE prints the whole game state every tick (slow on long games)
+INSTRUMENT = True
+INSTRUMENT_EVERY = 5.0
+INSTRUMENT_DUMP = None
+VERBOSE = False
+
+# The Weka agent decides on a worker thread; when it takes longer than this
+# (seconds) the tick is played by move_tutorial_1 instead of freezing the frame
+DECISION_DEADLINE = 0.5 / DIFFICULTY
 
 # Colors (R, G, B)
 BLACK = pygame.Color(51, 51, 51)
@@ -32,22 +64,12 @@ RED = pygame.Color(204, 51, 0)
 GREEN = pygame.Color(204, 255, 153)
 BLUE = pygame.Color(0, 51, 102)
 
-# GAME STATE CLASS
-class GameState:
-    def __init__(self, FRAME_SIZE):
-        self.snake_pos = [100, 50]
-        self.snake_body = [[100, 50], [100-10, 50], [100-(2*10), 50]]
-        self.food_pos = [random.randrange(1, (FRAME_SIZE[0]//10)) * 10, random.randrange(1, (FRAME_SIZE[1]//10)) * 10]
-        self.food_spawn = True
-        self.direction = 'RIGHT'
-        self.change_to = self.direction
-        self.score = 0
-        self.outcome = "continue"
-
 # Game Over
 def game_over(game):
     print_line_data(game)
-    my_font = pygame.font.SysFont('times new roman', 90)
+    if trace is not None:
+        trace.end_game(game)
+    my_font = cached_font('times new roman', 90)
     game_over_surface = my_font.render('YOU DIED', True, WHITE)
     game_over_rect = game_over_surface.get_rect()
     game_over_rect.midtop = (FRAME_SIZE_X/2, FRAME_SIZE_Y/4)
@@ -55,14 +77,16 @@ def game_over(game):
     game_window.blit(game_over_surface, game_over_rect)
     show_score(game, 0, WHITE, 'times', 20)
     pygame.display.flip()
+    close_logger()
+    close_agent()
+    timings.close()
     time.sleep(3)
-    weka.stop_jvm()
     pygame.quit()
     sys.exit()
 
 # Score
 def show_score(game, choice, color, font, size):
-    score_font = pygame.font.SysFont(font, size)
+    score_font = cached_font(font, size)
     score_surface = score_font.render('Score : ' + str(game.score), True, color)
     score_rect = score_surface.get_rect()
     if choice == 1:
@@ -88,78 +112,6 @@ def move_keyboard(game, event):
             change_to = 'RIGHT'
     return change_to
 
-def get_safe_moves(game):
-
-    left_safe  = False
-    right_safe = False
-    up_safe    = False
-    down_safe  = False
-
-    if game.direction != 'RIGHT':
-        left_safe  = (game.snake_pos[0] - 10 >= 0) and ([game.snake_pos[0] - 10, game.snake_pos[1]] not in game.snake_body)
-    if game.direction != 'LEFT':
-        right_safe = (game.snake_pos[0] + 10 < FRAME_SIZE_X) and ([game.snake_pos[0] + 10, game.snake_pos[1]] not in game.snake_body)
-    if game.direction != 'DOWN':
-        up_safe    = (game.snake_pos[1] - 10 >= 0) and ([game.snake_pos[0], game.snake_pos[1] - 10] not in game.snake_body)
-    if game.direction != 'UP':
-        down_safe  = (game.snake_pos[1] + 10 < FRAME_SIZE_Y) and ([game.snake_pos[0], game.snake_pos[1] + 10] not in game.snake_body)
-
-    return {
-        "LEFT": left_safe,
-        "RIGHT": right_safe,
-        "UP": up_safe,
-        "DOWN": down_safe
-    }
-
-
-def future_score(game):
-
-    predicted_score = game.score
-
-    next_pos = game.snake_pos[:]
-    if game.direction == 'UP':
-        next_pos[1] -= 10
-    elif game.direction == 'DOWN':
-        next_pos[1] += 10
-    elif game.direction == 'LEFT':
-        next_pos[0] -= 10
-    elif game.direction == 'RIGHT':
-        next_pos[0] += 10
-
-    if next_pos == game.food_pos:
-        predicted_score += 100
-    else:
-        predicted_score -= 1
-    return predicted_score
-
-
-
-# TODO: IMPLEMENT HERE THE NEW INTELLIGENT METHOD
-def move_tutorial_1(game):
-    change_to = game.direction
-    safe_moves = get_safe_moves(game)
-    horizontal_distance = game.food_pos[0] - game.snake_pos[0]
-    vertical_distance = game.food_pos[1] - game.snake_pos[1]
-
-    # Move vertically first because of spawn movement direction of snake
-    if vertical_distance > 0 and safe_moves["DOWN"]:
-        change_to = "DOWN"
-    elif vertical_distance < 0 and safe_moves["UP"]:
-        change_to = "UP"
-    elif horizontal_distance > 0 and safe_moves["RIGHT"]:
-        change_to = "RIGHT"
-    elif horizontal_distance < 0 and safe_moves["LEFT"]:
-        change_to = "LEFT"
-
-    # If the chosen move is blocked, look for the safest alternative
-    if not safe_moves[change_to]:
-        possible_moves = [d for d in ["LEFT", "RIGHT", "UP", "DOWN"] if safe_moves[d]]
-        if possible_moves:
-            change_to = possible_moves[0]  # Pick any safe move
-
-    return change_to
-
-
 # PRINTING DATA FROM GAME STATE
 def print_state(game):
     print("--------GAME STATE--------")
@@ -171,144 +123,87 @@ def print_state(game):
     print("Score:", game.score)
 
 
-def get_body_distances(game):
-    head_x, head_y = game.snake_pos
-    left_dist = right_dist = up_dist = down_dist = FRAME_SIZE_X  # Default max value
-
-    for segment in game.snake_body[1:]:
-        seg_x, seg_y = segment
-
-        if seg_y == head_y and seg_x < head_x:  # Left
-            left_dist = min(left_dist, head_x - seg_x)
-        elif seg_y == head_y and seg_x > head_x:  # Right
-            right_dist = min(right_dist, seg_x - head_x)
-        elif seg_x == head_x and seg_y < head_y:  # Up
-            up_dist = min(up_dist, head_y - seg_y)
-        elif seg_x == head_x and seg_y > head_y:  # Down
-            down_dist = min(down_dist, seg_y - head_y)
-
-    return left_dist, right_dist, up_dist, down_dist
-
-
-def move_weka_agent(game, weka):
-    food_x, food_y = game.food_pos
-    head_x, head_y = game.snake_pos
-
-    # Calculate the new attributes
-    food_in_row = 1 if head_y == food_y else 0
-    food_in_col = 1 if head_x == food_x else 0
-    food_in_up = 1 if food_y < head_y else 0
-    food_in_down = 1 if food_y > head_y else 0
-    food_in_left = 1 if food_x < head_x else 0
-    food_in_right = 1 if food_x > head_x else 0
-    x = [
-        int(game.snake_pos[0]),
-        int(game.snake_pos[1]),
-        int(len(game.snake_body)),  # snake_body_length (attribute 3)
-        int(game.food_pos[0]),
-        int(game.food_pos[1]),
-        int(game.food_pos[0] - game.snake_pos[0]),  # horizontal_distance
-        int(game.food_pos[1] - game.snake_pos[1]),  # vertical_distance
-        int(game.score),  # score (attribute 8)
-        int(get_safe_moves(game)["LEFT"]),    # left_safe (attribute 9)
-        int(get_safe_moves(game)["RIGHT"]),   # right_safe (attribute 10)
-        int(get_safe_moves(game)["UP"]),      # up_safe (attribute 11)
-        int(get_safe_moves(game)["DOWN"]),    # down_safe (attribute 12)
-        int(get_body_distances(game)[0]),          # left_distance (attribute 13)
-        int(get_body_distances(game)[1]),          # right_distance (attribute 14)
-        int(get_body_distances(game)[2]),          # up_distance (attribute 15)
-        int(get_body_distances(game)[3]),          # down_distance (attribute 16)
-        int(food_in_row),                          # food in the same row (attribute 17)
-        int(food_in_col),                          # food in the same col (attribute 18)
-        int(food_in_up),                           # food in up direction (attribute 19)
-        int(food_in_down),                         # food in down direction (attribute 20)
-        int(food_in_left),                         # food in left direction (attribute 21)
-        int(food_in_right)                         # food in right direction (attribute 22)
-    ]
-    model_path = "RT7.model"
-    dataset_path = "snake_game_log_hand.arff"
-    predicted_action = weka.predict(model_path, x, dataset_path)
-    print(x)
-    print(predicted_action)
-    action_map = {"0": "LEFT", "1": "RIGHT", "2": "UP", "3": "DOWN"}
-    return action_map.get(str(predicted_action), game.direction)
-
-
-def print_line_data(game):
-    filename = "snake_game_log_weka.arff"
-
-    header = """@RELATION snake_game
-
-@ATTRIBUTE snake_pos_x numeric
-@ATTRIBUTE snake_pos_y numeric
-@ATTRIBUTE snake_body_length numeric
-@ATTRIBUTE food_pos_x numeric
-@ATTRIBUTE food_pos_y numeric
-@ATTRIBUTE horizontal_distance numeric
-@ATTRIBUTE vertical_distance numeric
-@ATTRIBUTE score numeric
-@ATTRIBUTE left_safe numeric
-@ATTRIBUTE right_safe numeric
-@ATTRIBUTE up_safe numeric
-@ATTRIBUTE down_safe numeric
-@ATTRIBUTE left_distance numeric
-@ATTRIBUTE right_distance numeric
-@ATTRIBUTE up_distance numeric
-@ATTRIBUTE down_distance numeric
-@ATTRIBUTE food_in_row numeric
-@ATTRIBUTE food_in_col numeric
-@ATTRIBUTE food_in_up numeric
-@ATTRIBUTE food_in_down numeric
-@ATTRIBUTE food_in_left numeric
-@ATTRIBUTE food_in_right numeric
-@attribute New_direction {'0','1','2','3'}
-
-@DATA
-"""
-
-    try:
-        with open(filename, "r") as file:
-            pass
-    except FileNotFoundError:
-        with open(filename, "w") as file:
-            file.write(header)
-
-    horizontal_distance = game.food_pos[0] - game.snake_pos[0]
-    vertical_distance = game.food_pos[1] - game.snake_pos[1]
-    safe_moves = get_safe_moves(game)
-    body_parts = len(game.snake_body)
-    left_dist, right_dist, up_dist, down_dist = get_body_distances(game)
-
-    next_score = 0 if game.outcome == "gameover" else future_score(game)
-
-    direction_encoding = {"LEFT": 0, "RIGHT": 1, "UP": 2, "DOWN": 3}
-    direction_numeric = direction_encoding.get(game.direction, -1)
-
-    food_x, food_y = game.food_pos
-    head_x, head_y = game.snake_pos
+def move_weka_agent(game, weka, x=None):
+    # Feature vector declared in features.py, shared with print_line_data
+    if x is None:
+        x = extract(game)
+    predicted_action = weka.predict(MODEL_PATH, list(x), DATASET_PATH)
+    if VERBOSE:
+        print(x)
+        print(predicted_action)
+    return LABEL_DIRECTION.get(str(predicted_action), game.direction)
 
-    # Compute new binary variables
-    move_up = 1 if head_y > food_y else 0
-    move_down = 1 if head_y < food_y else 0
-    move_left = 1 if head_x > food_x else 0
-    move_right = 1 if head_x < food_x else 0
 
-    same_col_moving = 1 if head_x == food_x and move_up or move_down else 0
-    same_row_moving = 1 if head_y == food_y and move_left or move_right else 0
-
-    data_line = (
-        f"{int(game.snake_pos[0])},{int(game.snake_pos[1])},{int(len(game.snake_body))},"
-        f"{int(game.food_pos[0])},{int(game.food_pos[1])},{int(horizontal_distance)},{int(vertical_distance)},{int(game.score)},"
-        f"{int(safe_moves['LEFT'])},{int(safe_moves['RIGHT'])},{int(safe_moves['UP'])},{int(safe_moves['DOWN'])},"
-        f"{int(left_dist)},{int(right_dist)},{int(up_dist)},{int(down_dist)},"
-        f"{int(same_row_moving)},{int(same_col_moving)},"
-        f"{int(move_up)},{int(move_down)},{int(move_left)},{int(move_right)},"
-        f"{str(direction_numeric)}\n"
-    )
+def print_line_data(game, x=None):
+    # The features of this tick are computed once and reused from the agent when available,
+    # with the safe flags taken after the decision as in the existing logs
+    if x is None:
+        x = extract(game)
+    else:
+        x = logged_features(x, game)
+    logger.write(arff_row(x, game.direction))
+    if binary_logger is not None:
+        binary_logger.write_features(x, game.direction)
+
+
+# Flushes the pending log rows and reports the logger throughput
+def close_logger():
+    logger.close()
+    if binary_logger is not None:
+        binary_logger.close()
+    if trace is not None:
+        trace.close()
+    stats = logger.stats()
+    print(f"[+] Logged {stats['rows_written']} rows ({stats['rows_per_sec']:.0f} rows/s, "
+          f"max queue depth {stats['max_queue_depth']})")
+
+
+# Waits for the decision worker, reports how often the agent missed its deadline and stops the JVM
+def close_agent():
+    if pipeline is None:
+        return
+    pipeline.close()
+    if weka.startup_seconds is not None:
+        print(f"[+] Predictor ready after {weka.startup_seconds:.2f}s (model preloaded and warmed up)")
+    if pipeline.first_on_time is not None:
+        print(f"[+] First agent move {pipeline.first_on_time - START_TIME:.2f}s after start")
+    stats = pipeline.stats()
+    print(f"[+] {stats['decisions']} decisions, {stats['missed']} missed deadlines, {stats['skipped']} skipped, "
+          f"latency p50 {stats['p50_ms']:.2f} ms / p95 {stats['p95_ms']:.2f} ms / p99 {stats['p99_ms']:.2f} ms")
+    stats = predictor.stats()
+    print(f"[+] Prediction cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%})")
+    weka.stop_jvm()
 
-    with open(filename, "a") as file:
-        file.write(data_line)
 
+# Rows are buffered and written by a background thread
+logger = ArffLogger("snake_game_log_weka.arff", arff_header())
+# Optional compact copy of the same rows (see binlog.py), e.g. "snake_game_log_weka.bin"
+BINARY_LOG = None
+binary_logger = BinaryLogWriter(BINARY_LOG) if BINARY_LOG else None
+# Optional record of every game as its seed plus 2 bits per tick (see action_trace.py), so
+# the rows can be rebuilt later with other features, e.g. "snake_game_traces.trace"
+TRACE_LOG = None
+trace = TraceRecorder(TRACE_LOG) if TRACE_LOG else None
+
+# Weka agent: the JVM starts in the background (loading the model and running a
+# warm-up prediction) while pygame opens the window; until it is ready the
+# pipeline plays move_tutorial_1
+weka = predictor = pipeline = None
+if POLICY == "weka":
+    # A tree exported with `python tree_engine.py export` runs without the JVM
+    # (unless the model changed after the export)
+    if use_compiled(MODEL_PATH):
+        weka = TreePredictor()
+    else:
+        from wekaI import Weka
+        weka = Weka()
+    weka.start_jvm(background=True, preload=[(MODEL_PATH, DATASET_PATH)])
+    # Vectors that fall in the same leaf as an earlier one skip the classifier
+    predictor = PredictionCache(weka)
+    # Worker thread for the agent, attached to the JVM when the predictor needs it
+    pipeline = DecisionPipeline(lambda game, x: move_weka_agent(game, predictor, x), fallback=move_tutorial_1,
+                                deadline=DECISION_DEADLINE, initializer=weka.attach_thread,
+                                finalizer=weka.detach_thread)
 
 # Checks for errors encounteRED
 check_errors = pygame.init()
@@ -324,16 +219,29 @@ else:
 pygame.display.set_caption('Snake Eater - Machine Learning (UC3M)')
 game_window = pygame.display.set_mode((FRAME_SIZE_X, FRAME_SIZE_Y))
 
-# FPS (frames per second) controller
-fps_controller = pygame.time.Clock()
+# Draws the board incrementally
+renderer = Renderer(game_window, background=BLUE, snake=GREEN, food=RED, text=WHITE)
+
+timings = Instrumentation(INSTRUMENT, report_every=INSTRUMENT_EVERY, dump=INSTRUMENT_DUMP)
 
 # Main logic
-game = GameState((FRAME_SIZE_X,FRAME_SIZE_Y))
-while True:
+engine = SnakeEngine((FRAME_SIZE_X, FRAME_SIZE_Y))
+game = trace.new_game(engine) if trace is not None else engine.new_game()
+renderer.redraw(game)
+first_move = None
 
+
+def handle_events():
+    with timings.phase("events"):
+        poll_events()
+
+
+def poll_events():
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
-            weka.stop_jvm()
+            close_logger()
+            close_agent()
+            timings.close()
             pygame.quit()
             sys.exit()
         if event.type == pygame.KEYDOWN:
@@ -341,74 +249,58 @@ while True:
             if event.key == pygame.K_ESCAPE:
                 pygame.event.post(pygame.event.Event(pygame.QUIT))
         # CALLING MOVE METHOD
-        #game.direction = move_keyboard(game, event)
+        if POLICY == "keyboard":
+            game.direction = move_keyboard(game, event)
 
-    # UNCOMMENT WHEN METHOD IS IMPLEMENTED
-    #game.direction = move_tutorial_1(game)
-    # WEKA AGENTE
-    game.direction = move_weka_agent(game, weka)
 
+# One simulation tick
+def tick():
+    global game, first_move
 
-    # Save Current State
-    print_line_data(game)
+    # Features of the current state, shared by the agent and the logger
+    with timings.phase("features"):
+        features = extract(game)
 
+    with timings.phase("decision"):
+        if POLICY == "tutorial":
+            game.direction = move_tutorial_1(game)
+        elif POLICY == "weka":
+            # WEKA AGENTE (falls back to move_tutorial_1 when it misses DECISION_DEADLINE)
+            game.direction = pipeline.decide(game, features)
+    if first_move is None:
+        first_move = time.perf_counter() - START_TIME
+        print(f"[+] First move {first_move:.2f}s after start")
 
 
-    # Moving the snake
-    if game.direction == 'UP':
-        game.snake_pos[1] -= 10
-    if game.direction == 'DOWN':
-        game.snake_pos[1] += 10
-    if game.direction == 'LEFT':
-        game.snake_pos[0] -= 10
-    if game.direction == 'RIGHT':
-        game.snake_pos[0] += 10
-
-    # Snake body growing mechanism
-    game.snake_body.insert(0, list(game.snake_pos))
-    if game.snake_pos[0] == game.food_pos[0] and game.snake_pos[1] == game.food_pos[1]:
-        game.score += 100
-        game.food_spawn = False
-    else:
-        game.snake_body.pop()
-        game.score -= 1
+    # Save Current State
+    with timings.phase("logging"):
+        print_line_data(game, features)
 
-    # Spawning food on the screen
-    if not game.food_spawn:
-        game.food_pos = [random.randrange(1, (FRAME_SIZE_X//10)) * 10, random.randrange(1, (FRAME_SIZE_Y//10)) * 10]
-    game.food_spawn = True
 
-    # GFX
-    game_window.fill(BLUE)
-    for pos in game.snake_body:
-        # Snake body
-        # .draw.rect(play_surface, color, xy-coordinate)
-        # xy-coordinate -> .Rect(x, y, size_x, size_y)
-        pygame.draw.rect(game_window, GREEN, pygame.Rect(pos[0], pos[1], 10, 10))
 
-    # Snake food
-    pygame.draw.rect(game_window, RED, pygame.Rect(game.food_pos[0], game.food_pos[1], 10, 10))
+    # Moving the snake
+    if trace is not None:
+        trace.record(game.direction)
+    with timings.phase("simulation"):
+        game, reward, done = engine.step(game, game.direction)
 
     # Game Over conditions
-    # Getting out of bounds
-    if game.snake_pos[0] < 0 or game.snake_pos[0] > FRAME_SIZE_X-10:
-        game.outcome = "gameover"
+    if done:
         game_over(game)
-    if game.snake_pos[1] < 0 or game.snake_pos[1] > FRAME_SIZE_Y-10:
-        game.outcome = "gameover"
-        game_over(game)
-    # Touching the snake body
-    for block in game.snake_body[1:]:
-        if game.snake_pos[0] == block[0] and game.snake_pos[1] == block[1]:
-            game.outcome = "gameover"
-            game_over(game)
-
-    show_score(game, 1, WHITE, 'consolas', 15)
-    # Refresh game screen
-    pygame.display.update()
-    # Refresh rate
-    fps_controller.tick(DIFFICULTY)
+
     # PRINTING STATE
-    print_state(game)
+    if VERBOSE:
+        print_state(game)
+    timings.tick()
+
+
+# GFX: repaints the cells that changed (head, tail, food) and the score,
+# and refreshes only those areas of the screen
+def render():
+    with timings.phase("render"):
+        renderer.draw(game)
 
 
+# DIFFICULTY ticks per second, at most RENDER_FPS frames per second
+loop = GameLoop(DIFFICULTY, RENDER_FPS, uncapped=UNCAPPED)
+loop.run(handle_events, tick, render)
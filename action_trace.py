@@ -0,0 +1,219 @@
+"""
+Compact action traces
+A game is fully determined by the seed of its food RNG and the direction
+played on every tick, so a trace stores just that: the seed plus a packed
+stream of 2 bits per tick (LEFT=0, RIGHT=1, UP=2, DOWN=3). The replayer
+re-simulates the traces with the headless engine at full speed and can
+emit the rows of print_line_data with any feature schema, which rebuilds a
+dataset for a new attribute set from every recorded game.
+
+Layout:
+    b"SNAKETRC"  magic
+    uint16 x2    frame size in pixels
+    games        int64 seed | uint32 ticks | uint8 flags (1: game over) | int32 final score
+                 | ceil(ticks / 4) bytes of actions, first tick in the low bits
+
+Usage:
+    python action_trace.py info snake_game_traces.trace
+    python action_trace.py replay snake_game_traces.trace --out snake_game_log_replay.arff
+    python action_trace.py replay snake_game_traces.trace --features my_features:FEATURES --out new.bin
+"""
+
+import argparse
+import atexit
+import importlib
+import os
+import random
+import struct
+import time
+
+import numpy as np
+
+from snake_engine import FRAME_SIZE_X, FRAME_SIZE_Y, SnakeEngine
+from features import DIRECTIONS, extract, logged_features, arff_header, arff_row
+from binlog import BinaryLogWriter, BinarySchema
+
+MAGIC = b"SNAKETRC"
+_HEADER = struct.Struct("<HH")
+_GAME = struct.Struct("<qIBi")
+FLAG_DONE = 1
+
+ACTION_CODE = {direction: code for code, direction in enumerate(DIRECTIONS)}
+
+
+def pack_actions(codes):
+    codes = np.asarray(codes, dtype=np.uint8)
+    padded = np.zeros(-(-len(codes) // 4) * 4, dtype=np.uint8)
+    padded[:len(codes)] = codes
+    padded = padded.reshape(-1, 4)
+    return (padded[:, 0] | (padded[:, 1] << 2) | (padded[:, 2] << 4) | (padded[:, 3] << 6)).tobytes()
+
+
+def unpack_actions(data, ticks):
+    packed = np.frombuffer(data, dtype=np.uint8)
+    codes = np.stack([(packed >> shift) & 3 for shift in (0, 2, 4, 6)], axis=1).reshape(-1)
+    return codes[:ticks]
+
+
+class Trace:
+
+    def __init__(self, seed, actions, done, score):
+        self.seed = seed
+        # Action codes (uint8 array), index into features.DIRECTIONS
+        self.actions = actions
+        self.done = done
+        self.score = score
+
+    def directions(self):
+        return [DIRECTIONS[code] for code in self.actions.tolist()]
+
+
+class TraceRecorder:
+    """Appends the games played through it to a trace file."""
+
+    def __init__(self, path, frame_size=(FRAME_SIZE_X, FRAME_SIZE_Y)):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            existing = read_frame_size(path)
+            if existing != tuple(frame_size):
+                raise ValueError("%s was recorded on a %dx%d board" % ((path,) + existing))
+            self._file = open(path, "ab")
+        else:
+            self._file = open(path, "wb")
+            self._file.write(MAGIC + _HEADER.pack(*frame_size))
+        self._seed = None
+        self._actions = bytearray()
+        self.games = 0
+        atexit.register(self.close)
+
+    def new_game(self, engine, seed=None):
+        """Starts a seeded game (a random seed when none is given) and records it."""
+        if self._seed is not None:
+            self.end_game(None, done=False)
+        self._seed = random.randrange(2 ** 62) if seed is None else seed
+        self._actions = bytearray()
+        return engine.new_game(self._seed)
+
+    def record(self, direction):
+        # Direction passed to engine.step on this tick
+        self._actions.append(ACTION_CODE[direction])
+
+    def end_game(self, game, done=True):
+        if self._seed is None:
+            return
+        score = game.score if game is not None else 0
+        flags = FLAG_DONE if done else 0
+        self._file.write(_GAME.pack(self._seed, len(self._actions), flags, score) + pack_actions(self._actions))
+        self._file.flush()
+        self._seed = None
+        self.games += 1
+
+    def close(self):
+        if not self._file.closed:
+            # An unfinished game (e.g. the window was closed) is kept without the game over flag
+            if self._seed is not None:
+                self.end_game(None, done=False)
+            self._file.close()
+
+
+def read_frame_size(path):
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a snake trace file" % path)
+        return _HEADER.unpack(file.read(_HEADER.size))
+
+
+def iter_traces(path):
+    """Yields every Trace of a file."""
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a snake trace file" % path)
+        file.read(_HEADER.size)
+        while True:
+            head = file.read(_GAME.size)
+            if len(head) < _GAME.size:
+                return
+            seed, ticks, flags, score = _GAME.unpack(head)
+            actions = unpack_actions(file.read(-(-ticks // 4)), ticks)
+            yield Trace(seed, actions, bool(flags & FLAG_DONE), score)
+
+
+def replay(trace, engine=None, features=None):
+    """
+    Re-simulates a trace and returns the rows print_line_data would have logged:
+    (feature vector, direction) for every tick, plus the final state of a finished game.
+    """
+    engine = engine or SnakeEngine()
+    game = engine.new_game(trace.seed)
+    rows = []
+    done = False
+    for direction in trace.directions():
+        # Features of the state the decision was taken on, with the safe flags of the chosen
+        # direction, as in SnakeGame.py and generate_data.py
+        x = extract(game, features)
+        game.direction = direction
+        rows.append((logged_features(x, game, features), direction))
+        game, reward, done = engine.step(game, direction)
+    if trace.done:
+        rows.append((extract(game, features), game.direction))
+    # Recorded games without the final score (closed windows) cannot be checked
+    if trace.done and (not done or game.score != trace.score):
+        raise ValueError("Trace with seed %d does not replay to its recorded end (the rules changed?)" % trace.seed)
+    return rows
+
+
+def load_features(spec):
+    # "module:NAME" -> list of features.Feature
+    module, name = spec.split(":", 1)
+    return getattr(importlib.import_module(module), name)
+
+
+def replay_file(path, out, features=None):
+    """Writes the rows of every trace of path to an ARFF or binary (.bin) log; returns the counts."""
+    frame_size = read_frame_size(path)
+    engine = SnakeEngine(frame_size)
+    start = time.perf_counter()
+    games = rows = ticks = 0
+    if out.endswith(".bin"):
+        if os.path.exists(out):
+            os.remove(out)
+        writer = BinaryLogWriter(out, BinarySchema.from_features(feature_list=features))
+        for trace in iter_traces(path):
+            for x, direction in replay(trace, engine, features):
+                writer.write_features(x, direction)
+                rows += 1
+            games += 1
+            ticks += len(trace.actions)
+        writer.close()
+    else:
+        with open(out, "w") as file:
+            file.write(arff_header(features=features))
+            for trace in iter_traces(path):
+                lines = [arff_row(x, direction) for x, direction in replay(trace, engine, features)]
+                file.write("".join(lines))
+                rows += len(lines)
+                games += 1
+                ticks += len(trace.actions)
+    elapsed = time.perf_counter() - start
+    return {"games": games, "rows": rows, "ticks": ticks, "seconds": elapsed,
+            "ticks_per_sec": ticks / elapsed if elapsed > 0 else 0.0}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and replay snake action traces")
+    parser.add_argument("command", choices=["info", "replay"])
+    parser.add_argument("trace")
+    parser.add_argument("--out", default="snake_game_log_replay.arff", help=".arff or .bin")
+    parser.add_argument("--features", default=None, help="module:NAME of the feature list to emit")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        traces = list(iter_traces(args.trace))
+        ticks = sum(len(t.actions) for t in traces)
+        print("%s: %d games (%d finished), %d ticks, %d bytes (%.2f bytes/tick)"
+              % (args.trace, len(traces), sum(t.done for t in traces), ticks,
+                 os.path.getsize(args.trace), os.path.getsize(args.trace) / max(ticks, 1)))
+    else:
+        features = load_features(args.features) if args.features else None
+        stats = replay_file(args.trace, args.out, features)
+        print("%(games)d games, %(rows)d rows, %(ticks)d ticks in %(seconds).2fs (%(ticks_per_sec).0f ticks/s)" % stats)
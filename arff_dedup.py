@@ -0,0 +1,237 @@
+"""
+Streaming deduplication and compaction of the ARFF logs
+Rows are hashed on a subset of the attributes (--ignore drops attributes
+such as score or snake_pos_x from the key, --keys lists them explicitly; the
+class is always part of the key). Duplicates are either dropped or folded
+into the first occurrence as a Weka instance weight ("v1,...,vn,{w}"), and
+--cap-per-class limits the distinct rows kept per New_direction value.
+
+Everything happens in one pass over the inputs. Memory is bounded by
+--max-keys: the oldest keys are forgotten first (in weight mode their row is
+written out with the weight counted so far), so duplicates further apart than
+that many distinct rows are not merged. --max-keys 1 only merges consecutive
+runs. Rows are written in the order of their first occurrence.
+
+Inputs are grouped by their attributes: files with the same header are
+deduplicated together into one output, named after the first file of the
+group (<first file>_dedup.arff) unless --out is given for a single schema.
+The logs of this repository have three different headers, so the first
+example writes three files.
+
+Usage:
+    python arff_dedup.py snake_game_log*.arff
+    python arff_dedup.py snake_game_log_hand.arff snake_game_log_weka.arff --out snake_game_log_dedup.arff
+    python arff_dedup.py snake_game_log_hand.arff --mode weight --ignore score snake_pos_x --cap-per-class 2000
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+from collections import Counter, OrderedDict
+
+from arff_reader import _split, _unquote, read_header
+from features import CLASS_NAME
+
+
+def _fields(header, line):
+    """Value tokens and instance weight of a data line."""
+    weight = 1.0
+    if line.endswith("}") and not line.startswith("{"):
+        line, _, token = line.rpartition(",")
+        weight = float(token.strip()[1:-1])
+    if line.startswith("{"):
+        tokens = ["0"] * len(header.attributes)
+        for pair in _split(line[1:line.rindex("}")]):
+            if pair:
+                i, _, token = pair.partition(" ")
+                tokens[int(i)] = token.strip()
+    else:
+        tokens = _split(line)
+        if len(tokens) != len(header.attributes):
+            raise ValueError("Expected %d values, got %d: %r" % (len(header.attributes), len(tokens), line))
+    return [_unquote(token) for token in tokens], line, weight
+
+
+def _format_weight(weight):
+    return "%d" % weight if weight == int(weight) else repr(weight)
+
+
+def _same_schema(a, b):
+    return ([(x.name, x.type, x.values) for x in a.attributes]
+            == [(x.name, x.type, x.values) for x in b.attributes])
+
+
+def group_by_schema(paths):
+    """Lists of the paths that share a header, in the order their schema first appears."""
+    groups = []
+    for path in paths:
+        with open(path, "r") as file:
+            header = read_header(file)
+        for group_header, group in groups:
+            if _same_schema(group_header, header):
+                group.append(path)
+                break
+        else:
+            groups.append((header, [path]))
+    return [group for _, group in groups]
+
+
+def key_columns(header, keys=None, ignore=(), class_name=None):
+    """Indices of the attributes hashed into the key; the class attribute is always included."""
+    names = header.names
+    if class_name is None:
+        # The older logs have future_score after New_direction
+        class_name = CLASS_NAME if CLASS_NAME in names else names[-1]
+    if class_name not in names:
+        raise ValueError("Unknown attribute %r" % class_name)
+    class_index = names.index(class_name)
+    for name in list(keys or ()) + list(ignore):
+        if name not in names:
+            raise ValueError("Unknown attribute %r" % name)
+    if keys:
+        columns = [i for i, name in enumerate(names) if name in keys]
+    else:
+        columns = [i for i, name in enumerate(names) if name not in ignore]
+    if class_index not in columns:
+        columns.append(class_index)
+    return columns, class_index
+
+
+def dedup(paths, out_path, mode="drop", keys=None, ignore=(), class_name=None, cap_per_class=None,
+          max_keys=1000000):
+    """
+    Writes the deduplicated rows of every file in paths to out_path and returns a
+    summary dict (rows, bytes and per-class counts in and out).
+    """
+    if mode not in ("drop", "weight"):
+        raise ValueError("mode must be 'drop' or 'weight'")
+    with open(paths[0], "r") as file:
+        header = read_header(file)
+    columns, class_index = key_columns(header, keys, ignore, class_name)
+
+    # key digest -> None (drop) or [line, weight, class] (weight), oldest first
+    seen = OrderedDict()
+    rows_in = rows_out = 0
+    weight_in = weight_out = 0.0
+    classes_in = Counter()
+    classes_out = Counter()
+    # Distinct rows admitted per class, including the ones still waiting in seen
+    kept = Counter()
+    evicted = 0
+
+    with open(out_path, "w") as out:
+        out.write(header.to_arff())
+
+        def emit(line, weight, label):
+            nonlocal rows_out, weight_out
+            out.write(line if weight == 1 else "%s,{%s}" % (line, _format_weight(weight)))
+            out.write("\n")
+            rows_out += 1
+            weight_out += weight
+            classes_out[label] += 1
+
+        for path in paths:
+            with open(path, "r") as file:
+                if not _same_schema(header, read_header(file)):
+                    raise ValueError("%s does not have the attributes of %s" % (path, paths[0]))
+                for line in file:
+                    line = line.strip()
+                    if not line or line.startswith("%"):
+                        continue
+                    values, line, weight = _fields(header, line)
+                    label = values[class_index]
+                    rows_in += 1
+                    weight_in += weight
+                    classes_in[label] += 1
+
+                    digest = hashlib.blake2b("\x1f".join(values[i] for i in columns).encode("utf-8"),
+                                             digest_size=8).digest()
+                    if digest in seen:
+                        if mode == "weight":
+                            seen[digest][1] += weight
+                        continue
+                    if cap_per_class is not None and kept[label] >= cap_per_class:
+                        continue
+                    kept[label] += 1
+
+                    if len(seen) >= max_keys:
+                        _, entry = seen.popitem(last=False)
+                        evicted += 1
+                        if entry is not None:
+                            emit(*entry)
+                    if mode == "weight":
+                        seen[digest] = [line, weight, label]
+                    else:
+                        seen[digest] = None
+                        emit(line, weight, label)
+
+        for entry in seen.values():
+            if entry is not None:
+                emit(*entry)
+
+    return {
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "weight_in": weight_in,
+        "weight_out": weight_out,
+        "bytes_in": sum(os.path.getsize(path) for path in paths),
+        "bytes_out": os.path.getsize(out_path),
+        "classes_in": dict(classes_in),
+        "classes_out": dict(classes_out),
+        "evicted_keys": evicted,
+        "key": [header.attributes[i].name for i in columns],
+        "class": header.attributes[class_index].name,
+    }
+
+
+def _reduction(before, after):
+    return 100.0 * (before - after) / before if before else 0.0
+
+
+def _print_summary(summary, mode, max_keys):
+    print("Key: %s" % ", ".join(summary["key"]))
+    print("Rows:  %d -> %d (-%.1f%%)" % (summary["rows_in"], summary["rows_out"],
+                                         _reduction(summary["rows_in"], summary["rows_out"])))
+    print("Bytes: %d -> %d (-%.1f%%)" % (summary["bytes_in"], summary["bytes_out"],
+                                         _reduction(summary["bytes_in"], summary["bytes_out"])))
+    if mode == "weight":
+        print("Total weight: %g -> %g" % (summary["weight_in"], summary["weight_out"]))
+    for label in sorted(summary["classes_in"]):
+        print("  %s = %-6s %7d -> %d" % (summary["class"], label, summary["classes_in"][label],
+                                         summary["classes_out"].get(label, 0)))
+    if summary["evicted_keys"]:
+        print("%d keys forgotten (--max-keys %d): duplicates further apart were not merged"
+              % (summary["evicted_keys"], max_keys))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drop or weight duplicate rows of ARFF logs in one pass")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--out", default=None, help="Inputs with one header only (default: <first file>_dedup.arff per header)")
+    parser.add_argument("--mode", choices=["drop", "weight"], default="drop",
+                        help="weight keeps one row per key with the number of duplicates as its instance weight")
+    parser.add_argument("--keys", nargs="+", default=None, help="Attributes hashed into the key (default: all)")
+    parser.add_argument("--ignore", nargs="+", default=[], help="Attributes left out of the key")
+    parser.add_argument("--class", dest="class_name", default=None,
+                        help="Class attribute (default: New_direction, else the last one)")
+    parser.add_argument("--cap-per-class", type=int, default=None, help="Distinct rows kept per class value")
+    parser.add_argument("--max-keys", type=int, default=1000000, help="Keys remembered at once (bounds memory)")
+    args = parser.parse_args()
+
+    groups = group_by_schema(args.files)
+    if args.out and len(groups) > 1:
+        sys.exit("The inputs have %d different headers (%s): --out needs files with the same attributes"
+                 % (len(groups), "; ".join(", ".join(group) for group in groups)))
+    outputs = [args.out or os.path.splitext(group[0])[0] + "_dedup.arff" for group in groups]
+    for out_path in outputs:
+        if out_path in args.files:
+            sys.exit("The output %s is one of the inputs" % out_path)
+
+    for group, out_path in zip(groups, outputs):
+        if len(groups) > 1:
+            print("== %s" % ", ".join(group))
+        summary = dedup(group, out_path, args.mode, args.keys, args.ignore, args.class_name,
+                        args.cap_per_class, args.max_keys)
+        _print_summary(summary, args.mode, args.max_keys)
+        print("Wrote %s" % out_path)
@@ -0,0 +1,100 @@
+"""
+Buffered ARFF logger
+Keeps one open handle on the log and writes the rows from a background
+thread, either when batch_size rows are pending or every flush_interval
+seconds. close() (also registered with atexit) drains every pending row.
+"""
+
+import atexit
+import os
+import threading
+import time
+
+
+class ArffLogger:
+
+    def __init__(self, filename, header, batch_size=512, flush_interval=0.5, max_pending=65536):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Above this many pending rows the caller writes them itself (backpressure)
+        self.max_pending = max_pending
+
+        new_file = not os.path.exists(filename) or os.path.getsize(filename) == 0
+        self._file = open(filename, "a")
+        if new_file:
+            self._file.write(header)
+            self._file.flush()
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        self.rows_written = 0
+        self.flushes = 0
+        self.max_queue_depth = 0
+        self.sync_flushes = 0
+        self._start = time.perf_counter()
+
+        self._thread = threading.Thread(target=self._run, name="arff-logger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, line):
+        with self._lock:
+            self._pending.append(line)
+            depth = len(self._pending)
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        if depth >= self.max_pending:
+            self.sync_flushes += 1
+            self.flush()
+        elif depth >= self.batch_size:
+            self._wake.set()
+
+    def _drain(self):
+        # The I/O lock is taken first so batches reach the file in the order they were queued
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if batch:
+                self._file.write("".join(batch))
+                self._file.flush()
+                self.rows_written += len(batch)
+                self.flushes += 1
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+
+    def flush(self):
+        # Writes every pending row from the calling thread
+        self._drain()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self._drain()
+        self._file.close()
+
+    @property
+    def queue_depth(self):
+        return len(self._pending)
+
+    def stats(self):
+        elapsed = time.perf_counter() - self._start
+        return {
+            "rows_written": self.rows_written,
+            "rows_per_sec": self.rows_written / elapsed if elapsed > 0 else 0.0,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "flushes": self.flushes,
+            "sync_flushes": self.sync_flushes,
+        }
@@ -0,0 +1,215 @@
+"""
+Streaming ARFF reader
+Parses the @attribute header (numeric and nominal, any relation name such
+as the NominalToBinary-renamed ones) and yields the @data section in
+fixed-size chunks of NumPy arrays, so logs of any size are processed in
+constant memory without the JVM.
+
+Nominal values are returned as the index of the value in the attribute's
+declaration and missing values ('?') as NaN.
+
+Usage:
+    python arff_reader.py snake_game_log_hand.arff
+"""
+
+import argparse
+import csv
+import sys
+
+import numpy as np
+
+
+class ArffAttribute:
+    def __init__(self, name, type, values=None):
+        self.name = name
+        self.type = type  # 'numeric', 'nominal', 'string' or 'date'
+        self.values = values
+        self.index = None if values is None else {v: i for i, v in enumerate(values)}
+
+    @property
+    def is_nominal(self):
+        return self.type == "nominal"
+
+    def __repr__(self):
+        return "ArffAttribute(%r, %r)" % (self.name, self.values if self.is_nominal else self.type)
+
+
+class ArffHeader:
+    def __init__(self, relation, attributes):
+        self.relation = relation
+        self.attributes = attributes
+
+    @property
+    def names(self):
+        return [attribute.name for attribute in self.attributes]
+
+    def index_of(self, name):
+        return self.names.index(name)
+
+    def to_arff(self):
+        lines = ["@relation " + _quote(self.relation), ""]
+        for attribute in self.attributes:
+            if attribute.is_nominal:
+                kind = "{" + ",".join(_quote(v) for v in attribute.values) + "}"
+            else:
+                kind = attribute.type
+            lines.append("@attribute %s %s" % (_quote(attribute.name), kind))
+        lines += ["", "@data", ""]
+        return "\n".join(lines)
+
+
+def _quote(text):
+    if text and not any(c in text for c in " ,{}'\"%\t"):
+        return text
+    return "'" + text.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def _unquote(token):
+    token = token.strip()
+    if len(token) >= 2 and token[0] == token[-1] and token[0] in "'\"":
+        return token[1:-1].replace("\\'", "'").replace('\\"', '"')
+    return token
+
+
+def _split(line):
+    # Fast path for the common unquoted rows
+    if "'" not in line and '"' not in line:
+        return [token.strip() for token in line.split(",")]
+    quotechar = "'" if "'" in line else '"'
+    row = next(csv.reader([line], quotechar=quotechar, skipinitialspace=True, escapechar="\\"))
+    return [token.strip() for token in row]
+
+
+def _parse_attribute(rest):
+    rest = rest.strip()
+    if rest[0] in "'\"":
+        end = rest.index(rest[0], 1)
+        name, kind = rest[1:end], rest[end + 1:].strip()
+    else:
+        name, _, kind = rest.partition(" ")
+        if "\t" in name:
+            name, _, more = name.partition("\t")
+            kind = more + " " + kind
+        kind = kind.strip()
+    if kind.startswith("{"):
+        values = [_unquote(v) for v in _split(kind[1:kind.rindex("}")])]
+        return ArffAttribute(name, "nominal", values)
+    kind = kind.split()[0].lower()
+    if kind in ("numeric", "real", "integer"):
+        return ArffAttribute(name, "numeric")
+    return ArffAttribute(name, kind)
+
+
+def read_header(file):
+    """Reads lines up to and including @data; returns the ArffHeader."""
+    relation = None
+    attributes = []
+    for line in file:
+        stripped = line.strip()
+        if not stripped or stripped.startswith("%"):
+            continue
+        keyword, _, rest = stripped.partition(" ")
+        keyword = keyword.lower()
+        if keyword == "@relation":
+            relation = _unquote(rest)
+        elif keyword == "@attribute":
+            attributes.append(_parse_attribute(rest))
+        elif keyword == "@data":
+            return ArffHeader(relation, attributes)
+    raise ValueError("No @data section found")
+
+
+def _convert(attribute, token):
+    if token == "?":
+        return np.nan
+    if attribute.is_nominal:
+        return attribute.index[_unquote(token)]
+    return float(token)
+
+
+def _parse_chunk(header, lines, dtype):
+    n_attributes = len(header.attributes)
+    text = ",".join(lines)
+    weights = np.ones(len(lines))
+    all_numeric = not any(attribute.is_nominal for attribute in header.attributes)
+    if all_numeric and not any(c in text for c in "?'\"{"):
+        data = np.array(text.split(","), dtype=np.float64).reshape(len(lines), n_attributes)
+        return data.astype(dtype, copy=False), weights
+
+    data = np.empty((len(lines), n_attributes), dtype=np.float64)
+    for r, line in enumerate(lines):
+        if line.endswith("}") and not line.startswith("{"):
+            # Instance weight: "v1,v2,...,{w}"
+            line, _, weight = line.rpartition(",")
+            weights[r] = float(weight.strip()[1:-1])
+        if line.startswith("{"):
+            # Sparse row: "{index value, ...}" with every other value 0
+            data[r] = 0
+            for pair in _split(line[1:line.rindex("}")]):
+                if pair:
+                    i, _, token = pair.partition(" ")
+                    data[r, int(i)] = _convert(header.attributes[int(i)], token.strip())
+            continue
+        tokens = _split(line)
+        if len(tokens) != n_attributes:
+            raise ValueError("Expected %d values, got %d: %r" % (n_attributes, len(tokens), line))
+        data[r] = [_convert(attribute, token) for attribute, token in zip(header.attributes, tokens)]
+    return data.astype(dtype, copy=False), weights
+
+
+def iter_chunks(path, chunk_size=65536, dtype=np.float64, with_weights=False):
+    """
+    Yields (header, chunk) pairs where chunk is a (rows <= chunk_size, attributes) array,
+    or (header, chunk, weights) when with_weights is set.
+    """
+    with open(path, "r") as file:
+        header = read_header(file)
+        lines = []
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("%"):
+                continue
+            lines.append(line)
+            if len(lines) == chunk_size:
+                data, weights = _parse_chunk(header, lines, dtype)
+                yield (header, data, weights) if with_weights else (header, data)
+                lines = []
+        if lines:
+            data, weights = _parse_chunk(header, lines, dtype)
+            yield (header, data, weights) if with_weights else (header, data)
+
+
+def read_arff(path, dtype=np.float64):
+    """Whole file as (header, array); use iter_chunks for logs that do not fit in memory."""
+    with open(path, "r") as file:
+        header = read_header(file)
+    chunks = [data for _, data in iter_chunks(path, dtype=dtype)]
+    if not chunks:
+        return header, np.empty((0, len(header.attributes)), dtype=dtype)
+    return header, np.concatenate(chunks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise ARFF logs in constant memory")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--chunk-size", type=int, default=65536)
+    args = parser.parse_args()
+
+    for path in args.files:
+        with open(path, "r") as file:
+            header = read_header(file)
+        rows = 0
+        low = high = None
+        for _, data in iter_chunks(path, args.chunk_size):
+            rows += len(data)
+            low = data.min(axis=0) if low is None else np.minimum(low, data.min(axis=0))
+            high = data.max(axis=0) if high is None else np.maximum(high, data.max(axis=0))
+        print("%s: relation %s, %d rows" % (path, header.relation, rows))
+        for i, attribute in enumerate(header.attributes):
+            if low is None:
+                print("  %-22s %s" % (attribute.name, attribute.type))
+            elif attribute.is_nominal:
+                print("  %-22s {%s}" % (attribute.name, ",".join(attribute.values)))
+            else:
+                print("  %-22s [%g, %g]" % (attribute.name, low[i], high[i]))
+        sys.stdout.flush()
@@ -0,0 +1,173 @@
+"""
+Vectorized Snake simulator
+Runs N games in lockstep as NumPy arrays with the same rules as SnakeEngine:
+10-px cells on the frame, +100 per food, -1 per step, death on walls or body.
+Positions are stored in cells (pixels // 10); actions use the New_direction
+encoding of the logs: 0 LEFT, 1 RIGHT, 2 UP, 3 DOWN.
+"""
+
+import time
+
+import numpy as np
+
+from snake_engine import FRAME_SIZE_X, FRAME_SIZE_Y, CELL_SIZE
+
+ACTIONS = ("LEFT", "RIGHT", "UP", "DOWN")
+ACTION_INDEX = {name: i for i, name in enumerate(ACTIONS)}
+
+DX = np.array([-1, 1, 0, 0], dtype=np.int32)
+DY = np.array([0, 0, -1, 1], dtype=np.int32)
+
+
+class BatchSnakeEngine:
+
+    def __init__(self, n_games, frame_size=(FRAME_SIZE_X, FRAME_SIZE_Y), seed=None, auto_reset=True, max_ticks=None):
+        self.n_games = n_games
+        self.width = frame_size[0] // CELL_SIZE
+        self.height = frame_size[1] // CELL_SIZE
+        self.auto_reset = auto_reset
+        self.max_ticks = max_ticks
+        self.rng = np.random.default_rng(seed)
+        # One slot more than the board so a full snake never overwrites its own tail
+        self.capacity = self.width * self.height + 1
+
+        self.head = np.zeros((n_games, 2), dtype=np.int32)
+        self.food = np.zeros((n_games, 2), dtype=np.int32)
+        self.direction = np.zeros(n_games, dtype=np.int8)
+        self.score = np.zeros(n_games, dtype=np.int64)
+        self.length = np.zeros(n_games, dtype=np.int32)
+        self.ticks = np.zeros(n_games, dtype=np.int64)
+        self.done = np.zeros(n_games, dtype=bool)
+        # Occupancy grid indexed [game, y, x] and body ring buffer (head at head_index)
+        self.grid = np.zeros((n_games, self.height, self.width), dtype=np.uint8)
+        self.body = np.zeros((n_games, self.capacity, 2), dtype=np.int8)
+        self.head_index = np.zeros(n_games, dtype=np.int32)
+
+        # Statistics of the games finished so far
+        self.games_finished = 0
+        self.total_ticks = 0
+        self.final_scores = []
+
+        self.reset()
+
+    def reset(self, mask=None):
+        idx = np.arange(self.n_games) if mask is None else np.flatnonzero(mask)
+        if len(idx) == 0:
+            return
+        # Same start as GameState: head at (100, 50) moving right with two segments behind
+        start = np.array([[10, 5], [9, 5], [8, 5]], dtype=np.int8)
+        self.grid[idx] = 0
+        self.grid[idx[:, None], start[:, 1], start[:, 0]] = 1
+        self.head_index[idx] = 0
+        self.body[idx, :3] = start
+        self.length[idx] = 3
+        self.head[idx] = start[0]
+        self.direction[idx] = ACTION_INDEX['RIGHT']
+        self.score[idx] = 0
+        self.ticks[idx] = 0
+        self.done[idx] = False
+        self.food[idx] = self._spawn(len(idx))
+
+    def _spawn(self, count):
+        # Food never spawns on the first row/column, like random.randrange(1, 48) * 10
+        return self.rng.integers(1, (self.width, self.height), size=(count, 2), dtype=np.int32)
+
+    def safe_moves(self):
+        """(N, 4) bool array with get_safe_moves for every game, columns in ACTIONS order."""
+        n = np.arange(self.n_games)
+        x, y = self.head[:, 0], self.head[:, 1]
+        safe = np.zeros((self.n_games, 4), dtype=bool)
+        for action in range(4):
+            nx, ny = x + DX[action], y + DY[action]
+            inside = (nx >= 0) & (nx < self.width) & (ny >= 0) & (ny < self.height)
+            free = np.zeros(self.n_games, dtype=bool)
+            free[inside] = self.grid[n[inside], ny[inside], nx[inside]] == 0
+            safe[:, action] = inside & free
+        # Reversing into the neck is never offered as a safe move
+        safe[n, self.direction ^ 1] = False
+        return safe
+
+    def step(self, actions):
+        """Advances every running game; returns (engine, rewards, dones)."""
+        actions = np.asarray(actions, dtype=np.int64)
+        rewards = np.zeros(self.n_games, dtype=np.int64)
+        dones = np.zeros(self.n_games, dtype=bool)
+        idx = np.flatnonzero(~self.done)
+        a = actions[idx]
+
+        # Moving the snake
+        nx = self.head[idx, 0] + DX[a]
+        ny = self.head[idx, 1] + DY[a]
+        self.head[idx, 0] = nx
+        self.head[idx, 1] = ny
+        self.direction[idx] = a
+
+        # Snake body growing mechanism
+        ate = (nx == self.food[idx, 0]) & (ny == self.food[idx, 1])
+        rewards[idx] = np.where(ate, 100, -1)
+        self.score[idx] += rewards[idx]
+        popped = idx[~ate]
+        tail = (self.head_index[popped] + self.length[popped] - 1) % self.capacity
+        self.grid[popped, self.body[popped, tail, 1], self.body[popped, tail, 0]] -= 1
+        self.length[idx[ate]] += 1
+
+        # Game Over conditions: out of bounds or head on a remaining segment
+        wall = (nx < 0) | (nx >= self.width) | (ny < 0) | (ny >= self.height)
+        inside = ~wall
+        collision = np.zeros(len(idx), dtype=bool)
+        collision[inside] = self.grid[idx[inside], ny[inside], nx[inside]] > 0
+
+        self.head_index[idx] = (self.head_index[idx] - 1) % self.capacity
+        self.body[idx, self.head_index[idx], 0] = nx
+        self.body[idx, self.head_index[idx], 1] = ny
+        self.grid[idx[inside], ny[inside], nx[inside]] += 1
+
+        # Spawning food on the screen
+        eaten = idx[ate]
+        self.food[eaten] = self._spawn(len(eaten))
+
+        self.ticks[idx] += 1
+        dones[idx] = wall | collision
+        if self.max_ticks is not None:
+            dones[idx] |= self.ticks[idx] >= self.max_ticks
+        self.done |= dones
+
+        finished = np.flatnonzero(dones)
+        if len(finished):
+            self.games_finished += len(finished)
+            self.total_ticks += int(self.ticks[finished].sum())
+            self.final_scores.extend(self.score[finished].tolist())
+            if self.auto_reset:
+                self.reset(dones)
+        return self, rewards, dones
+
+
+def greedy_actions(engine):
+    """Vectorized move_tutorial_1: vertical first, then horizontal, else any safe move."""
+    safe = engine.safe_moves()
+    n = np.arange(engine.n_games)
+    horizontal = engine.food[:, 0] - engine.head[:, 0]
+    vertical = engine.food[:, 1] - engine.head[:, 1]
+    choice = np.select(
+        [(vertical > 0) & safe[:, 3], (vertical < 0) & safe[:, 2],
+         (horizontal > 0) & safe[:, 1], (horizontal < 0) & safe[:, 0]],
+        [3, 2, 1, 0], default=engine.direction)
+    blocked = ~safe[n, choice] & safe.any(axis=1)
+    return np.where(blocked, np.argmax(safe, axis=1), choice)
+
+
+def run_batch(policy, n_games=1024, n_steps=1000, seed=None, **kwargs):
+    """Steps n_games lockstep games n_steps times with policy(engine) -> actions."""
+    engine = BatchSnakeEngine(n_games, seed=seed, **kwargs)
+    for _ in range(n_steps):
+        engine.step(policy(engine))
+    return engine
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    engine = run_batch(greedy_actions, n_games=4096, n_steps=1000, seed=0)
+    elapsed = time.perf_counter() - start
+    transitions = engine.n_games * 1000
+    print("%d transitions in %.2fs (%.0f/s), %d games finished" %
+          (transitions, elapsed, transitions / elapsed, engine.games_finished))
@@ -0,0 +1,265 @@
+"""
+Benchmarks for the per-tick hot paths
+Micro-benchmarks time the state queries, feature extraction, logging and
+decision functions on synthetic GameStates with snake lengths from 3 to 2000
+segments. The flood-fill decision is timed on one game stepped through real
+ticks, so its labels are synced incrementally as in play, and
+reachability.rebuild times the cold start. Macro-benchmarks measure headless
+ticks/sec per policy and the lockstep batch engine. Nothing here needs a display. The Weka agent is timed
+through its compiled tree when one matches the model, otherwise through the
+inference server given with --server or a local JVM; when none of them is
+available its entries are listed as skipped in the report.
+
+Results are written as JSON; --compare flags the entries that got slower
+than a previous run by more than --threshold.
+
+Usage:
+    python benchmark_suite.py --out bench.json
+    python benchmark_suite.py --out bench-new.json --compare bench.json
+    python benchmark_suite.py --server /tmp/snake-weka.sock
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+import bitboard
+from arff_logger import ArffLogger
+from batch_engine import greedy_actions, run_batch
+from features import arff_header, arff_row, extract
+from policies import flood_fill_count, make_weka_policy, move_flood_fill, move_tutorial_1
+from prediction_cache import PredictionCache
+from reachability import Reachability
+from snake_engine import SnakeEngine, get_body_distances, get_safe_moves, run_games
+from tree_engine import TreePredictor, is_current
+
+LENGTHS = (3, 50, 200, 800, 2000)
+
+
+def synthetic_state(length):
+    # Zig-zag body from the bottom right corner, heading left, food in the opposite corner
+    game = bitboard.zigzag_state(length)
+    game.direction = "LEFT"
+    game.food_pos = [0, 0]
+    return game
+
+
+def playable_state(length):
+    # The same zig-zag entered from the other end: the head is next to the free cells
+    game = synthetic_state(length)
+    game.snake_body.reverse()
+    game.snake_pos = list(game.snake_body[0])
+    (head_x, head_y), (neck_x, neck_y) = game.snake_body[:2]
+    game.direction = ("LEFT" if head_x < neck_x else "RIGHT" if head_x > neck_x
+                      else "UP" if head_y < neck_y else "DOWN")
+    game.rebuild_index()
+    return game
+
+
+def weka_backend(model, dataset, server=None):
+    """
+    (predictor, backend, None) for the Weka model, uncached, or (None, None, reason)
+    when it cannot be run here.
+    """
+    if is_current(model):
+        return TreePredictor(), "compiled", None
+    if server is not None:
+        from inference_server import InferenceClient
+        client = InferenceClient(server)
+        try:
+            client.stats()
+        except OSError as error:
+            return None, None, "no inference server at %s (%s)" % (server, error)
+        return client, "server", None
+    try:
+        from wekaI import Weka
+    except ImportError as error:
+        return None, None, "no compiled tree, server or JVM (%s)" % error
+    weka = Weka()
+    try:
+        weka.start_jvm(preload=[(model, dataset)])
+    except Exception as error:
+        return None, None, "the JVM did not start (%s)" % error
+    return weka, "jvm", None
+
+
+def time_call(func, repeat=5):
+    """Best time per call in microseconds."""
+    timer = timeit.Timer(func)
+    # Enough calls per run for at least 0.2s
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+
+def stepped_call(policy, state, repeat=5, min_seconds=0.2):
+    """
+    Best mean time per decision in microseconds while a game is stepped with the moves the
+    policy chooses, so the state it keeps per game (the Reachability of move_flood_fill) is
+    updated incrementally as in a real game. A finished game restarts from a copy of state;
+    the first decision on each copy builds that state and is not timed.
+    """
+    engine = SnakeEngine()
+    clock = time.perf_counter
+    best = None
+    for _ in range(repeat):
+        game = None
+        elapsed = 0.0
+        calls = 0
+        while elapsed < min_seconds:
+            if game is None:
+                game = state.copy()
+                game, reward, done = engine.step(game, policy(game))
+                if done:
+                    raise ValueError("The game ends on its first move, there is nothing to time")
+            else:
+                before = clock()
+                action = policy(game)
+                elapsed += clock() - before
+                calls += 1
+                game, reward, done = engine.step(game, action)
+            if done:
+                game = None
+        mean = elapsed / calls * 1e6
+        best = mean if best is None else min(best, mean)
+    return best
+
+
+def micro_benchmarks(lengths, model, dataset, repeat, weka=None):
+    results = {}
+    log_dir = tempfile.mkdtemp(prefix="bench-")
+    logger = ArffLogger(os.path.join(log_dir, "bench.arff"), arff_header())
+    # Uncached: the same state is timed over and over, a PredictionCache would only be hit
+    weka_policy = make_weka_policy(weka, model, dataset) if weka is not None else None
+
+    for length in lengths:
+        game = synthetic_state(length)
+        reach = Reachability(game.grid_w, game.grid_h)
+        start = (0, 0)
+        cases = {
+            "get_safe_moves": lambda: get_safe_moves(game),
+            "get_body_distances": lambda: get_body_distances(game),
+            "flood_fill_count.bfs": lambda: flood_fill_count(game, start),
+            "flood_fill_count.bitboard": lambda: bitboard.flood_fill_count(game, start),
+            "reachability.rebuild": lambda: reach.rebuild(game.snake_body),
+            "features.extract": lambda: extract(game),
+            # What print_line_data does per tick
+            "print_line_data": lambda: logger.write(arff_row(extract(game), game.direction)),
+            "decision.move_tutorial_1": lambda: move_tutorial_1(game),
+            # What DecisionPipeline hands to the worker every tick
+            "state.copy": lambda: game.copy(),
+        }
+        if weka_policy is not None:
+            x = extract(game)
+            # Weka.predict appends the class to the vector it is given
+            cases["weka.predict"] = lambda: weka.predict(model, list(x), dataset)
+            cases["decision.move_weka_agent"] = lambda: weka_policy(game)
+        for name, func in cases.items():
+            results["%s[%d]" % (name, length)] = {"value": time_call(func, repeat), "unit": "us", "better": "lower"}
+            # Keep the logger queue from growing without bound
+            logger.flush()
+        # Steady state: the labels are synced tick by tick (reachability.rebuild is the cold start)
+        results["decision.move_flood_fill[%d]" % length] = {
+            "value": stepped_call(move_flood_fill, playable_state(length), repeat), "unit": "us", "better": "lower"}
+    logger.close()
+    shutil.rmtree(log_dir, ignore_errors=True)
+    return results
+
+
+def macro_benchmarks(games, model, dataset, weka=None):
+    results = {}
+    engine = SnakeEngine()
+    policies = {"greedy": move_tutorial_1, "flood_fill": move_flood_fill}
+    if weka is not None:
+        # Cached like in SnakeGame.py
+        policies["weka"] = make_weka_policy(PredictionCache(weka), model, dataset)
+    for name, policy in policies.items():
+        start = time.perf_counter()
+        played = run_games(policy, n_games=games, max_ticks=5000, engine=engine, seeds=list(range(games)))
+        elapsed = time.perf_counter() - start
+        ticks = sum(game["ticks"] for game in played)
+        results["e2e.%s" % name] = {"value": ticks / elapsed, "unit": "ticks/s", "better": "higher"}
+
+    start = time.perf_counter()
+    batch = run_batch(greedy_actions, n_games=1024, n_steps=200, seed=0)
+    elapsed = time.perf_counter() - start
+    results["e2e.batch_greedy"] = {"value": batch.n_games * 200 / elapsed, "unit": "ticks/s", "better": "higher"}
+    return results
+
+
+def compare(current, baseline, threshold):
+    """Prints current vs baseline and returns the names that regressed by more than threshold."""
+    regressions = []
+    print("%-40s %14s %14s %9s" % ("benchmark", "baseline", "current", "change"))
+    for name, result in sorted(current.items()):
+        if name not in baseline:
+            continue
+        old, new = baseline[name]["value"], result["value"]
+        # Positive change means slower / worse
+        worse = new - old if result["better"] == "lower" else old - new
+        if old:
+            change = worse / old
+        else:
+            change = 0.0 if not worse else float("inf") if worse > 0 else float("-inf")
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("%-40s %14.2f %14.2f %+8.1f%%%s" % (name, old, new, change * 100, flag))
+    return regressions
+
+
+def run(lengths=LENGTHS, games=20, model="RT7.model", dataset="snake_game_log_hand.arff", repeat=5,
+        server=None):
+    weka, backend, reason = weka_backend(model, dataset, server)
+    skipped = {}
+    if weka is None:
+        for name in ("weka.predict[*]", "decision.move_weka_agent[*]", "e2e.weka"):
+            skipped[name] = reason
+    try:
+        results = micro_benchmarks(lengths, model, dataset, repeat, weka)
+        results.update(macro_benchmarks(games, model, dataset, weka))
+    finally:
+        if weka is not None:
+            weka.stop_jvm()
+    return {
+        "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+                 "platform": platform.platform(), "machine": platform.machine(),
+                 "weka_backend": backend, "skipped": skipped},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the per-tick hot paths")
+    parser.add_argument("--out", default="benchmarks.json")
+    parser.add_argument("--compare", default=None, help="Previous results to check for regressions")
+    # Sub-microsecond calls easily vary by 10-20% between runs on a busy machine
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--lengths", type=int, nargs="+", default=list(LENGTHS))
+    parser.add_argument("--games", type=int, default=20, help="Seeded games per policy for the ticks/sec runs")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--model", default="RT7.model", help="Weka model timed through its compiled tree, --server or a JVM")
+    parser.add_argument("--dataset", default="snake_game_log_hand.arff")
+    parser.add_argument("--server", default=None, help="inference_server.py socket for the Weka timings")
+    args = parser.parse_args()
+
+    report = run(args.lengths, args.games, args.model, args.dataset, args.repeat, args.server)
+    for name, reason in report["meta"]["skipped"].items():
+        print("[!] Skipped %s: %s" % (name, reason))
+    with open(args.out, "w") as file:
+        json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(report["results"], baseline, args.threshold)
+        print("%d regressions" % len(regressions))
+        sys.exit(1 if regressions else 0)
+    for name, result in report["results"].items():
+        print("%-40s %14.2f %s" % (name, result["value"], result["unit"]))
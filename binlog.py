@@ -0,0 +1,246 @@
+"""
+Binary columnar game logs
+Append-only files of fixed-width records (int8/int16/int32 features,
+uint8 class codes) behind a small JSON schema header. Readers memory-map
+the records and get every column as a zero-copy NumPy view; converters
+in both directions keep the data usable from Weka.
+
+Layout:
+    b"SNAKEBIN"  magic
+    uint32       length of the JSON schema (padded to 8 bytes)
+    JSON         {"relation": ..., "columns": [{"name", "dtype", "values"}]}
+    records      packed little-endian rows, one per tick
+
+Missing values ('?') are NaN in float columns and the largest code of the
+type (missing_code) in nominal columns, which therefore hold at most 255
+(uint8) or 65535 (uint16) values. A direction that is not one of the class
+values is stored as missing, where the ARFF logger writes -1.
+
+Usage:
+    python binlog.py to-bin snake_game_log_hand.arff snake_game_log_hand.bin
+    python binlog.py to-arff snake_game_log_hand.bin snake_game_log_hand.arff
+"""
+
+import argparse
+import atexit
+import json
+import os
+import struct
+
+import numpy as np
+
+import features
+from arff_reader import ArffAttribute, ArffHeader, iter_chunks, read_header
+
+MAGIC = b"SNAKEBIN"
+
+
+def missing_code(dtype):
+    """Code of a missing value in a nominal column of this integer type."""
+    return np.iinfo(dtype).max
+
+
+class BinarySchema:
+
+    def __init__(self, relation, columns):
+        self.relation = relation
+        # [{"name": ..., "dtype": "int16", "values": None or [nominal values]}]
+        self.columns = columns
+        self.dtype = np.dtype([(c["name"], np.dtype(c["dtype"]).newbyteorder("<")) for c in columns])
+
+    @classmethod
+    def from_features(cls, relation=features.RELATION, feature_list=None):
+        columns = [{"name": f.name, "dtype": f.dtype, "values": None} for f in feature_list or features.FEATURES]
+        columns.append({"name": features.CLASS_NAME, "dtype": "uint8", "values": features.CLASS_VALUES})
+        return cls(relation, columns)
+
+    @classmethod
+    def from_arff_header(cls, header, low, high):
+        """Narrowest integer type for every column given its range (float64 if not integral)."""
+        columns = []
+        for i, attribute in enumerate(header.attributes):
+            if attribute.is_nominal:
+                dtype = "uint8" if len(attribute.values) <= 255 else "uint16"
+            elif low[i] is None:
+                dtype = "float64"
+            elif np.iinfo(np.int8).min <= low[i] and high[i] <= np.iinfo(np.int8).max:
+                dtype = "int8"
+            elif np.iinfo(np.int16).min <= low[i] and high[i] <= np.iinfo(np.int16).max:
+                dtype = "int16"
+            elif np.iinfo(np.int32).min <= low[i] and high[i] <= np.iinfo(np.int32).max:
+                dtype = "int32"
+            else:
+                dtype = "int64"
+            columns.append({"name": attribute.name, "dtype": dtype, "values": attribute.values})
+        return cls(header.relation, columns)
+
+    def to_arff_header(self):
+        attributes = [ArffAttribute(c["name"], "nominal", c["values"]) if c["values"] is not None
+                      else ArffAttribute(c["name"], "numeric") for c in self.columns]
+        return ArffHeader(self.relation, attributes)
+
+    def encode(self):
+        data = json.dumps({"relation": self.relation, "columns": self.columns}).encode("utf-8")
+        # Records start on an 8-byte boundary so the memory map is aligned
+        data += b" " * (-(len(MAGIC) + 4 + len(data)) % 8)
+        return MAGIC + struct.pack("<I", len(data)) + data
+
+    def __eq__(self, other):
+        return self.relation == other.relation and self.columns == other.columns
+
+
+def read_schema(path):
+    """Returns (schema, offset of the first record)."""
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a binary snake log" % path)
+        (size,) = struct.unpack("<I", file.read(4))
+        meta = json.loads(file.read(size).decode("utf-8"))
+    return BinarySchema(meta["relation"], meta["columns"]), len(MAGIC) + 4 + size
+
+
+class BinaryLogWriter:
+    """Appends rows to a binary log, buffering batch_size records in memory."""
+
+    def __init__(self, path, schema=None, batch_size=4096):
+        self.path = path
+        self.schema = schema or BinarySchema.from_features()
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            existing, _ = read_schema(path)
+            if existing != self.schema:
+                raise ValueError("%s was written with a different schema" % path)
+            self._file = open(path, "ab")
+        else:
+            self._file = open(path, "wb")
+            self._file.write(self.schema.encode())
+        self._buffer = np.zeros(batch_size, dtype=self.schema.dtype)
+        self._count = 0
+        self.rows_written = 0
+        atexit.register(self.close)
+
+    def write(self, row):
+        """row holds one value per column (class as its value index)."""
+        self._buffer[self._count] = tuple(row)
+        self._count += 1
+        if self._count == len(self._buffer):
+            self.flush()
+
+    def write_features(self, x, direction):
+        class_dtype = self.schema.dtype[features.CLASS_NAME]
+        code = features.DIRECTIONS.index(direction) if direction in features.DIRECTIONS else missing_code(class_dtype)
+        self.write(list(x) + [code])
+
+    def write_array(self, rows):
+        # Bulk append of a 2-D array with one column per schema column
+        self.flush()
+        records = np.zeros(len(rows), dtype=self.schema.dtype)
+        for i, (name, spec) in enumerate(zip(self.schema.dtype.names, self.schema.columns)):
+            column = rows[:, i]
+            if spec["values"] is not None and np.isnan(column).any():
+                column = np.where(np.isnan(column), missing_code(records.dtype[name]), column)
+            if np.issubdtype(records.dtype[name], np.integer):
+                info = np.iinfo(records.dtype[name])
+                if len(column) and (column.min() < info.min or column.max() > info.max):
+                    raise OverflowError("Column %s does not fit in %s" % (name, records.dtype[name]))
+            records[name] = column
+        self._file.write(records.tobytes())
+        self.rows_written += len(records)
+
+    def flush(self):
+        if self._count:
+            self._file.write(self._buffer[:self._count].tobytes())
+            self.rows_written += self._count
+            self._count = 0
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+def open_binlog(path):
+    """Memory-maps a binary log; returns (schema, records) where records[name] is a zero-copy column."""
+    schema, offset = read_schema(path)
+    rows = (os.path.getsize(path) - offset) // schema.dtype.itemsize
+    if rows == 0:
+        return schema, np.zeros(0, dtype=schema.dtype)
+    return schema, np.memmap(path, dtype=schema.dtype, mode="r", offset=offset, shape=(rows,))
+
+
+def as_matrix(records, dtype=np.float64, schema=None):
+    """
+    Copies the records into a (rows, columns) array, e.g. for training. With the schema,
+    missing nominal values become NaN as in arff_reader.
+    """
+    columns = []
+    for i, name in enumerate(records.dtype.names):
+        column = records[name].astype(dtype)
+        if schema is not None and schema.columns[i]["values"] is not None:
+            column[records[name] == missing_code(records.dtype[name])] = np.nan
+        columns.append(column)
+    return np.stack(columns, axis=1)
+
+
+def arff_to_binlog(arff_path, bin_path, chunk_size=65536):
+    """Two streaming passes: column ranges to choose the types, then the conversion."""
+    with open(arff_path, "r") as file:
+        header = read_header(file)
+    n = len(header.attributes)
+    low, high = [None] * n, [None] * n
+    integral = [True] * n
+    for _, data in iter_chunks(arff_path, chunk_size):
+        for i in range(n):
+            column = data[:, i]
+            if np.isnan(column).any() or not np.all(column == np.round(column)):
+                integral[i] = False
+            low[i] = column.min() if low[i] is None else min(low[i], column.min())
+            high[i] = column.max() if high[i] is None else max(high[i], column.max())
+    low = [v if ok else None for v, ok in zip(low, integral)]
+    schema = BinarySchema.from_arff_header(header, low, high)
+
+    if os.path.exists(bin_path):
+        os.remove(bin_path)
+    writer = BinaryLogWriter(bin_path, schema)
+    for _, data in iter_chunks(arff_path, chunk_size):
+        writer.write_array(data)
+    writer.close()
+    return writer.rows_written
+
+
+def binlog_to_arff(bin_path, arff_path, chunk_size=65536):
+    schema, records = open_binlog(bin_path)
+    nominal = [c["values"] for c in schema.columns]
+    names = records.dtype.names
+    with open(arff_path, "w") as file:
+        file.write(schema.to_arff_header().to_arff())
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start:start + chunk_size]
+            columns = []
+            for name, values in zip(names, nominal):
+                column = chunk[name]
+                if values is not None:
+                    labels = np.array(values + ["?"], dtype=object)
+                    # Missing codes -> the extra "?" label
+                    columns.append(labels[np.minimum(column, len(values))])
+                elif np.issubdtype(column.dtype, np.integer):
+                    columns.append(column.astype(str))
+                else:
+                    columns.append(np.array(["%.17g" % v if v == v else "?" for v in column], dtype=object))
+            file.write("".join(",".join(row) + "\n" for row in zip(*columns)))
+    return len(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert between ARFF and binary snake logs")
+    parser.add_argument("command", choices=["to-bin", "to-arff"])
+    parser.add_argument("source")
+    parser.add_argument("target")
+    args = parser.parse_args()
+
+    if args.command == "to-bin":
+        rows = arff_to_binlog(args.source, args.target)
+    else:
+        rows = binlog_to_arff(args.source, args.target)
+    print("%d rows: %s (%d bytes) -> %s (%d bytes)" % (rows, args.source, os.path.getsize(args.source),
+                                                      args.target, os.path.getsize(args.target)))
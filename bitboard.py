@@ -0,0 +1,96 @@
+"""
+Bitboard grid for the flood-fill agent
+The 48x48 board is one arbitrary-precision int with a row stride of 49 bits:
+bit y*49 + x is cell (x, y) and bit 48 of every row is an always-empty guard,
+so shifting by 1 never wraps a cell into the neighbouring row. Shifting by
+49 moves a whole row. GameState keeps body_bits in this layout.
+
+Flood fill grows the reachable set with four masked shifts per step,
+instead of allocating a tuple per visited cell.
+
+Usage:
+    python bitboard.py   # benchmark against policies.flood_fill_count
+"""
+
+import time
+from functools import lru_cache
+
+from snake_engine import FRAME_SIZE_X, FRAME_SIZE_Y, CELL_SIZE, GameState
+
+
+class Bitboard:
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.stride = width + 1
+        row = (1 << width) - 1
+        self.full = 0
+        for y in range(height):
+            self.full |= row << (y * self.stride)
+
+    def bit(self, x, y):
+        # Bit of the cell at pixel position (x, y); 0 when it is off the board
+        cx, cy = x // CELL_SIZE, y // CELL_SIZE
+        if 0 <= cx < self.width and 0 <= cy < self.height:
+            return 1 << (cy * self.stride + cx)
+        return 0
+
+    def free(self, body_bits):
+        return self.full ^ body_bits
+
+    def flood_fill(self, free, start):
+        """Bits reachable from the start bits through free cells (start included if free)."""
+        stride = self.stride
+        reach = start & free
+        while True:
+            grown = (reach | (reach << 1) | (reach >> 1) | (reach << stride) | (reach >> stride)) & free
+            if grown == reach:
+                return reach
+            reach = grown
+
+
+@lru_cache(maxsize=None)
+def board_for(width, height):
+    return Bitboard(width, height)
+
+
+def flood_fill_count(game, start):
+    # Same result as policies.flood_fill_count for a free start cell
+    board = board_for(game.grid_w, game.grid_h)
+    return board.flood_fill(board.free(game.body_bits), board.bit(*start)).bit_count()
+
+
+def zigzag_state(length):
+    """GameState whose body zig-zags row by row from the bottom right corner (for benchmarks)."""
+    game = GameState((FRAME_SIZE_X, FRAME_SIZE_Y))
+    width = FRAME_SIZE_X // CELL_SIZE
+    body = []
+    for i in range(length):
+        y, x = divmod(i, width)
+        x = x if y % 2 == 0 else width - 1 - x
+        body.append([FRAME_SIZE_X - CELL_SIZE - x * CELL_SIZE, FRAME_SIZE_Y - CELL_SIZE - y * CELL_SIZE])
+    game.snake_body = body
+    game.snake_pos = list(body[0])
+    game.rebuild_index()
+    return game
+
+
+def benchmark(lengths=(3, 50, 200, 800, 1600), repeat=20):
+    from policies import flood_fill_count as flood_fill_count_bfs
+    print("%8s %12s %12s %8s" % ("length", "bfs (us)", "bits (us)", "speedup"))
+    for length in lengths:
+        game = zigzag_state(length)
+        start = (0, 0)
+        assert flood_fill_count_bfs(game, start) == flood_fill_count(game, start)
+        timings = []
+        for fill in (flood_fill_count_bfs, flood_fill_count):
+            begin = time.perf_counter()
+            for _ in range(repeat):
+                fill(game, start)
+            timings.append((time.perf_counter() - begin) / repeat * 1e6)
+        print("%8d %12.1f %12.1f %7.1fx" % (length, timings[0], timings[1], timings[0] / timings[1]))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,114 @@
+"""
+Non-blocking decision pipeline
+Runs a policy on a worker thread and waits at most `deadline` seconds per
+tick for its move. When the move is late, the cheap fallback policy
+(move_tutorial_1 by default) decides that tick instead, so a JVM pause or a
+slow model load costs one greedy move rather than a frozen frame.
+
+While a late decision is still running no new one is submitted. Its result
+belongs to an older state, so it is dropped when it arrives.
+
+Usage:
+    pipeline = DecisionPipeline(lambda game, x: move_weka_agent(game, weka, x),
+                                deadline=0.5 / DIFFICULTY,
+                                initializer=weka.attach_thread, finalizer=weka.detach_thread)
+    game.direction = pipeline.decide(game, features)
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import BrokenExecutor, ThreadPoolExecutor, TimeoutError
+
+from policies import move_tutorial_1
+
+
+class DecisionPipeline:
+
+    def __init__(self, policy, fallback=move_tutorial_1, deadline=0.05, initializer=None, finalizer=None,
+                 history=4096):
+        self.policy = policy
+        self.fallback = fallback
+        self.deadline = deadline
+        self._finalizer = finalizer
+        # One worker: the policy (and the JVM thread it may attach) always runs on the same thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="decision", initializer=initializer)
+        self._pending = None
+        self._lock = threading.Lock()
+        # Latency of the last `history` policy calls, including the late ones
+        self._latencies = deque(maxlen=history)
+        self.decisions = 0
+        self.on_time = 0
+        self.missed = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_error = None
+        # perf_counter() of the first move the policy delivered in time
+        self.first_on_time = None
+
+    def _run(self, game, args):
+        start = time.perf_counter()
+        try:
+            return self.policy(game, *args)
+        finally:
+            with self._lock:
+                self._latencies.append(time.perf_counter() - start)
+
+    def decide(self, game, *args):
+        """Move for this tick: the policy's if it answers within the deadline, else the fallback's."""
+        self.decisions += 1
+        if self._pending is not None and not self._pending.done():
+            # The worker is still busy with an older state
+            self.skipped += 1
+            return self.fallback(game)
+
+        try:
+            # The policy gets its own copy, the main loop keeps stepping the original. Submitting
+            # raises once a failing initializer (e.g. a JVM that did not start) broke the pool
+            self._pending = self._executor.submit(self._run, game.copy(), args)
+            move = self._pending.result(timeout=self.deadline)
+        except TimeoutError:
+            self.missed += 1
+            return self.fallback(game)
+        except Exception as error:
+            self.errors += 1
+            self.last_error = error
+            self._pending = None
+            return self.fallback(game)
+        self._pending = None
+        self.on_time += 1
+        if self.first_on_time is None:
+            self.first_on_time = time.perf_counter()
+        return move
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))] * 1e3
+
+        return {
+            "decisions": self.decisions,
+            "on_time": self.on_time,
+            "missed": self.missed,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "fallback_rate": (self.missed + self.skipped + self.errors) / self.decisions if self.decisions else 0.0,
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "p99_ms": percentile(99),
+            "max_ms": latencies[-1] * 1e3 if latencies else 0.0,
+        }
+
+    def close(self):
+        # The finalizer (e.g. detaching the JVM thread) runs on the worker after any pending decision
+        if self._finalizer is not None:
+            try:
+                self._executor.submit(self._finalizer)
+            except (BrokenExecutor, RuntimeError):
+                # The worker never started, there is nothing to finalize
+                pass
+        self._executor.shutdown(wait=True)
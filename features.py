@@ -0,0 +1,155 @@
+"""
+Feature schema shared by the ARFF logger and the Weka agent.
+Every attribute is declared once with an expression over a context of
+shared intermediate values. The expressions only use arithmetic,
+comparisons and &/|, so the same declaration evaluates on a single
+GameState (plain ints) and on a BatchSnakeEngine (NumPy arrays).
+"""
+
+import numpy as np
+
+from snake_engine import FRAME_SIZE_X, CELL_SIZE, get_safe_moves, get_body_distances
+
+RELATION = "snake_game"
+
+
+class Feature:
+    def __init__(self, name, compute, dtype="int16"):
+        self.name = name
+        self.compute = compute
+        # Column type in the binary logs (binlog.py)
+        self.dtype = dtype
+
+
+FEATURES = [
+    Feature("snake_pos_x", lambda c: c.head_x),
+    Feature("snake_pos_y", lambda c: c.head_y),
+    Feature("snake_body_length", lambda c: c.length),
+    Feature("food_pos_x", lambda c: c.food_x),
+    Feature("food_pos_y", lambda c: c.food_y),
+    Feature("horizontal_distance", lambda c: c.food_x - c.head_x),
+    Feature("vertical_distance", lambda c: c.food_y - c.head_y),
+    Feature("score", lambda c: c.score, "int32"),
+    Feature("left_safe", lambda c: c.left_safe, "int8"),
+    Feature("right_safe", lambda c: c.right_safe, "int8"),
+    Feature("up_safe", lambda c: c.up_safe, "int8"),
+    Feature("down_safe", lambda c: c.down_safe, "int8"),
+    Feature("left_distance", lambda c: c.left_dist),
+    Feature("right_distance", lambda c: c.right_dist),
+    Feature("up_distance", lambda c: c.up_dist),
+    Feature("down_distance", lambda c: c.down_dist),
+    # Same expressions the logs (and the models trained on them) were recorded with
+    Feature("food_in_row", lambda c: (c.head_y == c.food_y) & (c.head_x > c.food_x) | (c.head_x < c.food_x), "int8"),
+    Feature("food_in_col", lambda c: (c.head_x == c.food_x) & (c.head_y > c.food_y) | (c.head_y < c.food_y), "int8"),
+    Feature("food_in_up", lambda c: c.head_y > c.food_y, "int8"),
+    Feature("food_in_down", lambda c: c.head_y < c.food_y, "int8"),
+    Feature("food_in_left", lambda c: c.head_x > c.food_x, "int8"),
+    Feature("food_in_right", lambda c: c.head_x < c.food_x, "int8"),
+]
+
+# Attributes that depend on game.direction (the reverse move is never safe)
+DIRECTION_FEATURES = ("left_safe", "right_safe", "up_safe", "down_safe")
+
+CLASS_NAME = "New_direction"
+# Class values follow the direction encoding of the logs
+CLASS_VALUES = ["0", "1", "2", "3"]
+DIRECTIONS = ["LEFT", "RIGHT", "UP", "DOWN"]
+DIRECTION_LABEL = {direction: label for direction, label in zip(DIRECTIONS, CLASS_VALUES)}
+LABEL_DIRECTION = {label: direction for direction, label in DIRECTION_LABEL.items()}
+
+
+class GameContext:
+    """Intermediate values of one GameState, computed once per tick."""
+
+    def __init__(self, game):
+        self.head_x, self.head_y = game.snake_pos
+        self.food_x, self.food_y = game.food_pos
+        self.length = len(game.snake_body)
+        self.score = game.score
+        safe = get_safe_moves(game)
+        self.left_safe = safe["LEFT"]
+        self.right_safe = safe["RIGHT"]
+        self.up_safe = safe["UP"]
+        self.down_safe = safe["DOWN"]
+        self.left_dist, self.right_dist, self.up_dist, self.down_dist = get_body_distances(game)
+
+
+class BatchContext:
+    """Intermediate values of every game of a BatchSnakeEngine, in pixels."""
+
+    def __init__(self, engine):
+        n = np.arange(engine.n_games)
+        cx = np.clip(engine.head[:, 0], 0, engine.width - 1)
+        cy = np.clip(engine.head[:, 1], 0, engine.height - 1)
+        self.head_x = engine.head[:, 0] * CELL_SIZE
+        self.head_y = engine.head[:, 1] * CELL_SIZE
+        self.food_x = engine.food[:, 0] * CELL_SIZE
+        self.food_y = engine.food[:, 1] * CELL_SIZE
+        self.length = engine.length
+        self.score = engine.score
+        safe = engine.safe_moves()
+        self.left_safe, self.right_safe, self.up_safe, self.down_safe = safe.T
+
+        # Nearest occupied cell on each side of the head in its row and column
+        row = engine.grid[n, cy, :] > 0
+        col = engine.grid[n, :, cx] > 0
+        xs = np.arange(engine.width)
+        ys = np.arange(engine.height)
+        left = np.where(row & (xs < cx[:, None]), xs, -1).max(axis=1)
+        right = np.where(row & (xs > cx[:, None]), xs, engine.width).min(axis=1)
+        up = np.where(col & (ys < cy[:, None]), ys, -1).max(axis=1)
+        down = np.where(col & (ys > cy[:, None]), ys, engine.height).min(axis=1)
+        self.left_dist = np.where(left >= 0, (cx - left) * CELL_SIZE, FRAME_SIZE_X)
+        self.right_dist = np.where(right < engine.width, (right - cx) * CELL_SIZE, FRAME_SIZE_X)
+        self.up_dist = np.where(up >= 0, (cy - up) * CELL_SIZE, FRAME_SIZE_X)
+        self.down_dist = np.where(down < engine.height, (down - cy) * CELL_SIZE, FRAME_SIZE_X)
+
+
+def extract(game, features=None):
+    """Feature vector of a GameState, in FEATURES order (or in the order of the given features)."""
+    ctx = GameContext(game)
+    return [int(feature.compute(ctx)) for feature in features or FEATURES]
+
+
+def logged_features(x, game, features=None):
+    """
+    x with the DIRECTION_FEATURES recomputed for game.direction, the move just chosen. The logs
+    take the safe flags after the decision and the agent before it; everything else is the same.
+    """
+    safe = get_safe_moves(game)
+    ctx = SafeContext(safe["LEFT"], safe["RIGHT"], safe["UP"], safe["DOWN"])
+    x = list(x)
+    for i, feature in enumerate(features or FEATURES):
+        if feature.name in DIRECTION_FEATURES:
+            x[i] = int(feature.compute(ctx))
+    return x
+
+
+class SafeContext:
+    """The safe flags of a GameContext, for logged_features."""
+
+    def __init__(self, left_safe, right_safe, up_safe, down_safe):
+        self.left_safe = left_safe
+        self.right_safe = right_safe
+        self.up_safe = up_safe
+        self.down_safe = down_safe
+
+
+def extract_batch(engine):
+    """(N, len(FEATURES)) int array with the features of every game of a BatchSnakeEngine."""
+    ctx = BatchContext(engine)
+    columns = [np.broadcast_to(feature.compute(ctx), (engine.n_games,)) for feature in FEATURES]
+    return np.stack(columns, axis=1).astype(np.int64)
+
+
+def arff_header(relation=RELATION, features=None):
+    lines = ["@RELATION " + relation, ""]
+    lines += ["@ATTRIBUTE %s numeric" % feature.name for feature in features or FEATURES]
+    lines.append("@attribute %s {%s}" % (CLASS_NAME, ",".join("'%s'" % v for v in CLASS_VALUES)))
+    lines += ["", "@DATA", ""]
+    return "\n".join(lines)
+
+
+def arff_row(x, direction):
+    """One @DATA line for feature vector x labelled with the chosen direction."""
+    return ",".join(str(v) for v in x) + "," + DIRECTION_LABEL.get(direction, "-1") + "\n"
@@ -0,0 +1,91 @@
+"""
+Fixed-timestep game loop
+Decouples the simulation rate from the render rate. The game advances in
+fixed ticks of 1/tick_rate seconds driven by an accumulator, while the
+screen is refreshed at most render_fps times per second; when the
+simulation falls behind, several ticks run before the next frame (frames
+are skipped, ticks never are). Lag beyond max_lag seconds is dropped instead
+of being caught up in a burst.
+
+In uncapped mode the simulation runs as fast as possible and events and
+rendering happen render_fps times per second of wall time.
+"""
+
+import time
+
+
+class GameLoop:
+
+    def __init__(self, tick_rate, render_fps=60, uncapped=False, max_lag=0.25):
+        self.tick_rate = tick_rate
+        self.render_fps = render_fps
+        self.uncapped = uncapped
+        self.max_lag = max_lag
+        self.ticks = 0
+        self.frames = 0
+        self.dropped = 0.0
+        self.elapsed = 0.0
+        self.running = False
+
+    def stop(self):
+        self.running = False
+
+    def run(self, handle_events, update, render):
+        """
+        handle_events() polls the input, update() advances the game one tick and
+        returns True when it is over, render() draws the current state.
+        """
+        clock = time.perf_counter
+        dt = 1.0 / self.tick_rate
+        frame = 1.0 / self.render_fps
+        self.running = True
+        start = previous = next_frame = clock()
+        lag = 0.0
+        try:
+            while self.running:
+                now = clock()
+                if self.uncapped:
+                    if now >= next_frame:
+                        handle_events()
+                        render()
+                        self.frames += 1
+                        next_frame = now + frame
+                    self.ticks += 1
+                    if update():
+                        return
+                    continue
+
+                lag += now - previous
+                previous = now
+                if lag > self.max_lag:
+                    self.dropped += lag - self.max_lag
+                    lag = self.max_lag
+                handle_events()
+                while lag >= dt and self.running:
+                    lag -= dt
+                    self.ticks += 1
+                    if update():
+                        return
+                if now >= next_frame:
+                    render()
+                    self.frames += 1
+                    next_frame = now + frame
+
+                # Sleep until the next tick or frame is due
+                delay = min(now + dt - lag, next_frame) - clock()
+                if delay > 0:
+                    time.sleep(delay)
+        finally:
+            self.running = False
+            self.elapsed = clock() - start
+
+    def stats(self):
+        elapsed = self.elapsed or 1e-9
+        return {
+            "ticks": self.ticks,
+            "frames": self.frames,
+            "seconds": self.elapsed,
+            "ticks_per_sec": self.ticks / elapsed,
+            "fps": self.frames / elapsed,
+            "dropped_seconds": self.dropped,
+        }
@@ -0,0 +1,136 @@
+"""
+Self-play data generator
+Plays seeded headless games in K worker processes and writes the same rows
+as print_line_data (features of every tick labelled with the chosen move,
+plus the final state) to one ARFF or binary dataset.
+
+Games are split into fixed-size blocks and every block is written to its own
+shard; shards are merged in block order, so the output only depends on the
+policy, the seed and the number of games, never on the number of workers.
+
+Usage:
+    python generate_data.py --policy greedy --games 1000 --workers 8 --out greedy.arff
+    python generate_data.py --policy weka --model RT7.model --dataset snake_game_log_hand.arff --out weka.bin
+    python generate_data.py --policy weka --server /tmp/snake-weka.sock --workers 8 --out weka.arff
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from snake_engine import SnakeEngine
+from features import extract, logged_features, arff_header, arff_row, DIRECTIONS
+from binlog import BinarySchema
+from policies import load_policy
+
+_policy = None
+
+
+def game_seed(seed, index):
+    # Per-game food RNG seed, independent of the block/worker that plays the game
+    return seed * 1000003 + index
+
+
+def _init_worker(policy_name, model_path, dataset_path, server):
+    global _policy
+    _policy = load_policy(policy_name, model_path, dataset_path, server)
+
+
+def _play_block(task):
+    block, first_game, n_games, seed, max_ticks, fmt, shard_dir = task
+    engine = SnakeEngine()
+    schema = BinarySchema.from_features() if fmt == "bin" else None
+    rows = []
+    ticks = 0
+    for index in range(first_game, first_game + n_games):
+        game = engine.new_game(game_seed(seed, index))
+        done = False
+        game_ticks = 0
+        while not done and game_ticks < max_ticks:
+            x = extract(game)
+            game.direction = _policy(game)
+            rows.append((logged_features(x, game), game.direction))
+            game, reward, done = engine.step(game, game.direction)
+            game_ticks += 1
+        if done:
+            # Final state, as logged by game_over
+            rows.append((extract(game), game.direction))
+        ticks += game_ticks
+
+    path = os.path.join(shard_dir, "shard-%06d.%s" % (block, fmt))
+    if fmt == "arff":
+        with open(path, "w") as file:
+            file.write("".join(arff_row(x, direction) for x, direction in rows))
+    else:
+        records = np.zeros(len(rows), dtype=schema.dtype)
+        names = schema.dtype.names
+        values = np.array([x + [DIRECTIONS.index(direction)] for x, direction in rows], dtype=np.int64)
+        for i, name in enumerate(names):
+            records[name] = values[:, i]
+        with open(path, "wb") as file:
+            file.write(records.tobytes())
+    return block, path, len(rows), ticks
+
+
+def generate(policy, games, out, workers=None, seed=0, block_size=16, max_ticks=5000,
+             model_path=None, dataset_path=None, server=None):
+    fmt = "bin" if out.endswith(".bin") else "arff"
+    workers = workers or os.cpu_count()
+    shard_dir = tempfile.mkdtemp(prefix="shards-", dir=os.path.dirname(os.path.abspath(out)))
+    tasks = [(block, start, min(block_size, games - start), seed, max_ticks, fmt, shard_dir)
+             for block, start in enumerate(range(0, games, block_size))]
+
+    start = time.perf_counter()
+    rows = ticks = 0
+    try:
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=_init_worker, initargs=(policy, model_path, dataset_path, server)) as pool:
+            shards = {}
+            for block, path, n_rows, n_ticks in pool.imap_unordered(_play_block, tasks):
+                shards[block] = path
+                rows += n_rows
+                ticks += n_ticks
+            # Let the workers exit normally (leaving the with block terminates them) so they
+            # stop their JVM
+            pool.close()
+            pool.join()
+
+        # Merge the shards in block order
+        with open(out, "wb") as target:
+            if fmt == "arff":
+                target.write(arff_header().encode("utf-8"))
+            else:
+                target.write(BinarySchema.from_features().encode())
+            for block in sorted(shards):
+                with open(shards[block], "rb") as shard:
+                    shutil.copyfileobj(shard, target)
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+    return {"games": games, "rows": rows, "ticks": ticks, "seconds": elapsed,
+            "ticks_per_sec": ticks / elapsed if elapsed > 0 else 0.0}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate training data from headless self-play")
+    parser.add_argument("--policy", default="greedy", choices=["greedy", "flood_fill", "weka"])
+    parser.add_argument("--model", default="RT7.model", help="Weka model for --policy weka")
+    parser.add_argument("--dataset", default="snake_game_log_hand.arff", help="ARFF the model was trained on")
+    parser.add_argument("--server", default=None,
+                        help="Socket of an inference_server.py shared by the workers instead of one JVM each")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--block-size", type=int, default=16, help="Games per shard")
+    parser.add_argument("--max-ticks", type=int, default=5000, help="Ticks before a game is cut short")
+    parser.add_argument("--out", default="snake_game_log_selfplay.arff", help=".arff or .bin")
+    args = parser.parse_args()
+
+    stats = generate(args.policy, args.games, args.out, args.workers, args.seed, args.block_size,
+                     args.max_ticks, args.model, args.dataset, args.server)
+    print("%(games)d games, %(rows)d rows, %(ticks)d ticks in %(seconds).2fs (%(ticks_per_sec).0f ticks/s)" % stats)
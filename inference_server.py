@@ -0,0 +1,359 @@
+"""
+Local inference server
+One process owns the JVM and the loaded models and answers predictions over
+a Unix socket, so many game processes (generate_data.py workers, several
+windows...) share one warmed-up JVM instead of starting their own.
+
+Every message is a uint32 length followed by the payload:
+
+    request   uint8 op | model | arff | columns        (op 1: predict, op 3: distributions)
+              uint8 op                                 (op 2: stats)
+    response  uint8 status | columns or JSON           (status 1: error message)
+
+Strings are a uint16 length plus UTF-8 bytes. A block of columns starts with
+uint32 rows and uint16 columns; every column is then a uint8 kind followed by
+rows little-endian float64 values (kind 0) or rows strings (kind 1). Clients
+send the nominal attributes of the ARFF header as strings whatever their
+Python type, so a nominal '0' is not turned into 0.0. A predict request may carry any number of rows; the response holds
+one column with the prediction of each row. A distributions response holds
+one column per class value with the probability of each row.
+
+Usage:
+    python inference_server.py serve --preload RT7.model:snake_game_log_hand.arff
+    python inference_server.py stats
+    Weka(server="/tmp/snake-weka.sock").predict("RT7.model", x, "snake_game_log_hand.arff")
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from arff_reader import read_header
+
+DEFAULT_SOCKET = "/tmp/snake-weka.sock"
+
+OP_PREDICT = 1
+OP_STATS = 2
+OP_DISTRIBUTIONS = 3
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+KIND_NUMBER = 0
+KIND_STRING = 1
+
+
+def _pack_str(value):
+    data = value.encode("utf-8")
+    return struct.pack("<H", len(data)) + data
+
+
+def _unpack_str(data, offset):
+    (size,) = struct.unpack_from("<H", data, offset)
+    offset += 2
+    return data[offset:offset + size].decode("utf-8"), offset + size
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+
+
+def encode_columns(rows, nominal=()):
+    """Columns whose index is in nominal are always strings, the others are numbers when every value is."""
+    n_cols = len(rows[0]) if rows else 0
+    parts = [struct.pack("<IH", len(rows), n_cols)]
+    for j in range(n_cols):
+        column = [row[j] for row in rows]
+        if j not in nominal and all(_is_number(v) for v in column):
+            parts.append(bytes([KIND_NUMBER]))
+            parts.append(np.asarray(column, dtype="<f8").tobytes())
+        else:
+            parts.append(bytes([KIND_STRING]))
+            parts.extend(_pack_str(str(v)) for v in column)
+    return b"".join(parts)
+
+
+def decode_columns(data, offset=0):
+    """Returns (rows, offset after the block)."""
+    n_rows, n_cols = struct.unpack_from("<IH", data, offset)
+    offset += 6
+    columns = []
+    for _ in range(n_cols):
+        kind = data[offset]
+        offset += 1
+        if kind == KIND_NUMBER:
+            columns.append(np.frombuffer(data, dtype="<f8", count=n_rows, offset=offset).tolist())
+            offset += 8 * n_rows
+        else:
+            column = []
+            for _ in range(n_rows):
+                value, offset = _unpack_str(data, offset)
+                column.append(value)
+            columns.append(column)
+    return [list(row) for row in zip(*columns)] if n_cols else [[] for _ in range(n_rows)], offset
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock):
+    """Next message from sock, or None once the peer has closed the connection."""
+    prefix = _recv_exact(sock, 4)
+    if prefix is None:
+        return None
+    return _recv_exact(sock, struct.unpack("<I", prefix)[0])
+
+
+def send_frame(sock, payload):
+    sock.sendall(struct.pack("<I", len(payload)) + payload)
+
+
+class ModelMetrics:
+
+    def __init__(self, history=4096):
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.latencies = deque(maxlen=history)
+
+    def record(self, rows, seconds):
+        self.requests += 1
+        self.rows += rows
+        self.seconds += seconds
+        self.latencies.append(seconds)
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))] * 1e3
+
+        return {
+            "requests": self.requests,
+            "rows": self.rows,
+            "errors": self.errors,
+            "mean_ms": self.seconds / self.requests * 1e3 if self.requests else 0.0,
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "p99_ms": percentile(99),
+        }
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        try:
+            while True:
+                payload = recv_frame(self.request)
+                if payload is None:
+                    return
+                send_frame(self.request, self.server.dispatch(payload))
+        finally:
+            # Connection threads attached themselves to the JVM on their first prediction
+            self.server.predictor.detach_thread()
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves predictor.predict (Weka or TreePredictor) to the clients of a Unix socket."""
+
+    daemon_threads = True
+
+    def __init__(self, path, predictor, preload=()):
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket left behind by a server that did not shut down cleanly
+                os.remove(path)
+            else:
+                raise OSError("Another inference server is listening on %s" % path)
+            finally:
+                probe.close()
+        self.path = path
+        self.predictor = predictor
+        self.predictor.start_jvm(preload=preload)
+        self.started = time.time()
+        self.metrics = {}
+        # One JVM: predictions are serialized, batches amortize the round trip
+        self._lock = threading.Lock()
+        socketserver.UnixStreamServer.__init__(self, path, _Handler)
+
+    def dispatch(self, payload):
+        op = payload[0]
+        if op == OP_STATS:
+            return bytes([STATUS_OK]) + json.dumps(self.stats()).encode("utf-8")
+        if op not in (OP_PREDICT, OP_DISTRIBUTIONS):
+            return bytes([STATUS_ERROR]) + ("Unknown operation %d" % op).encode("utf-8")
+
+        modelName, offset = _unpack_str(payload, 1)
+        arffName, offset = _unpack_str(payload, offset)
+        rows, _ = decode_columns(payload, offset)
+        with self._lock:
+            metrics = self.metrics.setdefault(modelName, ModelMetrics())
+            start = time.perf_counter()
+            try:
+                # One code path whatever the number of rows, so ties resolve the same way
+                if op == OP_PREDICT:
+                    result = [[pred] for pred in self.predictor.predict_batch(modelName, rows, arffName)]
+                else:
+                    result = np.asarray(self.predictor.distribution_batch(modelName, rows, arffName)).tolist()
+            except Exception as error:
+                metrics.errors += 1
+                return bytes([STATUS_ERROR]) + ("%s: %s" % (type(error).__name__, error)).encode("utf-8")
+            metrics.record(len(rows), time.perf_counter() - start)
+        return bytes([STATUS_OK]) + encode_columns(result)
+
+    def stats(self):
+        return {
+            "uptime": time.time() - self.started,
+            "models": {name: metrics.summary() for name, metrics in self.metrics.items()},
+        }
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class InferenceError(RuntimeError):
+    pass
+
+
+class InferenceClient:
+    """Same predict signature as Weka, answered by an InferenceServer over a pool of connections."""
+
+    def __init__(self, path=DEFAULT_SOCKET, pool_size=4, timeout=None):
+        self.path = path
+        self.timeout = timeout
+        self._pool = queue.Queue(maxsize=pool_size)
+        # arffName -> indices of its nominal attributes
+        self._nominal = {}
+
+    def _nominal_columns(self, arffName):
+        # Sent as strings: the server looks nominal values up by their label
+        if not arffName:
+            return ()
+        columns = self._nominal.get(arffName)
+        if columns is None:
+            with open(arffName, "r") as file:
+                attributes = read_header(file).attributes
+            columns = self._nominal[arffName] = frozenset(
+                i for i, attribute in enumerate(attributes) if attribute.is_nominal)
+        return columns
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        return sock
+
+    def _request(self, payload):
+        try:
+            sock = self._pool.get_nowait()
+        except queue.Empty:
+            sock = self._connect()
+        try:
+            send_frame(sock, payload)
+            response = recv_frame(sock)
+            if response is None:
+                raise ConnectionError("Inference server at %s closed the connection" % self.path)
+        except BaseException:
+            sock.close()
+            raise
+        try:
+            self._pool.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+        if response[0] != STATUS_OK:
+            raise InferenceError(response[1:].decode("utf-8"))
+        return response[1:]
+
+    def _rows_request(self, op, modelName, X, arffName):
+        payload = (bytes([op]) + _pack_str(modelName) + _pack_str(arffName or "")
+                   + encode_columns([list(row) for row in X], self._nominal_columns(arffName)))
+        rows, _ = decode_columns(self._request(payload))
+        return rows
+
+    def predict_batch(self, modelName, X, arffName=None, debug=False):
+        rows = self._rows_request(OP_PREDICT, modelName, X, arffName)
+        return np.array([row[0] for row in rows], dtype=object)
+
+    def distribution_batch(self, modelName, X, arffName=None, debug=False):
+        return np.array(self._rows_request(OP_DISTRIBUTIONS, modelName, X, arffName), dtype=float)
+
+    def predict(self, modelName, x, arffName=None, debug=False):
+        pred = self.predict_batch(modelName, [x], arffName)[0]
+        if debug:
+            print(("Prediction", pred))
+        return pred
+
+    def stats(self):
+        return json.loads(self._request(bytes([OP_STATS])).decode("utf-8"))
+
+    # Nothing to start: the JVM lives in the server
+    def start_jvm(self, background=False, preload=()):
+        pass
+
+    def stop_jvm(self):
+        self.close()
+
+    def attach_thread(self):
+        pass
+
+    def detach_thread(self):
+        pass
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared Weka inference over a Unix socket")
+    parser.add_argument("command", choices=["serve", "stats"])
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--preload", action="append", default=[], metavar="MODEL:ARFF",
+                        help="Model to load and warm up before accepting connections")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(json.dumps(InferenceClient(args.socket).stats(), indent=2))
+    else:
+        from wekaI import Weka
+        preload = [tuple(item.split(":", 1)) for item in args.preload]
+        server = InferenceServer(args.socket, Weka(), preload)
+        print("[+] Serving on %s" % args.socket)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            server.predictor.stop_jvm()
+            for name, summary in server.stats()["models"].items():
+                print("%s: %d requests, %d rows, p50 %.2f ms, p99 %.2f ms"
+                      % (name, summary["requests"], summary["rows"], summary["p50_ms"], summary["p99_ms"]))
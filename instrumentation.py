@@ -0,0 +1,126 @@
+"""
+Per-phase tick instrumentation
+Times each phase of a tick (events, features, decision, logging,
+simulation, render) with perf_counter into a fixed-size ring buffer per
+phase, and every `report_every` seconds prints one compact line with the
+p50/p95/p99 of every phase and the tick rate. Each report can also be
+appended as a JSON line to a file.
+
+When disabled, phase() hands out a shared no-op context manager and tick()
+returns at once, so the calls can stay in the game loop.
+
+Usage:
+    timings = Instrumentation(report_every=5.0, dump="snake_timings.jsonl")
+    with timings.phase("decision"):
+        game.direction = move_tutorial_1(game)
+    timings.tick()
+"""
+
+import json
+import time
+from array import array
+
+
+class _NullPhase:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+
+    __slots__ = ("samples", "count", "_start")
+
+    def __init__(self, size):
+        self.samples = array("d", bytes(8 * size))
+        self.count = 0
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.record(time.perf_counter() - self._start)
+        return False
+
+    def record(self, seconds):
+        self.samples[self.count % len(self.samples)] = seconds
+        self.count += 1
+
+    def summary(self):
+        n = min(self.count, len(self.samples))
+        values = sorted(self.samples[:n])
+
+        def percentile(p):
+            return values[min(n - 1, int(p / 100.0 * n))] * 1e3 if n else 0.0
+
+        return {"count": self.count, "p50_ms": percentile(50), "p95_ms": percentile(95),
+                "p99_ms": percentile(99), "max_ms": values[-1] * 1e3 if n else 0.0}
+
+
+class Instrumentation:
+
+    def __init__(self, enabled=True, size=4096, report_every=5.0, dump=None):
+        self.enabled = enabled
+        self.size = size
+        self.report_every = report_every
+        self.phases = {}
+        self.ticks = 0
+        self._dump = open(dump, "a") if enabled and dump else None
+        self._started = self._last_report = time.perf_counter()
+        self._last_ticks = 0
+
+    def phase(self, name):
+        """Context manager timing one phase of the current tick."""
+        if not self.enabled:
+            return _NULL_PHASE
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = _Phase(self.size)
+        return phase
+
+    def tick(self):
+        if not self.enabled:
+            return
+        self.ticks += 1
+        if self.report_every and time.perf_counter() - self._last_report >= self.report_every:
+            self.report()
+
+    def summary(self):
+        now = time.perf_counter()
+        elapsed = now - self._last_report
+        return {
+            "time": now - self._started,
+            "ticks": self.ticks,
+            "ticks_per_sec": (self.ticks - self._last_ticks) / elapsed if elapsed > 0 else 0.0,
+            "phases": {name: phase.summary() for name, phase in self.phases.items()},
+        }
+
+    def report(self):
+        summary = self.summary()
+        self._last_report = time.perf_counter()
+        self._last_ticks = self.ticks
+        parts = ["[t] %.1f ticks/s" % summary["ticks_per_sec"]]
+        for name, stats in summary["phases"].items():
+            parts.append("%s %.2f/%.2f/%.2f ms" % (name, stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]))
+        print(" | ".join(parts))
+        if self._dump is not None:
+            self._dump.write(json.dumps(summary) + "\n")
+            self._dump.flush()
+        return summary
+
+    def close(self):
+        # Last report (p50/p95/p99 of the final window) and the dump file
+        if not self.enabled:
+            return
+        self.report()
+        if self._dump is not None:
+            self._dump.close()
+            self._dump = None
@@ -0,0 +1,131 @@
+"""
+Prediction memoization for tree models
+Consecutive ticks often produce feature vectors that only differ in
+attributes the tree never tests (score, absolute positions...), or differ
+within the same threshold interval. Such vectors reach the same leaf, so
+PredictionCache reduces every vector to the interval it falls in for each
+attribute the tree splits on and serves repeated keys from a bounded LRU.
+
+The split points come from the compiled tree (tree_engine.py): the exported
+.tree.npz when it matches the model, otherwise the model is compiled in
+memory through the JVM. Either way the tests are on the vector positions
+Weka reads (those of the header the model was trained on), so the key holds
+exactly what the model looks at. Models that are not trees, and predictors
+that cannot compile them (an inference server client, a backend without a
+JVM model registry), are cached on the exact vector.
+
+Usage:
+    predictor = PredictionCache(weka)
+    predictor.predict("RT7.model", x, "snake_game_log_hand.arff")
+    predictor.stats()
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from tree_engine import OP_LT, OP_LE, CompiledTree, TreeParseError, compiled_path, compile_model, is_current
+
+
+class SplitKey:
+    """Maps a feature vector to the bucket of every attribute the tree tests."""
+
+    def __init__(self, tree):
+        splits = {}
+        for feature, op, threshold in zip(tree.feature.tolist(), tree.op.tolist(), tree.threshold.tolist()):
+            if feature < 0:
+                continue
+            lt, le, eq = splits.setdefault(feature, (set(), set(), set()))
+            (lt if op == OP_LT else le if op == OP_LE else eq).add(threshold)
+        # (attribute, nominal index, sorted "<" points, sorted "<=" points, "==" values)
+        self.tests = [(feature, tree._nominal_index[feature], sorted(lt), sorted(le), frozenset(eq))
+                      for feature, (lt, le, eq) in sorted(splits.items())]
+        self.attributes = [tree.vector_attributes[feature] for feature, *_ in self.tests]
+
+    def __call__(self, x):
+        key = []
+        for feature, index, lt, le, eq in self.tests:
+            value = x[feature]
+            value = float(value) if index is None else index[str(value)]
+            # x < t holds for the thresholds above the number of points <= x, x <= t for those >= x
+            if lt:
+                key.append(bisect_right(lt, value))
+            if le:
+                key.append(bisect_left(le, value))
+            if eq:
+                key.append(value if value in eq else None)
+        return tuple(key)
+
+
+def _exact_key(x):
+    return tuple(str(v) for v in x)
+
+
+class PredictionCache:
+    """
+    Memoizes predictor.predict (Weka or TreePredictor) behind the same signature.
+    Other attributes (start_jvm, stop_jvm...) are forwarded to the predictor.
+    """
+
+    def __init__(self, predictor, max_entries=4096):
+        self.predictor = predictor
+        self.max_entries = max_entries
+        self.keys = {}
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getattr__(self, name):
+        return getattr(self.predictor, name)
+
+    def _can_compile(self):
+        # Compiling needs the models in this process (a Weka with a local JVM), not behind a server
+        predictor = self.predictor
+        return getattr(predictor, "registry", None) is not None and getattr(predictor, "client", None) is None
+
+    def key_function(self, modelName, arffName=None):
+        keys = self.keys.get(modelName)
+        if keys is None:
+            if is_current(modelName):
+                keys = SplitKey(CompiledTree.load(compiled_path(modelName)))
+            elif self._can_compile():
+                try:
+                    keys = SplitKey(compile_model(self.predictor, modelName, arffName))
+                except TreeParseError:
+                    # Not a tree: only identical vectors are shared
+                    keys = _exact_key
+            else:
+                keys = _exact_key
+            self.keys[modelName] = keys
+        return keys
+
+    def predict(self, modelName, x, arffName=None, debug=False):
+        key = (modelName, self.key_function(modelName, arffName)(x))
+        entries = self._entries
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        self.misses += 1
+        # Weka.predict appends the class to x, so it gets its own list
+        pred = self.predictor.predict(modelName, list(x), arffName, debug)
+        entries[key] = pred
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return pred
+
+    def clear(self):
+        self._entries.clear()
+        self.keys.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "hit_rate": self.hits / total if total else 0.0,
+            "attributes": {model: getattr(keys, "attributes", None) for model, keys in self.keys.items()},
+        }
@@ -0,0 +1,211 @@
+"""
+Incremental reachability of the free cells
+Labels the connected components of the free cells once and keeps the
+labelling up to date as the snake moves: a vacated tail cell merges the
+components around it (the smaller ones are relabelled into the largest)
+and a new head cell may split its component, which is detected with a
+parallel BFS from its free neighbours that stops as soon as they meet.
+
+area(x, y) then answers "how many cells are reachable from (x, y)" for
+every candidate move from the same labelling, so the cost per tick does
+not grow with the snake.
+"""
+
+import weakref
+from collections import deque
+
+from snake_engine import CELL_SIZE
+
+
+class Reachability:
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.neighbours = []
+        for cell in range(width * height):
+            y, x = divmod(cell, width)
+            self.neighbours.append([cell + d for d, ok in ((-1, x > 0), (1, x < width - 1),
+                                                           (-width, y > 0), (width, y < height - 1)) if ok])
+        self._body = None
+        self.rebuilds = 0
+
+    def _cell(self, pos):
+        cx, cy = pos[0] // CELL_SIZE, pos[1] // CELL_SIZE
+        if 0 <= cx < self.width and 0 <= cy < self.height:
+            return cy * self.width + cx
+        return None
+
+    def rebuild(self, body):
+        self.rebuilds += 1
+        self.count = bytearray(self.width * self.height)
+        for pos in body:
+            cell = self._cell(pos)
+            if cell is not None:
+                self.count[cell] += 1
+        self.labels = [0] * (self.width * self.height)
+        self.members = {}
+        self._next_label = 1
+        for cell in range(self.width * self.height):
+            if not self.count[cell] and not self.labels[cell]:
+                self._flood(cell, self._new_label())
+        self._body = deque(tuple(pos) for pos in body)
+
+    def _new_label(self):
+        label = self._next_label
+        self._next_label += 1
+        self.members[label] = set()
+        return label
+
+    def _flood(self, start, label):
+        labels, count, neighbours = self.labels, self.count, self.neighbours
+        members = self.members[label]
+        labels[start] = label
+        members.add(start)
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            for n in neighbours[cell]:
+                if not count[n] and labels[n] != label:
+                    labels[n] = label
+                    members.add(n)
+                    queue.append(n)
+
+    def _vacate(self, cell):
+        labels = self.labels
+        around = {labels[n] for n in self.neighbours[cell] if not self.count[n]}
+        if not around:
+            target = self._new_label()
+        else:
+            # Union by size: relabel the smaller components into the largest one
+            target = max(around, key=lambda label: len(self.members[label]))
+            for label in around:
+                if label != target:
+                    cells = self.members.pop(label)
+                    for c in cells:
+                        labels[c] = target
+                    self.members[target] |= cells
+        labels[cell] = target
+        self.members[target].add(cell)
+
+    def _occupy(self, cell):
+        labels = self.labels
+        label = labels[cell]
+        labels[cell] = 0
+        self.members[label].discard(cell)
+        seeds = [n for n in self.neighbours[cell] if not self.count[n]]
+        if len(seeds) > 1:
+            self._split(label, seeds)
+        elif not self.members[label]:
+            del self.members[label]
+
+    def _split(self, label, seeds):
+        # One BFS per free neighbour, expanded in turns. Searches that meet are merged;
+        # a search that runs out of cells before meeting the others is a new component.
+        labels, count, neighbours = self.labels, self.count, self.neighbours
+        k = len(seeds)
+        parent = list(range(k))
+
+        def find(g):
+            while parent[g] != g:
+                g = parent[g]
+            return g
+
+        owner = {seed: g for g, seed in enumerate(seeds)}
+        visited = [[seed] for seed in seeds]
+        frontiers = [deque([seed]) for seed in seeds]
+        closed = set()
+        while True:
+            roots = {find(g) for g in range(k)} - closed
+            if len(roots) <= 1:
+                return
+            for g in range(k):
+                if find(g) in closed or not frontiers[g]:
+                    continue
+                cell = frontiers[g].popleft()
+                for n in neighbours[cell]:
+                    if count[n] or labels[n] != label:
+                        continue
+                    other = owner.get(n)
+                    if other is None:
+                        owner[n] = g
+                        visited[g].append(n)
+                        frontiers[g].append(n)
+                    else:
+                        a, b = find(g), find(other)
+                        if a != b:
+                            parent[a] = b
+            for root in roots:
+                # Merged into another search during this round: handled under that root
+                if find(root) != root:
+                    continue
+                groups = [g for g in range(k) if find(g) == root]
+                if any(frontiers[g] for g in groups):
+                    continue
+                if len({find(g) for g in range(k)} - closed) <= 1:
+                    return
+                # Closed off from the other searches: relabel it as its own component
+                closed.add(root)
+                new_label = self._new_label()
+                cells = self.members[new_label]
+                for g in groups:
+                    for c in visited[g]:
+                        labels[c] = new_label
+                        cells.add(c)
+                self.members[label] -= cells
+
+    def sync(self, game):
+        """Brings the labelling up to date with game.snake_body."""
+        body = game.snake_body
+        tracked = self._body
+        if tracked is None or not tracked:
+            self.rebuild(body)
+            return
+        # Heads pushed since the last sync sit in front of the previous head
+        last_head = tracked[0]
+        pushed = None
+        for i in range(min(len(body), 4)):
+            if body[i][0] == last_head[0] and body[i][1] == last_head[1]:
+                pushed = i
+                break
+        popped = None if pushed is None else len(tracked) + pushed - len(body)
+        if pushed is None or popped < 0 or popped >= len(tracked):
+            self.rebuild(body)
+            return
+
+        count = self.count
+        for _ in range(popped):
+            cell = self._cell(tracked.pop())
+            if cell is not None:
+                count[cell] -= 1
+                if not count[cell]:
+                    self._vacate(cell)
+        for i in range(pushed - 1, -1, -1):
+            pos = body[i]
+            tracked.appendleft((pos[0], pos[1]))
+            cell = self._cell(pos)
+            if cell is not None:
+                count[cell] += 1
+                if count[cell] == 1:
+                    self._occupy(cell)
+        if tracked[-1] != tuple(body[-1]):
+            self.rebuild(body)
+
+    def area(self, pos):
+        """Number of free cells reachable from pos (0 if pos is blocked or off the board)."""
+        cell = self._cell(pos)
+        if cell is None or not self.labels[cell]:
+            return 0
+        return len(self.members[self.labels[cell]])
+
+
+_by_game = weakref.WeakKeyDictionary()
+
+
+def reachability_for(game):
+    """Reachability kept for a GameState across ticks, synced with its current body."""
+    reach = _by_game.get(game)
+    if reach is None:
+        reach = _by_game[game] = Reachability(game.grid_w, game.grid_h)
+    reach.sync(game)
+    return reach
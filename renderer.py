@@ -0,0 +1,148 @@
+"""
+Dirty-rectangle renderer for the pygame front ends
+Instead of filling the window and drawing every body segment each frame,
+Renderer repaints only the cells whose content may have changed since the
+last frame (new head cells, vacated tail cells, old and new food) plus the
+score area, and passes just those rects to pygame.display.update. The cost of
+a frame therefore does not depend on the length of the snake.
+
+Fonts are created once and the score is composed from glyphs rendered once.
+"""
+
+from collections import deque
+from functools import lru_cache
+
+import pygame
+
+from snake_engine import FRAME_SIZE_X, CELL_SIZE
+
+
+@lru_cache(maxsize=None)
+def font(name, size):
+    # pygame.font.SysFont looks the font up and loads it on every call
+    return pygame.font.SysFont(name, size)
+
+
+class ScoreText:
+    """'Score : N' composed from the pre-rendered prefix and digit glyphs."""
+
+    def __init__(self, name, size, color):
+        score_font = font(name, size)
+        self.prefix = score_font.render('Score : ', True, color)
+        self.glyphs = {c: score_font.render(c, True, color) for c in "0123456789-"}
+
+    def surfaces(self, score):
+        return [self.prefix] + [self.glyphs[c] for c in str(score)]
+
+    def rect(self, score, midtop):
+        surfaces = self.surfaces(score)
+        rect = pygame.Rect(0, 0, sum(s.get_width() for s in surfaces), max(s.get_height() for s in surfaces))
+        rect.midtop = midtop
+        return rect
+
+    def blit(self, window, score, midtop):
+        rect = self.rect(score, midtop)
+        x = rect.left
+        for surface in self.surfaces(score):
+            window.blit(surface, (x, rect.top))
+            x += surface.get_width()
+        return rect
+
+
+class Renderer:
+
+    def __init__(self, window, background, snake, food, text, score_font=('consolas', 15),
+                 score_midtop=(FRAME_SIZE_X/8, 15)):
+        self.window = window
+        self.background = background
+        self.snake = snake
+        self.food = food
+        self.score_text = ScoreText(score_font[0], score_font[1], text)
+        self.score_midtop = score_midtop
+        self.bounds = window.get_rect()
+        self._body = None
+        self._food = None
+        self._score = None
+        self._score_rect = None
+        self.full_redraws = 0
+
+    def _paint(self, game, x, y):
+        # Colour of the cell at (x, y) in the current state
+        rect = pygame.Rect(x, y, CELL_SIZE, CELL_SIZE)
+        if [x, y] == list(game.food_pos):
+            color = self.food
+        elif game.segments_at(x, y):
+            color = self.snake
+        else:
+            color = self.background
+        self.window.fill(color, rect)
+        return rect
+
+    def _remember(self, game):
+        self._body = deque((pos[0], pos[1]) for pos in game.snake_body)
+        self._food = (game.food_pos[0], game.food_pos[1])
+
+    def redraw(self, game):
+        """Full frame, e.g. for a new game."""
+        self.full_redraws += 1
+        self.window.fill(self.background)
+        for pos in game.snake_body:
+            self.window.fill(self.snake, pygame.Rect(pos[0], pos[1], CELL_SIZE, CELL_SIZE))
+        self.window.fill(self.food, pygame.Rect(game.food_pos[0], game.food_pos[1], CELL_SIZE, CELL_SIZE))
+        self._score = game.score
+        self._score_rect = self.score_text.blit(self.window, game.score, self.score_midtop)
+        self._remember(game)
+        pygame.display.update()
+        return [self.bounds]
+
+    def _changed_cells(self, game):
+        # Cells pushed in front of the last drawn head and cells popped from its tail,
+        # or None when the body cannot be matched with the last frame
+        body = game.snake_body
+        tracked = self._body
+        if not tracked:
+            return None
+        last_head = tracked[0]
+        pushed = None
+        for i, pos in enumerate(body):
+            if pos[0] == last_head[0] and pos[1] == last_head[1]:
+                pushed = i
+                break
+        if pushed is None:
+            return None
+        popped = len(tracked) + pushed - len(body)
+        if popped < 0 or popped > len(tracked):
+            return None
+        cells = [tracked.pop() for _ in range(popped)]
+        for i in range(pushed - 1, -1, -1):
+            tracked.appendleft((body[i][0], body[i][1]))
+            cells.append(tracked[0])
+        if tracked[-1] != (body[-1][0], body[-1][1]):
+            return None
+        return cells
+
+    def draw(self, game):
+        """Repaints what changed since the last frame and updates only those rects."""
+        cells = self._changed_cells(game)
+        if cells is None:
+            return self.redraw(game)
+        food = (game.food_pos[0], game.food_pos[1])
+        if food != self._food:
+            cells.append(self._food)
+            cells.append(food)
+            self._food = food
+
+        dirty = [self._paint(game, x, y) for x, y in cells if self.bounds.collidepoint(x, y)]
+        score_rect = self._score_rect
+        if game.score != self._score or score_rect.collidelist(dirty) != -1:
+            # The score sits on top of the board: repaint the cells under it and blit it again
+            new_rect = self.score_text.rect(game.score, self.score_midtop)
+            area = score_rect.union(new_rect)
+            for cy in range(area.top // CELL_SIZE, (area.bottom - 1) // CELL_SIZE + 1):
+                for cx in range(area.left // CELL_SIZE, (area.right - 1) // CELL_SIZE + 1):
+                    dirty.append(self._paint(game, cx * CELL_SIZE, cy * CELL_SIZE))
+            self._score = game.score
+            self._score_rect = self.score_text.blit(self.window, game.score, self.score_midtop)
+        if dirty:
+            pygame.display.update(dirty)
+        return dirty
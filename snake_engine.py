@@ -0,0 +1,253 @@
+"""
+Headless Snake engine
+Game rules shared by the pygame front ends and the offline tools.
+Nothing here imports pygame, so games can be simulated at full CPU speed.
+"""
+
+import copy
+import random
+import time
+from bisect import bisect_left, bisect_right, insort
+
+# Window size
+FRAME_SIZE_X = 480
+FRAME_SIZE_Y = 480
+
+# Size of a snake segment / food cell in pixels
+CELL_SIZE = 10
+
+# GAME STATE CLASS
+class GameState:
+    def __init__(self, FRAME_SIZE, rng=None):
+        # Food spawns come from rng (e.g. random.Random(seed)) so seeded games are reproducible
+        self.rng = rng or random
+        self.snake_pos = [100, 50]
+        self.snake_body = [[100, 50], [100-10, 50], [100-(2*10), 50]]
+        self.food_pos = [self.rng.randrange(1, (FRAME_SIZE[0]//10)) * 10, self.rng.randrange(1, (FRAME_SIZE[1]//10)) * 10]
+        self.food_spawn = True
+        self.direction = 'RIGHT'
+        self.change_to = self.direction
+        self.score = 0
+        self.outcome = "continue"
+        # "wall" or "self" once the game is over
+        self.death_cause = None
+        # Occupancy index of snake_body, kept in sync by push_head/pop_tail
+        self.grid_w = FRAME_SIZE[0] // 10
+        self.grid_h = FRAME_SIZE[1] // 10
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        # Segment count per cell plus the sorted x of the segments in each row and y in each column
+        self.grid = bytearray(self.grid_w * self.grid_h)
+        # Occupied cells as one int, bit cy * (grid_w + 1) + cx (see bitboard.py)
+        self.body_bits = 0
+        self.row_segments = [[] for _ in range(self.grid_h)]
+        self.col_segments = [[] for _ in range(self.grid_w)]
+        for x, y in self.snake_body:
+            self._index(x, y, 1)
+
+    def _index(self, x, y, delta):
+        cx, cy = x // 10, y // 10
+        if 0 <= cx < self.grid_w and 0 <= cy < self.grid_h:
+            cell = cy * self.grid_w + cx
+            self.grid[cell] += delta
+            if self.grid[cell] == (1 if delta > 0 else 0):
+                self.body_bits ^= 1 << (cy * (self.grid_w + 1) + cx)
+            if delta > 0:
+                insort(self.row_segments[cy], x)
+                insort(self.col_segments[cx], y)
+            else:
+                row = self.row_segments[cy]
+                del row[bisect_left(row, x)]
+                col = self.col_segments[cx]
+                del col[bisect_left(col, y)]
+
+    def push_head(self, pos):
+        self.snake_body.insert(0, pos)
+        self._index(pos[0], pos[1], 1)
+
+    def pop_tail(self):
+        tail = self.snake_body.pop()
+        self._index(tail[0], tail[1], -1)
+        return tail
+
+    def copy(self):
+        # Independent copy of the state (the food rng is shared), e.g. for a policy on another thread
+        other = copy.copy(self)
+        other.snake_pos = list(self.snake_pos)
+        other.snake_body = [list(pos) for pos in self.snake_body]
+        other.food_pos = list(self.food_pos)
+        other.grid = bytearray(self.grid)
+        other.row_segments = [list(row) for row in self.row_segments]
+        other.col_segments = [list(col) for col in self.col_segments]
+        return other
+
+    def segments_at(self, x, y):
+        # Number of body segments on the cell at pixel position (x, y)
+        cx, cy = x // 10, y // 10
+        if 0 <= cx < self.grid_w and 0 <= cy < self.grid_h:
+            return self.grid[cy * self.grid_w + cx]
+        return 0
+
+
+def get_safe_moves(game):
+
+    left_safe  = False
+    right_safe = False
+    up_safe    = False
+    down_safe  = False
+
+    head_x, head_y = game.snake_pos
+    if game.direction != 'RIGHT':
+        left_safe  = (head_x - 10 >= 0) and not game.segments_at(head_x - 10, head_y)
+    if game.direction != 'LEFT':
+        right_safe = (head_x + 10 < FRAME_SIZE_X) and not game.segments_at(head_x + 10, head_y)
+    if game.direction != 'DOWN':
+        up_safe    = (head_y - 10 >= 0) and not game.segments_at(head_x, head_y - 10)
+    if game.direction != 'UP':
+        down_safe  = (head_y + 10 < FRAME_SIZE_Y) and not game.segments_at(head_x, head_y + 10)
+
+    return {
+        "LEFT": left_safe,
+        "RIGHT": right_safe,
+        "UP": up_safe,
+        "DOWN": down_safe
+    }
+
+
+def future_score(game):
+
+    predicted_score = game.score
+
+    next_pos = game.snake_pos[:]
+    if game.direction == 'UP':
+        next_pos[1] -= 10
+    elif game.direction == 'DOWN':
+        next_pos[1] += 10
+    elif game.direction == 'LEFT':
+        next_pos[0] -= 10
+    elif game.direction == 'RIGHT':
+        next_pos[0] += 10
+
+    if next_pos == game.food_pos:
+        predicted_score += 100
+    else:
+        predicted_score -= 1
+    return predicted_score
+
+
+def get_body_distances(game):
+    head_x, head_y = game.snake_pos
+    left_dist = right_dist = up_dist = down_dist = FRAME_SIZE_X  # Default max value
+
+    # Nearest segments on each side of the head from the sorted row/column indexes.
+    # The head itself sits exactly at head_x/head_y, so the strict bisects skip it.
+    if 0 <= head_y // 10 < game.grid_h:
+        row = game.row_segments[head_y // 10]
+        i = bisect_left(row, head_x)
+        if i > 0:  # Left
+            left_dist = min(left_dist, head_x - row[i - 1])
+        i = bisect_right(row, head_x)
+        if i < len(row):  # Right
+            right_dist = min(right_dist, row[i] - head_x)
+    if 0 <= head_x // 10 < game.grid_w:
+        col = game.col_segments[head_x // 10]
+        i = bisect_left(col, head_y)
+        if i > 0:  # Up
+            up_dist = min(up_dist, head_y - col[i - 1])
+        i = bisect_right(col, head_y)
+        if i < len(col):  # Down
+            down_dist = min(down_dist, col[i] - head_y)
+
+    return left_dist, right_dist, up_dist, down_dist
+
+
+class SnakeEngine:
+    """
+    Applies one game tick: moves the head, grows or pops the tail,
+    respawns the food and checks the game over conditions.
+    """
+
+    def __init__(self, frame_size=(FRAME_SIZE_X, FRAME_SIZE_Y)):
+        self.frame_size_x, self.frame_size_y = frame_size
+
+    def new_game(self, seed=None):
+        rng = random.Random(seed) if seed is not None else None
+        return GameState((self.frame_size_x, self.frame_size_y), rng)
+
+    def step(self, game, action):
+        """Returns (state, reward, done) after moving the snake towards action."""
+        game.direction = action
+
+        # Moving the snake
+        if game.direction == 'UP':
+            game.snake_pos[1] -= 10
+        if game.direction == 'DOWN':
+            game.snake_pos[1] += 10
+        if game.direction == 'LEFT':
+            game.snake_pos[0] -= 10
+        if game.direction == 'RIGHT':
+            game.snake_pos[0] += 10
+
+        # Snake body growing mechanism
+        game.push_head(list(game.snake_pos))
+        if game.snake_pos[0] == game.food_pos[0] and game.snake_pos[1] == game.food_pos[1]:
+            game.score += 100
+            reward = 100
+            game.food_spawn = False
+        else:
+            game.pop_tail()
+            game.score -= 1
+            reward = -1
+
+        # Spawning food on the screen
+        if not game.food_spawn:
+            game.food_pos = [game.rng.randrange(1, (self.frame_size_x//10)) * 10, game.rng.randrange(1, (self.frame_size_y//10)) * 10]
+        game.food_spawn = True
+
+        # Game Over conditions
+        # Getting out of bounds
+        done = (game.snake_pos[0] < 0 or game.snake_pos[0] > self.frame_size_x-10 or
+                game.snake_pos[1] < 0 or game.snake_pos[1] > self.frame_size_y-10)
+        if done:
+            game.death_cause = "wall"
+        # Touching the snake body (the head shares its cell with another segment)
+        elif game.segments_at(game.snake_pos[0], game.snake_pos[1]) > 1:
+            done = True
+            game.death_cause = "self"
+        if done:
+            game.outcome = "gameover"
+        return game, reward, done
+
+
+def run_games(policy, n_games=1000, max_ticks=20000, engine=None, on_step=None, seeds=None):
+    """
+    Plays n_games back-to-back with policy(game) -> direction, without any display.
+    on_step(game, action, reward, done) is called after every tick when given.
+    seeds optionally gives the food RNG seed of every game.
+    Returns one dict per game with its final score, length, ticks survived and death cause.
+    """
+    engine = engine or SnakeEngine()
+    results = []
+    for i in range(n_games):
+        game = engine.new_game(None if seeds is None else seeds[i])
+        ticks = 0
+        done = False
+        while not done and ticks < max_ticks:
+            action = policy(game)
+            game, reward, done = engine.step(game, action)
+            ticks += 1
+            if on_step is not None:
+                on_step(game, action, reward, done)
+        results.append({"score": game.score, "length": len(game.snake_body), "ticks": ticks, "done": done,
+                        "death_cause": game.death_cause})
+    return results
+
+
+if __name__ == "__main__":
+    from policies import move_tutorial_1
+    start = time.perf_counter()
+    results = run_games(move_tutorial_1, n_games=100)
+    elapsed = time.perf_counter() - start
+    ticks = sum(r["ticks"] for r in results)
+    print("%d games, %d ticks in %.2fs (%.0f ticks/s)" % (len(results), ticks, elapsed, ticks / elapsed))
@@ -0,0 +1,17 @@
+from arff_dedup import dedup, group_by_schema
+
+HEADER_A = "@relation a\n\n@attribute x numeric\n@attribute New_direction {0,1}\n\n@data\n"
+HEADER_B = "@relation b\n\n@attribute x numeric\n@attribute y numeric\n@attribute New_direction {0,1}\n\n@data\n"
+
+
+def test_inputs_are_grouped_by_header(tmp_path):
+    paths = []
+    for name, text in [("a1.arff", HEADER_A + "1,0\n1,0\n"), ("b.arff", HEADER_B + "1,2,1\n"),
+                       ("a2.arff", HEADER_A + "1,0\n2,1\n")]:
+        (tmp_path / name).write_text(text)
+        paths.append(str(tmp_path / name))
+    groups = group_by_schema(paths)
+    assert groups == [[paths[0], paths[2]], [paths[1]]]
+
+    summary = dedup(groups[0], str(tmp_path / "a_dedup.arff"))
+    assert (summary["rows_in"], summary["rows_out"]) == (4, 2)
@@ -0,0 +1,27 @@
+from concurrent.futures import BrokenExecutor
+
+from decision_pipeline import DecisionPipeline
+from snake_engine import SnakeEngine
+
+
+def failing_initializer():
+    raise RuntimeError("JVM did not start")
+
+
+def test_broken_worker_falls_back_on_every_tick():
+    game = SnakeEngine().new_game(0)
+    pipeline = DecisionPipeline(lambda game: "UP", fallback=lambda game: "DOWN", deadline=1.0,
+                                initializer=failing_initializer, finalizer=lambda: None)
+    for _ in range(10):
+        assert pipeline.decide(game) == "DOWN"
+    assert pipeline.errors == 10
+    assert isinstance(pipeline.last_error, BrokenExecutor)
+    pipeline.close()
+
+
+def test_policy_move_in_time():
+    game = SnakeEngine().new_game(0)
+    pipeline = DecisionPipeline(lambda game: "UP", fallback=lambda game: "DOWN", deadline=1.0)
+    assert pipeline.decide(game) == "UP"
+    assert pipeline.on_time == 1
+    pipeline.close()
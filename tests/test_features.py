@@ -0,0 +1,27 @@
+from features import DIRECTION_FEATURES, FEATURES, extract, logged_features
+from policies import move_tutorial_1
+from snake_engine import SnakeEngine
+
+REVERSE_SAFE = {"LEFT": "right_safe", "RIGHT": "left_safe", "UP": "down_safe", "DOWN": "up_safe"}
+NAMES = [feature.name for feature in FEATURES]
+
+
+def test_logged_rows_never_mark_the_reverse_move_safe():
+    # As in snake_game_log_hand.arff: the safe flags are taken after the decision
+    engine = SnakeEngine()
+    changed = 0
+    for seed in range(5):
+        game = engine.new_game(seed)
+        done = False
+        ticks = 0
+        while not done and ticks < 2000:
+            x = extract(game)
+            game.direction = move_tutorial_1(game)
+            row = logged_features(x, game)
+            assert row[NAMES.index(REVERSE_SAFE[game.direction])] == 0
+            # Only the safe flags may differ from the features the decision was taken on
+            assert all(name in DIRECTION_FEATURES for name, a, b in zip(NAMES, row, x) if a != b)
+            changed += row != x
+            game, reward, done = engine.step(game, game.direction)
+            ticks += 1
+    assert changed > 0
@@ -0,0 +1,96 @@
+import os
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+from inference_server import InferenceClient, InferenceServer
+
+
+class FakePredictor:
+    """Class "1" when the first value is positive, with its probability in the second column."""
+
+    def start_jvm(self, background=False, preload=()):
+        pass
+
+    def detach_thread(self):
+        pass
+
+    def distribution_batch(self, modelName, X, arffName=None):
+        return np.array([[0.2, 0.8] if row[0] > 0 else [0.5, 0.5] for row in X])
+
+    def predict_batch(self, modelName, X, arffName=None):
+        labels = np.array(["0", "1"], dtype=object)
+        return labels[np.argmax(self.distribution_batch(modelName, X, arffName), axis=1)]
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "weka.sock")
+    server = InferenceServer(path, FakePredictor())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def test_single_rows_and_batches_agree(server):
+    client = InferenceClient(server)
+    X = [[1.0, 0.0], [-1.0, 0.0], [0.0, 3.0]]
+    assert list(client.predict_batch("m", X)) == ["1", "0", "0"]
+    # Tied distributions resolve to the first class on both paths
+    assert [client.predict("m", x) for x in X] == ["1", "0", "0"]
+    client.close()
+
+
+def test_distributions(server):
+    client = InferenceClient(server)
+    dists = client.distribution_batch("m", [[1.0], [-1.0]])
+    assert dists.tolist() == [[0.2, 0.8], [0.5, 0.5]]
+    client.close()
+
+
+def test_live_socket_is_not_taken_over(server):
+    with pytest.raises(OSError):
+        InferenceServer(server, FakePredictor())
+    assert InferenceClient(server).predict("m", [1.0]) == "1"
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    path = str(tmp_path / "stale.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    assert os.path.exists(path)
+    server = InferenceServer(path, FakePredictor())
+    server.server_close()
+
+
+class EchoPredictor(FakePredictor):
+    """Predicts the first value of every row as the server received it."""
+
+    def predict_batch(self, modelName, X, arffName=None):
+        return np.array([row[0] for row in X], dtype=object)
+
+
+def test_numeric_looking_nominal_values_stay_labels(tmp_path):
+    arff = tmp_path / "log.arff"
+    arff.write_text("@relation r\n\n@attribute dir {'0','1'}\n@attribute score numeric\n"
+                    "@attribute New_direction {'0','1'}\n\n@data\n")
+    path = str(tmp_path / "echo.sock")
+    server = InferenceServer(path, EchoPredictor())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        client = InferenceClient(path)
+        # The nominal column arrives as the label "0", not as the number 0.0
+        assert client.predict("m", [0, 5], str(arff)) == "0"
+        assert list(client.predict_batch("m", [[1, 5], [0, 6]], str(arff))) == ["1", "0"]
+        # Without a header the values keep their Python type
+        assert client.predict("m", [0, 5]) == 0.0
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+import prediction_cache
+from prediction_cache import PredictionCache, SplitKey
+from tree_engine import CompiledTree, TreeParseError, compiled_path, model_digest
+
+ATTRIBUTES = ["snake_pos_x", "score", "up_safe", "left_safe", "New_direction"]
+NOMINAL = [None, None, None, None, ["0", "1", "2", "3"]]
+CLASSES = ["0", "1", "2", "3"]
+
+# Trained on a filtered header: up_safe and left_safe are positions 0 and 1
+MODEL_HEADER = (["up_safe", "left_safe", "New_direction"], [None, None, CLASSES], CLASSES)
+
+TREE = """
+up_safe < 0.5
+|   left_safe < 0.5 : 3 (12/0)
+|   left_safe >= 0.5 : 1 (30/2)
+up_safe >= 0.5 : 2 (41/3)
+"""
+
+
+class TreeModel:
+    """Stands in for Weka: classifies with the compiled tree and counts the calls."""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.calls = 0
+
+    def predict(self, modelName, x, arffName=None, debug=False):
+        self.calls += 1
+        return self.tree.label(self.tree.predict_one(self.tree.encode(x)))
+
+
+def make_tree():
+    return CompiledTree.from_text(TREE, ATTRIBUTES, NOMINAL, CLASSES, MODEL_HEADER)
+
+
+def test_key_uses_the_positions_the_model_reads():
+    keys = SplitKey(make_tree())
+    assert keys.attributes == ["snake_pos_x", "score"]
+    # up_safe/left_safe (positions 2 and 3) are never read by this model
+    assert keys([0, 0, 1, 1]) == keys([0, 0, 0, 0])
+    assert keys([0, 1, 0, 0]) != keys([0, 0, 0, 0])
+
+
+def test_cached_predictions_match_the_model(tmp_path):
+    model = str(tmp_path / "RT.model")
+    with open(model, "wb") as file:
+        file.write(b"model")
+    tree = make_tree()
+    tree.model_sha256 = model_digest(model)
+    tree.save(compiled_path(model))
+
+    backend = TreeModel(tree)
+    cache = PredictionCache(backend)
+    rng = random.Random(0)
+    for _ in range(500):
+        x = [rng.choice([0, 1]), rng.choice([0, 1]), rng.choice([0, 1]), rng.choice([0, 1])]
+        assert cache.predict(model, x) == TreeModel(tree).predict(model, x)
+    # Two tested positions with one threshold each: at most four distinct keys
+    assert backend.calls <= 4
+
+
+class LocalWeka:
+    """Looks like a Weka with its models in this process."""
+    registry = object()
+    client = None
+
+    def predict(self, modelName, x, arffName=None, debug=False):
+        return "0"
+
+
+def test_server_clients_use_exact_keys(monkeypatch):
+    def compile_model(*args):
+        raise AssertionError("nothing to compile without the models")
+    monkeypatch.setattr(prediction_cache, "compile_model", compile_model)
+    remote = LocalWeka()
+    remote.client = object()
+    cache = PredictionCache(remote)
+    assert cache.key_function("missing.model")([1, 2]) == ("1", "2")
+
+
+def test_models_that_are_not_trees_use_exact_keys(monkeypatch):
+    def compile_model(weka, modelName, arffName):
+        raise TreeParseError("Unrecognised tree line: 'Naive Bayes Classifier'")
+    monkeypatch.setattr(prediction_cache, "compile_model", compile_model)
+    cache = PredictionCache(LocalWeka())
+    assert cache.key_function("missing.model")([1, 2]) == ("1", "2")
+
+
+def test_compile_errors_are_not_hidden(monkeypatch):
+    def compile_model(weka, modelName, arffName):
+        raise KeyError("up_safe")
+    monkeypatch.setattr(prediction_cache, "compile_model", compile_model)
+    cache = PredictionCache(LocalWeka())
+    with pytest.raises(KeyError):
+        cache.predict("missing.model", [1, 2])
@@ -0,0 +1,58 @@
+from collections import deque
+
+from generate_data import game_seed
+from policies import move_flood_fill
+from reachability import Reachability, reachability_for
+from snake_engine import SnakeEngine
+
+
+def components(game):
+    """Free cells grouped by a plain BFS from scratch."""
+    free = [not game.grid[cell] for cell in range(game.grid_w * game.grid_h)]
+    seen = set()
+    groups = []
+    for start in range(len(free)):
+        if not free[start] or start in seen:
+            continue
+        group = {start}
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            y, x = divmod(cell, game.grid_w)
+            for n, ok in ((cell - 1, x > 0), (cell + 1, x < game.grid_w - 1),
+                          (cell - game.grid_w, y > 0), (cell + game.grid_w, y < game.grid_h - 1)):
+                if ok and free[n] and n not in group:
+                    group.add(n)
+                    queue.append(n)
+        seen |= group
+        groups.append(frozenset(group))
+    return set(groups)
+
+
+def test_incremental_labels_match_a_full_flood_fill():
+    # A small board so the snake keeps cutting the free cells into several components
+    engine = SnakeEngine((120, 120))
+    for index in range(20):
+        game = engine.new_game(game_seed(0, index))
+        done = False
+        ticks = 0
+        while not done and ticks < 400:
+            reach = reachability_for(game)
+            assert reach.rebuilds == 1
+            # Every label still in use has cells, and together they are the components
+            assert all(reach.members.values())
+            assert {frozenset(cells) for cells in reach.members.values()} == components(game)
+            game, reward, done = engine.step(game, move_flood_fill(game))
+            ticks += 1
+
+
+def test_split_with_searches_merged_in_the_same_round():
+    # 5x5 board with a diagonal wall that only the centre cell does not close yet. Occupying the
+    # centre starts four searches that meet two by two in the first round: two components.
+    reach = Reachability(5, 5)
+    reach.rebuild([[40, 0], [30, 10], [10, 30], [0, 40]])
+    assert len(reach.members) == 1
+    reach.count[12] += 1
+    reach._occupy(12)
+    assert sorted(len(cells) for cells in reach.members.values()) == [10, 10]
+    assert reach.area([0, 0]) == reach.area([40, 40]) == 10
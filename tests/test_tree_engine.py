@@ -0,0 +1,165 @@
+import os
+
+import numpy as np
+import pytest
+
+from tree_engine import CompiledTree, TreePredictor, compiled_path, is_current, model_digest, parse_tree
+
+ATTRIBUTES = ["left_safe", "up_safe", "food_in_up", "color", "New_direction"]
+NOMINAL = [None, None, None, ["red", "green", "blue"], ["0", "1", "2", "3"]]
+CLASSES = ["0", "1", "2", "3"]
+
+RANDOM_TREE = """
+RandomTree
+==========
+
+up_safe < 0.5
+|   left_safe < 0.5 : 3 (12/0)
+|   left_safe >= 0.5 : 1 (30/2)
+up_safe >= 0.5
+|   food_in_up < 0.5 : 0 (0/0)
+|   food_in_up >= 0.5 : 2 (41/3)
+
+Size of the tree : 7
+Max depth of tree: 2
+"""
+
+J48 = """
+J48 pruned tree
+------------------
+
+color = red: 0 (10.0/1.0)
+color = green
+|   left_safe <= 0: 2 (4.0)
+|   left_safe > 0: 1 (7.0/2.0)
+color = blue: 3 (5.0)
+
+Number of Leaves  : 	4
+
+Size of the tree : 	6
+"""
+
+
+def compile_tree(text, model_header=None):
+    return CompiledTree.from_text(text, ATTRIBUTES, NOMINAL, CLASSES, model_header)
+
+
+def test_parse_skips_summary_lines():
+    root = parse_tree(RANDOM_TREE)
+    assert root.attribute == "up_safe"
+    assert [op for op, _, _ in root.branches] == ["<", ">="]
+
+
+def test_random_tree_leaves():
+    tree = compile_tree(RANDOM_TREE)
+    label = lambda x: tree.label(tree.predict_one(tree.encode(x)))
+    assert label([0, 0, 0, "red"]) == "3"
+    assert label([1, 0, 1, "red"]) == "1"
+    assert label([1, 1, 1, "red"]) == "2"
+    assert tree.depth == 2
+
+
+def test_empty_leaf_takes_the_parent_majority():
+    tree = compile_tree(RANDOM_TREE)
+    # food_in_up < 0.5 under up_safe >= 0.5 has no instances: 2 is the majority of its parent
+    assert tree.label(tree.predict_one(tree.encode([1, 1, 0, "red"]))) == "2"
+    (node, path), = tree.empty_leaves
+    x = tree.witness(path)
+    assert x[1] >= 0.5 and x[2] < 0.5
+    assert tree.predict_one(x) == tree.leaf[node]
+
+
+def test_j48_nominal_and_numeric_splits():
+    tree = compile_tree(J48)
+    label = lambda x: tree.label(tree.predict_one(tree.encode(x)))
+    assert label([0, 0, 0, "red"]) == "0"
+    assert label([0, 0, 0, "green"]) == "2"
+    assert label([1, 0, 0, "green"]) == "1"
+    assert label([1, 0, 0, "blue"]) == "3"
+
+
+def test_model_header_positions():
+    # A model trained on (up_safe, left_safe, food_in_up, ...) tests positions 0 and 1 the other
+    # way round, whatever the names of the vector it is given
+    header = (["up_safe", "left_safe", "food_in_up", "color", "New_direction"], NOMINAL, CLASSES)
+    tree = compile_tree(RANDOM_TREE, header)
+    assert tree.feature[0] == 0
+    # Read by name this vector would have up_safe = 1 and end in the "2" subtree
+    assert tree.label(tree.predict_one([0, 1, 0, 0])) == "1"
+    assert tree.model_attributes == header[0]
+
+
+def test_predict_batch_matches_predict(tmp_path):
+    model = str(tmp_path / "J48.model")
+    tree = compile_tree(J48)
+    tree.save(compiled_path(model))
+    predictor = TreePredictor()
+    X = [[0, 0, 0, "red"], [0, 0, 0, "green"], [1, 0, 0, "green"], [1, 0, 0, "blue"]]
+    assert list(predictor.predict_batch(model, X)) == ["0", "2", "1", "3"]
+    assert [predictor.predict(model, x) for x in X] == ["0", "2", "1", "3"]
+
+
+def test_stale_export_is_rejected(tmp_path):
+    model = str(tmp_path / "RT.model")
+    with open(model, "wb") as file:
+        file.write(b"model v1")
+    tree = compile_tree(RANDOM_TREE)
+    tree.model_sha256 = model_digest(model)
+    tree.save(compiled_path(model))
+    assert is_current(model)
+    with open(model, "wb") as file:
+        file.write(b"model v2")
+    assert not is_current(model)
+    with pytest.raises(ValueError):
+        TreePredictor().predict(model, [0, 0, 0, "red"])
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("model", ["RT7.model", "HandRT.model", "j48.model"])
+def test_matches_weka(model):
+    pytest.importorskip("javabridge")
+    pytest.importorskip("weka.core.jvm")
+    from arff_reader import read_arff
+    from tree_engine import compile_model
+    from wekaI import Weka
+
+    dataset = os.path.join(ROOT, "snake_game_log_hand.arff")
+    header, data = read_arff(dataset)
+    weka = Weka()
+    try:
+        weka.start_jvm()
+        tree = compile_model(weka, os.path.join(ROOT, model), dataset)
+        rows = [[v if a.values is None else a.values[int(v)] for v, a in zip(row[:-1], header.attributes)]
+                for row in data[:500].tolist()]
+        expected = [str(weka.predict(os.path.join(ROOT, model), list(x), dataset)) for x in rows]
+        got = [str(tree.label(tree.predict_one(tree.encode(x)))) for x in rows]
+        assert got == expected
+        encoded = np.array([tree.encode(x) for x in rows])
+        assert [str(tree.label(v)) for v in tree.predict_matrix(encoded)] == expected
+    finally:
+        weka.stop_jvm()
+
+
+def test_class_in_the_middle_of_the_header(tmp_path):
+    # As in snake_game_log.arff: New_direction is followed by future_score, vectors skip the class
+    attributes = ["left_safe", "New_direction", "future_score"]
+    nominal = [None, CLASSES, None]
+    text = """
+future_score < 10
+|   left_safe < 0.5 : 3 (5/0)
+|   left_safe >= 0.5 : 1 (5/0)
+future_score >= 10 : 2 (5/0)
+"""
+    tree = CompiledTree.from_text(text, attributes, nominal, CLASSES, class_index=1)
+    assert tree.vector_attributes == ["left_safe", "future_score"]
+    assert tree.label(tree.predict_one(tree.encode([0, 5]))) == "3"
+    assert tree.label(tree.predict_one(tree.encode([1, 5]))) == "1"
+    assert tree.label(tree.predict_one(tree.encode([1, 50]))) == "2"
+
+    path = str(tmp_path / "tree.npz")
+    tree.save(path)
+    loaded = CompiledTree.load(path)
+    assert loaded.class_index == 1
+    assert loaded.label(loaded.predict_one(loaded.encode([1, 5]))) == "1"
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+import weka_training
+from weka_training import ResultCache, class_attribute, expand_grid, sweep, train
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_class_defaults_to_new_direction():
+    # snake_game_log.arff ends in future_score
+    assert class_attribute(os.path.join(ROOT, "snake_game_log.arff")) == "New_direction"
+    with pytest.raises(ValueError):
+        class_attribute(os.path.join(ROOT, "snake_game_log.arff"), "no_such_attribute")
+
+
+def test_expand_grid():
+    configs = expand_grid(["-U"], [("depth", ["5", "7"]), ("K", ["0", "3"])])
+    assert configs[0] == ["-U", "-depth", "5", "-K", "0"]
+    assert len(configs) == 4
+
+
+def test_cached_sweep_does_not_start_workers(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path))
+    arff = os.path.join(ROOT, "snake_game_log_hand.arff")
+    digest = weka_training.dataset_digest(arff)
+    for options in (["-depth", "5"], ["-depth", "7"]):
+        key = weka_training.config_key(digest, "RandomTree", options, folds=10, seed=1, class_name="New_direction")
+        cache.put(key, {"percent_correct": 90.0, "root_mean_squared_error": 0.2, "seconds": 1.0})
+    monkeypatch.setattr(weka_training.multiprocessing, "get_context", None)
+    results = sweep(arff, "RandomTree", [["-depth", "5"], ["-depth", "7"]], cache=cache)
+    assert all(result["cached"] for result in results)
+
+
+class FailingWeka:
+
+    def train(self, arff, classifier, options, modelName, class_name):
+        with open(modelName, "wb") as file:
+            file.write(b"half a model")
+        raise RuntimeError("out of memory")
+
+
+def test_failed_training_leaves_nothing_in_the_cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    with pytest.raises(RuntimeError):
+        train(os.path.join(ROOT, "snake_game_log_hand.arff"), out=str(tmp_path / "out.model"), cache=cache,
+              weka=FailingWeka())
+    assert os.listdir(cache.directory) == []
@@ -0,0 +1,182 @@
+"""
+Headless tournament between the agents
+Plays the same N seeded games with every policy across a process pool and
+reports, per policy, the distribution of the final score, length and ticks
+survived (mean with its 95% confidence interval, quartiles, extremes), the
+causes of death (wall, self-collision or cut at --max-ticks), decisions per
+second and the per-decision latency percentiles.
+
+Policies are named as in generate_data.py: "greedy" is move_tutorial_1 of
+SnakeGame.py, "flood_fill" the move_tutorial_1 agent of SnakeGame(try).py
+(policies.move_flood_fill) and "weka:MODEL" a Weka model, evaluated through
+its compiled tree when one has been exported, the inference server given
+with --server, or a JVM per worker.
+
+Usage:
+    python tournament.py --games 200 --workers 8
+    python tournament.py --policy greedy --policy weka:RT7.model --games 500 --out tournament.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from generate_data import game_seed
+from policies import load_policy
+from snake_engine import SnakeEngine
+
+MODELS = ("RT7.model", "HandRT.model", "j48.model")
+DEFAULT_POLICIES = ("greedy", "flood_fill") + tuple("weka:" + model for model in MODELS)
+
+# Policies loaded by this worker, by name
+_policies = {}
+
+
+def _policy(name, dataset_path, server):
+    if name not in _policies:
+        if name.startswith("weka:"):
+            _policies[name] = load_policy("weka", name[len("weka:"):], dataset_path, server)
+        else:
+            _policies[name] = load_policy(name)
+    return _policies[name]
+
+
+def _play_block(task):
+    name, first_game, n_games, seed, max_ticks, dataset_path, server = task
+    try:
+        policy = _policy(name, dataset_path, server)
+    except Exception as error:
+        return name, None, None, "%s: %s" % (type(error).__name__, error)
+
+    clock = time.perf_counter
+    engine = SnakeEngine()
+    games = []
+    latencies = []
+    for index in range(first_game, first_game + n_games):
+        game = engine.new_game(game_seed(seed, index))
+        ticks = 0
+        done = False
+        start = clock()
+        while not done and ticks < max_ticks:
+            before = clock()
+            action = policy(game)
+            latencies.append(clock() - before)
+            game, reward, done = engine.step(game, action)
+            ticks += 1
+        games.append({"seed_index": index, "score": game.score, "length": len(game.snake_body), "ticks": ticks,
+                      "death_cause": game.death_cause or "timeout", "seconds": clock() - start})
+    return name, games, np.array(latencies, dtype=np.float32), None
+
+
+def distribution(values):
+    values = np.asarray(values, dtype=np.float64)
+    mean = values.mean()
+    std = values.std(ddof=1) if len(values) > 1 else 0.0
+    p25, median, p75 = np.percentile(values, [25, 50, 75])
+    return {"mean": mean, "ci95": 1.96 * std / np.sqrt(len(values)), "std": std, "min": values.min(),
+            "p25": p25, "median": median, "p75": p75, "max": values.max()}
+
+
+def summarize(games, latencies):
+    decisions = len(latencies)
+    decision_seconds = float(latencies.sum(dtype=np.float64))
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if decisions else (0.0, 0.0, 0.0)
+    causes = {"wall": 0, "self": 0, "timeout": 0}
+    for game in games:
+        causes[game["death_cause"]] += 1
+    return {
+        "games": len(games),
+        "score": distribution([game["score"] for game in games]),
+        "length": distribution([game["length"] for game in games]),
+        "ticks": distribution([game["ticks"] for game in games]),
+        "death_causes": causes,
+        "decisions": decisions,
+        "decisions_per_sec": decisions / decision_seconds if decision_seconds > 0 else 0.0,
+        "ticks_per_sec": sum(game["ticks"] for game in games) / max(sum(game["seconds"] for game in games), 1e-9),
+        "latency_us": {"p50": p50 * 1e6, "p95": p95 * 1e6, "p99": p99 * 1e6,
+                       "max": float(latencies.max()) * 1e6 if decisions else 0.0},
+    }
+
+
+def run(policies=DEFAULT_POLICIES, games=100, workers=None, seed=0, block_size=10, max_ticks=5000,
+        dataset_path="snake_game_log_hand.arff", server=None):
+    """
+    Plays games seeded games with every policy and returns ({policy: summary}, {policy: error})
+    for the policies that played and the ones that could not be loaded.
+    """
+    tasks = [(name, start, min(block_size, games - start), seed, max_ticks, dataset_path, server)
+             for name in policies for start in range(0, games, block_size)]
+    played = {name: [] for name in policies}
+    latencies = {name: [] for name in policies}
+    errors = {}
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers or os.cpu_count()) as pool:
+        for name, block_games, block_latencies, error in pool.imap_unordered(_play_block, tasks):
+            if error is not None:
+                errors[name] = error
+                continue
+            played[name].extend(block_games)
+            latencies[name].append(block_latencies)
+        # Normal worker exit, so the Weka workers stop their JVM (see load_predictor)
+        pool.close()
+        pool.join()
+
+    summaries = {}
+    for name in policies:
+        if name in errors:
+            continue
+        played[name].sort(key=lambda game: game["seed_index"])
+        summaries[name] = summarize(played[name], np.concatenate(latencies[name]))
+        summaries[name]["per_game"] = played[name]
+    return summaries, errors
+
+
+def _print_report(summaries, errors):
+    print("%-20s %6s %18s %16s %16s %6s %6s %7s %12s %9s %9s" % (
+        "policy", "games", "score", "length", "ticks", "wall", "self", "timeout",
+        "decisions/s", "p50 us", "p99 us"))
+    for name, summary in sorted(summaries.items(), key=lambda item: -item[1]["score"]["mean"]):
+        causes = summary["death_causes"]
+        print("%-20s %6d %9.1f +-%6.1f %8.1f +-%5.1f %8.1f +-%5.1f %6d %6d %7d %12.0f %9.1f %9.1f" % (
+            name, summary["games"],
+            summary["score"]["mean"], summary["score"]["ci95"],
+            summary["length"]["mean"], summary["length"]["ci95"],
+            summary["ticks"]["mean"], summary["ticks"]["ci95"],
+            causes["wall"], causes["self"], causes["timeout"],
+            summary["decisions_per_sec"], summary["latency_us"]["p50"], summary["latency_us"]["p99"]))
+    for name, summary in sorted(summaries.items()):
+        score = summary["score"]
+        print("  %-18s score min %.0f / p25 %.0f / median %.0f / p75 %.0f / max %.0f"
+              % (name, score["min"], score["p25"], score["median"], score["p75"], score["max"]))
+    for name, error in errors.items():
+        print("%-20s skipped (%s)" % (name, error))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the agents on the same seeded headless games")
+    parser.add_argument("--policy", action="append", default=None,
+                        help="greedy, flood_fill or weka:MODEL (repeat; default: all of them)")
+    parser.add_argument("--dataset", default="snake_game_log_hand.arff", help="ARFF the Weka models were trained on")
+    parser.add_argument("--server", default=None, help="Socket of an inference_server.py for the Weka models")
+    parser.add_argument("--games", type=int, default=100, help="Games per policy")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--block-size", type=int, default=10, help="Games per task")
+    parser.add_argument("--max-ticks", type=int, default=5000, help="Ticks before a game is cut short")
+    parser.add_argument("--out", default=None, help="JSON file with the summaries and every game")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summaries, errors = run(args.policy or DEFAULT_POLICIES, args.games, args.workers, args.seed,
+                            args.block_size, args.max_ticks, args.dataset, args.server)
+    _print_report(summaries, errors)
+    print("%d policies x %d games in %.1fs" % (len(summaries), args.games, time.perf_counter() - start))
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump({"summaries": summaries, "errors": errors}, file, indent=2,
+                      default=lambda value: value.item() if isinstance(value, np.generic) else str(value))
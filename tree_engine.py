@@ -0,0 +1,540 @@
+"""
+JVM-free inference for the decision trees trained in Weka.
+
+RandomTree and J48 models are exported once (this needs the JVM) into a
+compact array-backed file, one entry per node:
+
+    feature    attribute index tested by the node (-1 for leaves)
+    op         0 -> x < threshold, 1 -> x <= threshold, 2 -> x == threshold
+    threshold  split point (or nominal value index for op 2)
+    left/right child taken when the test is true/false
+    leaf       class index (nominal class) or predicted value (numeric class)
+
+The compiled trees are then evaluated in pure Python for one vector or with
+NumPy for a whole matrix.
+
+Like Weka, a tree reads the vector by the attribute positions of the header
+the model was trained on (saved in the .model by the Weka GUI), not by name.
+The export stores the sha256 of the .model: a tree exported from another
+version of the model is not used.
+
+Usage:
+    python tree_engine.py export RT7.model snake_game_log_hand.arff
+    python tree_engine.py verify RT7.model snake_game_log_hand.arff
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+OP_LT = 0
+OP_LE = 1
+OP_EQ = 2
+
+_OPS = {"<": OP_LT, "<=": OP_LE, "=": OP_EQ}
+
+# "attr < 0.5", "attr <= 0: 1 (12.0/1.0)", "attr = True : 3 (4/0)"
+_LINE_RE = re.compile(
+    r"^(?P<attr>\S+) (?P<op><=|>=|<|>|=) (?P<value>.+?)"
+    r"(?:\s*:\s*(?P<label>\S+) \((?P<weight>[^/)]+)(?:/(?P<errors>[^)]+))?\))?$"
+)
+# A tree made of a single leaf: ": 1 (100.0/3.0)"
+_LEAF_RE = re.compile(r"^:\s*(?P<label>\S+) \((?P<weight>[^/)]+)(?:/(?P<errors>[^)]+))?\)$")
+
+
+def compiled_path(model_path):
+    # RT7.model -> RT7.tree.npz
+    return os.path.splitext(model_path)[0] + ".tree.npz"
+
+
+def model_digest(model_path):
+    with open(model_path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def is_current(model_path):
+    """
+    True when model_path has a compiled tree exported from its current content.
+    Trees exported without the hash of their model are never current: re-export them.
+    """
+    path = compiled_path(model_path)
+    if not os.path.exists(path):
+        return False
+    if not os.path.exists(model_path):
+        return True
+    with np.load(path, allow_pickle=False) as data:
+        digest = json.loads(str(data["meta"])).get("model_sha256")
+    return digest == model_digest(model_path)
+
+
+def use_compiled(model_path):
+    """is_current, warning about a compiled tree that no longer matches its model."""
+    if is_current(model_path):
+        return True
+    if os.path.exists(compiled_path(model_path)):
+        print("[!] %s is out of date with %s, using Weka (re-run: python tree_engine.py export %s ...)"
+              % (compiled_path(model_path), model_path, model_path))
+    return False
+
+
+class _Node:
+    def __init__(self):
+        self.attribute = None
+        self.branches = []  # (op, value, child)
+
+
+class _Leaf:
+    def __init__(self, label, weight, errors):
+        self.label = label
+        self.weight = weight
+        self.errors = errors
+
+
+class TreeParseError(ValueError):
+    """The text is not the dump of a RandomTree or J48 (e.g. the model is another classifier)."""
+
+
+def parse_tree(text):
+    """Parses the textual dump of a Weka RandomTree or J48 into nested nodes."""
+    lines = []
+    for raw in text.splitlines():
+        stripped = raw.strip()
+        if not stripped or set(stripped) <= set("=-"):
+            continue
+        if stripped.startswith(("RandomTree", "J48", "Size of the tree", "Number of Leaves", "Max depth of tree")):
+            continue
+        lines.append(raw.rstrip())
+    if not lines:
+        raise TreeParseError("Empty tree dump")
+
+    if len(lines) == 1 and _LEAF_RE.match(lines[0].strip()):
+        match = _LEAF_RE.match(lines[0].strip())
+        return _Leaf(match.group("label"), float(match.group("weight")), float(match.group("errors") or 0))
+
+    root = _Node()
+    stack = [root]
+    for line in lines:
+        depth = 0
+        while line.startswith("|   ", depth * 4):
+            depth += 1
+        match = _LINE_RE.match(line[depth * 4:])
+        if match is None:
+            raise TreeParseError("Unrecognised tree line: %r" % line)
+        del stack[depth + 1:]
+        node = stack[depth]
+        node.attribute = match.group("attr")
+        if match.group("label") is not None:
+            child = _Leaf(match.group("label"), float(match.group("weight")), float(match.group("errors") or 0))
+        else:
+            child = _Node()
+        node.branches.append((match.group("op"), match.group("value").strip(), child))
+        if isinstance(child, _Node):
+            stack.append(child)
+    return root
+
+
+class CompiledTree:
+
+    def __init__(self, feature, op, threshold, left, right, leaf, attributes, nominal_values, class_values,
+                 class_index=None):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.op = np.asarray(op, dtype=np.int8)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.leaf = np.asarray(leaf, dtype=np.float64)
+        self.attributes = list(attributes)
+        # Nominal attributes -> list of values, numeric attributes -> None
+        self.nominal_values = list(nominal_values)
+        # None when the class is numeric
+        self.class_values = class_values
+        # Position of the class in attributes; vectors hold every other attribute in order
+        # and feature indexes them
+        self.class_index = len(self.attributes) - 1 if class_index is None else class_index
+        self.vector_attributes = [a for i, a in enumerate(self.attributes) if i != self.class_index]
+        self.vector_nominal_values = [v for i, v in enumerate(self.nominal_values) if i != self.class_index]
+        self.depth = self._depth()
+        # Attributes of the header the model was trained on, leaves Weka still has to
+        # resolve (see from_text) and sha256 of the .model file the tree was exported from
+        self.model_attributes = list(attributes)
+        self.empty_leaves = []
+        self.model_sha256 = None
+
+        # Plain lists are much faster than NumPy scalars for the single-vector walk
+        self._nodes = list(zip(self.feature.tolist(), self.op.tolist(), self.threshold.tolist(),
+                               self.left.tolist(), self.right.tolist()))
+        self._leaf = self.leaf.tolist()
+        self._nominal_index = [None if values is None else {v: i for i, v in enumerate(values)}
+                               for values in self.vector_nominal_values]
+
+    @classmethod
+    def from_text(cls, text, attributes, nominal_values, class_values, model_header=None, class_index=None):
+        """
+        Compiles a Weka tree dump for vectors laid out as the ARFF header given by
+        attributes/nominal_values/class_values, without its class (class_index, the
+        last attribute by default).
+
+        Weka tests the attribute *index* of the header the model was trained on, whatever
+        the header of the instance it classifies: model_header, the (attributes,
+        nominal_values, class_values) of that training header, maps split names and
+        nominal values to those indices so the compiled tree reads the same columns.
+        Without it the model is assumed to have been trained on the ARFF header.
+
+        Leaves without training instances are recorded in empty_leaves as
+        (node, path) so compile_model can ask Weka for them; until then they take
+        the majority of the parent estimated from the leaf counts of the dump,
+        which is only an approximation of the parent distribution Weka uses.
+        """
+        root = parse_tree(text)
+        class_index = len(attributes) - 1 if class_index is None else class_index
+        split_attributes, split_values, split_classes = model_header or (attributes, nominal_values, class_values)
+        index_of = {name: i for i, name in enumerate(split_attributes)}
+        label_index = None if split_classes is None else {v: i for i, v in enumerate(split_classes)}
+        arrays = {"feature": [], "op": [], "threshold": [], "left": [], "right": [], "leaf": []}
+        empty_leaves = []
+
+        def new_node():
+            for values in arrays.values():
+                values.append(0)
+            arrays["feature"][-1] = -1
+            arrays["left"][-1] = -1
+            arrays["right"][-1] = -1
+            return len(arrays["feature"]) - 1
+
+        def counts(node):
+            # Class weights of a subtree, approximated from the majority count of its leaves
+            if isinstance(node, _Leaf):
+                total = np.zeros(len(split_classes))
+                total[label_index[node.label]] = node.weight - node.errors
+                return total
+            return sum(counts(child) for _, _, child in node.branches)
+
+        def leaf_value(node, parent):
+            if split_classes is None:
+                return float(node.label)
+            if node.weight == 0 and parent is not None:
+                return float(np.argmax(counts(parent)))
+            return float(label_index[node.label])
+
+        def attribute_index(name):
+            # Index in the model header and position of the value Weka reads in the vector
+            attribute = index_of[name]
+            if attribute >= len(attributes) or attribute == class_index:
+                raise ValueError("The model tests attribute %d (%s), the class or past the %d attributes of the header"
+                                 % (attribute, name, len(attributes)))
+            return attribute, attribute - (attribute > class_index)
+
+        def emit(node, parent=None, path=()):
+            # path: (feature, op, threshold, outcome) of the tests leading to node
+            index = new_node()
+            if isinstance(node, _Leaf):
+                arrays["leaf"][index] = leaf_value(node, parent)
+                if node.weight == 0 and parent is not None:
+                    empty_leaves.append((index, path))
+                return index
+            attribute, position = attribute_index(node.attribute)
+            branches = node.branches
+            if branches[0][0] == "=":
+                # Multiway nominal split -> chain of equality tests
+                values = split_values[attribute]
+                current = index
+                for i, (_, value, child) in enumerate(branches[:-1]):
+                    threshold = values.index(value)
+                    arrays["feature"][current] = position
+                    arrays["op"][current] = OP_EQ
+                    arrays["threshold"][current] = threshold
+                    arrays["left"][current] = emit(child, node, path + ((position, OP_EQ, threshold, True),))
+                    path = path + ((position, OP_EQ, threshold, False),)
+                    arrays["right"][current] = (new_node() if i < len(branches) - 2
+                                                else emit(branches[-1][2], node, path))
+                    current = arrays["right"][current]
+                return index
+            (op, value, true_child), (_, _, false_child) = branches
+            op, threshold = _OPS[op], float(value)
+            arrays["feature"][index] = position
+            arrays["op"][index] = op
+            arrays["threshold"][index] = threshold
+            arrays["left"][index] = emit(true_child, node, path + ((position, op, threshold, True),))
+            arrays["right"][index] = emit(false_child, node, path + ((position, op, threshold, False),))
+            return index
+
+        emit(root)
+        tree = cls(attributes=attributes, nominal_values=nominal_values, class_values=class_values,
+                   class_index=class_index, **arrays)
+        tree.empty_leaves = empty_leaves
+        tree.model_attributes = list(split_attributes)
+        return tree
+
+    def witness(self, path):
+        """An encoded vector that satisfies every test of path (see empty_leaves)."""
+        x = []
+        for feature in range(len(self.vector_attributes)):
+            low, low_open, high, high_open = -np.inf, False, np.inf, False
+            equal, excluded = None, set()
+            for f, op, threshold, outcome in path:
+                if f != feature:
+                    continue
+                if op == OP_EQ:
+                    if outcome:
+                        equal = threshold
+                    else:
+                        excluded.add(threshold)
+                elif outcome:
+                    # x < t or x <= t
+                    if threshold < high or (threshold == high and op == OP_LT):
+                        high, high_open = threshold, op == OP_LT
+                elif threshold > low or (threshold == low and op == OP_LE):
+                    # x >= t or x > t
+                    low, low_open = threshold, op == OP_LE
+            if equal is not None:
+                x.append(equal)
+            elif excluded:
+                x.append(float(min(set(range(len(excluded) + 1)) - excluded)))
+            elif np.isfinite(low) and np.isfinite(high):
+                x.append((low + high) / 2.0 if low != high else low)
+            elif np.isfinite(low):
+                x.append(low + 1.0 if low_open else low)
+            elif np.isfinite(high):
+                x.append(high - 1.0 if high_open else high)
+            else:
+                x.append(0.0)
+        return x
+
+    def _depth(self):
+        depth = np.zeros(len(self.feature), dtype=np.int32)
+        for i in range(len(self.feature)):
+            if self.feature[i] >= 0:
+                depth[self.left[i]] = depth[i] + 1
+                depth[self.right[i]] = depth[i] + 1
+        return int(depth.max()) if len(depth) else 0
+
+    def save(self, path):
+        meta = {"attributes": self.attributes, "nominal_values": self.nominal_values,
+                "class_values": self.class_values, "class_index": self.class_index,
+                "model_attributes": self.model_attributes, "model_sha256": self.model_sha256}
+        # np.savez would append .npz to names without it
+        with open(path, "wb") as file:
+            np.savez_compressed(file, feature=self.feature, op=self.op, threshold=self.threshold,
+                                left=self.left, right=self.right, leaf=self.leaf,
+                                meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            tree = cls(data["feature"], data["op"], data["threshold"], data["left"], data["right"],
+                       data["leaf"], meta["attributes"], meta["nominal_values"], meta["class_values"],
+                       meta.get("class_index"))
+        tree.model_attributes = meta.get("model_attributes", tree.attributes)
+        tree.model_sha256 = meta.get("model_sha256")
+        return tree
+
+    def encode(self, x):
+        # Nominal values -> index in their value list, numeric values -> float
+        return [float(v) if index is None else index[str(v)]
+                for v, index in zip(x, self._nominal_index)]
+
+    def predict_one(self, x):
+        """Returns the leaf value (class index or numeric prediction) for one encoded vector."""
+        nodes = self._nodes
+        node = 0
+        feature, op, threshold, left, right = nodes[0]
+        while feature >= 0:
+            value = x[feature]
+            if op == OP_LT:
+                node = left if value < threshold else right
+            elif op == OP_LE:
+                node = left if value <= threshold else right
+            else:
+                node = left if value == threshold else right
+            feature, op, threshold, left, right = nodes[node]
+        return self._leaf[node]
+
+    def predict_matrix(self, X):
+        """Vectorised walk of the tree for every row of an encoded matrix."""
+        X = np.asarray(X, dtype=np.float64)
+        rows = np.arange(len(X))
+        node = np.zeros(len(X), dtype=np.int32)
+        for _ in range(self.depth):
+            feature = self.feature[node]
+            active = feature >= 0
+            if not active.any():
+                break
+            r, n, f = rows[active], node[active], feature[active]
+            value = X[r, f]
+            threshold = self.threshold[n]
+            op = self.op[n]
+            go_left = np.where(op == OP_LT, value < threshold,
+                               np.where(op == OP_LE, value <= threshold, value == threshold))
+            node[active] = np.where(go_left, self.left[n], self.right[n])
+        return self.leaf[node]
+
+    @property
+    def uses_nominal(self):
+        return any(values is not None for values in self.vector_nominal_values)
+
+    def label(self, value):
+        if self.class_values is None:
+            return value
+        return self.class_values[int(value)]
+
+
+class TreePredictor:
+    """
+    Drop-in replacement for Weka.predict backed by compiled trees.
+    start_jvm/stop_jvm and the thread hooks are no-ops so the game loop can use either one.
+    """
+
+    def __init__(self):
+        self.trees = {}
+        self.startup_seconds = None
+
+    def start_jvm(self, background=False, preload=()):
+        # Nothing to start; preloading just reads the compiled trees
+        begin = time.perf_counter()
+        for modelName, _ in preload:
+            self.tree(modelName)
+        self.startup_seconds = time.perf_counter() - begin
+
+    def ensure_jvm(self):
+        pass
+
+    def stop_jvm(self):
+        pass
+
+    def attach_thread(self):
+        pass
+
+    def detach_thread(self):
+        pass
+
+    def tree(self, modelName):
+        tree = self.trees.get(modelName)
+        if tree is None:
+            if not is_current(modelName):
+                raise ValueError("%s was not exported from the current %s" % (compiled_path(modelName), modelName))
+            tree = self.trees[modelName] = CompiledTree.load(compiled_path(modelName))
+        return tree
+
+    def predict(self, modelName, x, arffName=None, debug=False):
+        tree = self.tree(modelName)
+        pred = tree.label(tree.predict_one(tree.encode(x)))
+        if debug:
+            print(("Prediction", pred))
+        return pred
+
+    def predict_batch(self, modelName, X, arffName=None, debug=False):
+        tree = self.tree(modelName)
+        X = [tree.encode(row) for row in X] if tree.uses_nominal else X
+        values = tree.predict_matrix(X)
+        if tree.class_values is None:
+            return values
+        return np.array(tree.class_values, dtype=object)[values.astype(np.int64)]
+
+
+def _header_values(header):
+    attributes, nominal_values = [], []
+    for i in range(header.num_attributes):
+        attribute = header.attribute(i)
+        attributes.append(attribute.name)
+        nominal_values.append([attribute.value(j) for j in range(attribute.num_values)]
+                              if attribute.is_nominal else None)
+    return attributes, nominal_values, nominal_values[header.class_index]
+
+
+def compile_model(weka, modelName, arffName):
+    """Loads a Weka tree through the JVM and compiles it in memory."""
+    import javabridge
+    import weka.core.serialization as serialization
+    from weka.core.dataset import Instances
+
+    weka.ensure_jvm()
+    cls, header = weka.registry.get(modelName, arffName)
+    try:
+        # Print split points with full precision
+        javabridge.call(cls.jobject, "setNumDecimalPlaces", "(I)V", 12)
+    except javabridge.JavaException:
+        # Weka versions before 3.7.11 have no numDecimalPlaces
+        pass
+
+    attributes, nominal_values, class_values = _header_values(header)
+    # Models saved from the Weka GUI carry the header they were trained on after the classifier
+    model_header = None
+    objects = serialization.read_all(modelName)
+    if len(objects) > 1:
+        training = Instances(jobject=objects[1])
+        if training.class_index < 0:
+            training.class_is_last()
+        model_header = _header_values(training)
+    tree = CompiledTree.from_text(str(cls), attributes, nominal_values, class_values, model_header,
+                                  header.class_index)
+
+    # Empty leaves: Weka classifies them with the distribution of an ancestor, ask it
+    # for a vector that reaches each one
+    for node, path in tree.empty_leaves:
+        encoded = tree.witness(path)
+        x = [v if nominal is None else nominal[int(v)] for v, nominal in zip(encoded, tree.vector_nominal_values)]
+        pred = weka.predict(modelName, x, arffName)
+        tree.leaf[node] = float(pred) if class_values is None else class_values.index(str(pred))
+    tree = CompiledTree(tree.feature, tree.op, tree.threshold, tree.left, tree.right, tree.leaf,
+                        attributes, nominal_values, class_values, header.class_index)
+    tree.model_attributes = model_header[0] if model_header else attributes
+    tree.model_sha256 = model_digest(modelName)
+    return tree
+
+
+def export_model(weka, modelName, arffName, path=None):
+    """Loads a Weka tree through the JVM and writes its compiled form."""
+    tree = compile_model(weka, modelName, arffName)
+    tree.save(path or compiled_path(modelName))
+    return tree
+
+
+def verify_model(weka, modelName, arffName, limit=None):
+    """Compares the compiled tree against Weka.predict on the rows of an ARFF file."""
+    from weka.core.converters import Loader
+    tree = CompiledTree.load(compiled_path(modelName))
+    data = Loader(classname="weka.core.converters.ArffLoader").load_file(arffName)
+    total = data.num_instances if limit is None else min(limit, data.num_instances)
+    mismatches = 0
+    for i in range(total):
+        values = data.get_instance(i).values.tolist()
+        del values[tree.class_index]
+        x = [v if nominal is None else nominal[int(v)] for v, nominal in zip(values, tree.vector_nominal_values)]
+        expected = weka.predict(modelName, list(x), arffName)
+        got = tree.label(tree.predict_one(tree.encode(x)))
+        if str(expected) != str(got):
+            mismatches += 1
+    print("%s: %d/%d predictions match" % (modelName, total - mismatches, total))
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export Weka trees to a JVM-free format")
+    parser.add_argument("command", choices=["export", "verify"])
+    parser.add_argument("model")
+    parser.add_argument("arff")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    from wekaI import Weka
+    weka = Weka()
+    weka.start_jvm()
+    try:
+        if args.command == "export":
+            tree = export_model(weka, args.model, args.arff)
+            print("Wrote %s (%d nodes, depth %d)" % (compiled_path(args.model), len(tree.feature), tree.depth))
+            if tree.model_attributes != tree.attributes:
+                # Weka does the same: the model reads the vector by position, not by name
+                print("[!] %s was trained on another header; its tests read %s by position as %s"
+                      % (args.model, args.arff, ", ".join("%s->%s" % (m, a) for m, a in
+                                                         zip(tree.model_attributes, tree.attributes) if m != a)))
+        else:
+            raise SystemExit(1 if verify_model(weka, args.model, args.arff, args.limit) else 0)
+    finally:
+        weka.stop_jvm()
@@ -1,25 +1,288 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import javabridge
 import weka.core.jvm as jvm
 import weka.core.serialization as serialization
 from weka.core.converters import Loader
 import weka.core.dataset as ds
 from weka.core.dataset import Instances, Attribute, Instance
-from weka.classifiers import Classifier
+from weka.classifiers import Classifier, Evaluation
+from weka.core.classes import Random
 
 # Para poder utilizar esta clase ejecutar en un terminal los comandos:
 # pip install javabridge
 # pip install python-weka-wrapper==0.3.0
 
+# Nombres cortos de los clasificadores que se pueden entrenar; cualquier otro se
+# indica con su nombre de clase completo (weka.classifiers....)
+CLASSIFIERS = {
+	"RandomTree": "weka.classifiers.trees.RandomTree",
+	"J48": "weka.classifiers.trees.J48",
+	"REPTree": "weka.classifiers.trees.REPTree",
+	"RandomForest": "weka.classifiers.trees.RandomForest",
+	"NaiveBayes": "weka.classifiers.bayes.NaiveBayes",
+	"IBk": "weka.classifiers.lazy.IBk",
+}
+
+def classifier_name(name):
+	return CLASSIFIERS.get(name, name)
+
+# Registro de modelos cargados
+# Guarda, para cada par (modelo, arff), el clasificador deserializado y la cabecera
+# del arff (Instances sin filas). Se recarga una entrada cuando cambia el mtime de
+# alguno de sus ficheros y se descarta la menos usada (LRU) al superar max_models.
+#
+class ModelRegistry:
+
+	def __init__(self, max_models=4):
+		self.max_models = max_models
+		self.hits = 0
+		self.misses = 0
+		self.reloads = 0
+		self.evictions = 0
+		self._entries = OrderedDict()
+
+	# Devuelve (cls, header) para el par (modelName, arffName), cargandolo si hace falta
+	def get(self, modelName, arffName, debug=False):
+		key = (modelName, arffName)
+		mtimes = (os.path.getmtime(modelName), os.path.getmtime(arffName))
+		entry = self._entries.get(key)
+		if entry is not None:
+			if entry[0] == mtimes:
+				self.hits += 1
+				self._entries.move_to_end(key)
+				return entry[1], entry[2]
+			self.reloads += 1
+			del self._entries[key]
+		self.misses += 1
+
+		# Carga el arrf para conocer la estructura de las instancias y se queda solo con la cabecera
+		loader = Loader(classname="weka.core.converters.ArffLoader")
+		data = loader.load_file(arffName)
+		header = Instances.template_instances(data, 0)
+
+		# Carga del modelo generado en Weka
+		objects = serialization.read_all(modelName)
+		cls = Classifier(jobject=objects[0])
+
+		# La clase es la de la cabecera guardada con el modelo (GUI de Weka, Weka.train);
+		# sin ella se asume que es el ultimo atributo
+		header.class_index = self._class_index(header, objects)
+		if(debug):
+			print("Loaded model...")
+			print(cls)
+
+		self._entries[key] = (mtimes, cls, header)
+		while len(self._entries) > self.max_models:
+			self._entries.popitem(last=False)
+			self.evictions += 1
+		return cls, header
+
+	def _class_index(self, header, objects):
+		if len(objects) > 1:
+			training = Instances(jobject=objects[1])
+			if training.class_index >= 0:
+				name = training.class_attribute.name
+				for i in range(header.num_attributes):
+					if header.attribute(i).name == name:
+						return i
+		return header.num_attributes - 1
+
+	# Vacia el registro (por ejemplo antes de parar la JVM)
+	def clear(self):
+		self._entries.clear()
+
+	# Devuelve los contadores de aciertos/fallos del registro
+	def stats(self):
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"reloads": self.reloads,
+			"evictions": self.evictions,
+			"loaded": len(self._entries)
+		}
+
 class Weka:
 
+	# @param server: Ruta del socket de un inference_server.py; si se indica, las predicciones
+	#                se piden a ese proceso (que tiene la JVM y los modelos ya cargados)
+	#                y este objeto no arranca ninguna JVM
+	def __init__(self, max_models=4, server=None):
+		self.registry = ModelRegistry(max_models)
+		self.client = None
+		if server is not None:
+			from inference_server import InferenceClient
+			self.client = InferenceClient(server)
+		self.startup_seconds = None
+		self._starter = None
+		self._start_lock = threading.Lock()
+		self._ready = threading.Event()
+		self._start_error = None
+		self._attached = threading.local()
+		# Datos de entrenamiento cargados: (arffName, class_name) -> (mtime, Instances)
+		self._datasets = {}
+
 	# Arranca la maquina virtual de java
+	# @param background: Si es True arranca en un hilo aparte y vuelve inmediatamente
+	# @param preload: Pares (modelName, arffName) que se cargan y se predicen una vez
+	#                 con una instancia tonta para calentar la JVM antes del primer movimiento
 	#
-	def start_jvm(self):
-		jvm.start()
+	def start_jvm(self, background=False, preload=()):
+		if self.client is not None:
+			return
+		with self._start_lock:
+			if self._starter is not None:
+				return
+			if background:
+				self._starter = threading.Thread(target=self._start, args=(preload, True), name="weka-start", daemon=True)
+				self._starter.start()
+				return
+			self._starter = threading.current_thread()
+		self._start(preload)
+		if self._start_error is not None:
+			raise self._start_error
+
+	def _start(self, preload, background=False):
+		begin = time.perf_counter()
+		try:
+			jvm.start()
+			# El hilo que arranca la JVM queda registrado en ella
+			self._attached.value = True
+			for modelName, arffName in preload:
+				self.warm_up(modelName, arffName)
+		except Exception as error:
+			self._start_error = error
+		finally:
+			# El hilo en segundo plano termina aqui: se libera de la JVM antes de salir
+			if background and getattr(self._attached, "value", False):
+				javabridge.detach()
+				self._attached.value = False
+			self.startup_seconds = time.perf_counter() - begin
+			self._ready.set()
+
+	# Espera a que la JVM este lista (arrancandola si nadie lo ha hecho) y registra el hilo actual
+	def ensure_jvm(self):
+		if self.client is not None:
+			return
+		if not self._ready.is_set():
+			self.start_jvm()
+			self._ready.wait()
+		if self._start_error is not None:
+			raise self._start_error
+		if not getattr(self._attached, "value", False):
+			javabridge.attach()
+			self._attached.value = True
+
+	# Carga el modelo y la cabecera y realiza una prediccion con una instancia tonta
+	def warm_up(self, modelName, arffName):
+		cls, header = self.registry.get(modelName, arffName)
+		x = []
+		for i in range(header.num_attributes):
+			if i == header.class_index:
+				continue
+			attribute = header.attribute(i)
+			x.append(attribute.value(0) if attribute.is_nominal else 0)
+		self._predict(modelName, x, arffName)
 
 	# Para la maquina virtual de java
 	def stop_jvm(self):
+		if self.client is not None:
+			self.client.close()
+			return
+		# Nada que parar si nunca se llego a arrancar
+		if self._starter is None:
+			return
+		self._ready.wait()
+		if self._start_error is not None:
+			return
+		self.registry.clear()
+		self._datasets.clear()
+		# La JVM se para desde un hilo registrado en ella (el que la arranco en segundo
+		# plano ya no existe)
+		if not getattr(self._attached, "value", False):
+			javabridge.attach()
+			self._attached.value = True
 		jvm.stop()
 
+	# Registra el hilo actual en la JVM; necesario para predecir desde un hilo
+	# distinto del que la arranco (por ejemplo el de decision_pipeline.py)
+	def attach_thread(self):
+		self.ensure_jvm()
+
+	# Libera el hilo registrado con attach_thread antes de que termine (salvo el que
+	# arranco la JVM en primer plano, que sigue registrado hasta stop_jvm)
+	def detach_thread(self):
+		if self.client is None and getattr(self._attached, "value", False) and threading.current_thread() is not self._starter:
+			javabridge.detach()
+			self._attached.value = False
+
+	# Carga un arff completo para entrenar, con la clase indicada (por defecto el ultimo atributo)
+	# Se reutiliza mientras no cambie el fichero, asi un barrido no lo relee en cada configuracion
+	def load_data(self, arffName, class_name=None):
+		self.ensure_jvm()
+		key = (arffName, class_name)
+		mtime = os.path.getmtime(arffName)
+		entry = self._datasets.get(key)
+		if entry is not None and entry[0] == mtime:
+			return entry[1]
+		loader = Loader(classname="weka.core.converters.ArffLoader")
+		data = loader.load_file(arffName)
+		names = [data.attribute(i).name for i in range(data.num_attributes)]
+		if class_name is None:
+			class_name = names[-1]
+		if class_name not in names:
+			raise ValueError("%s no tiene el atributo %s" % (arffName, class_name))
+		data.class_index = names.index(class_name)
+		self._datasets[key] = (mtime, data)
+		return data
+
+	# Entrena un clasificador con todas las filas de un arff
+	# @param arffName: Log de la partida (o cualquier arff) con los datos de entrenamiento
+	# @param classifier: Nombre corto (RandomTree, J48...) o clase completa del clasificador
+	# @param options: Opciones del clasificador como en Weka, por ejemplo ["-depth", "7", "-K", "0"]
+	# @param modelName: Si se indica, se guarda el modelo (y la cabecera, como hace el GUI de Weka)
+	# @return cls: El clasificador entrenado
+	#
+	def train(self, arffName, classifier="RandomTree", options=(), modelName=None, class_name=None):
+		if self.client is not None:
+			raise RuntimeError("El entrenamiento necesita una JVM local, no un servidor de inferencia")
+		data = self.load_data(arffName, class_name)
+		cls = Classifier(classname=classifier_name(classifier), options=list(options))
+		cls.build_classifier(data)
+		if modelName is not None:
+			header = Instances.template_instances(data, 0)
+			serialization.write_all(modelName, [cls.jobject, header.jobject])
+		return cls
+
+	# Validacion cruzada de k particiones de un clasificador sobre un arff
+	# @return metrics: Diccionario con el porcentaje de aciertos, kappa, errores, la matriz de
+	#                  confusion (clase nominal) y los segundos empleados
+	#
+	def cross_validate(self, arffName, classifier="RandomTree", options=(), folds=10, seed=1, class_name=None):
+		if self.client is not None:
+			raise RuntimeError("La validacion cruzada necesita una JVM local, no un servidor de inferencia")
+		data = self.load_data(arffName, class_name)
+		begin = time.perf_counter()
+		cls = Classifier(classname=classifier_name(classifier), options=list(options))
+		evaluation = Evaluation(data)
+		evaluation.crossvalidate_model(cls, data, folds, Random(seed))
+		metrics = {
+			"instances": data.num_instances,
+			"mean_absolute_error": evaluation.mean_absolute_error,
+			"root_mean_squared_error": evaluation.root_mean_squared_error,
+		}
+		if data.class_attribute.is_nominal:
+			metrics["percent_correct"] = evaluation.percent_correct
+			metrics["kappa"] = evaluation.kappa
+			metrics["confusion_matrix"] = np.asarray(evaluation.confusion_matrix).tolist()
+		metrics["seconds"] = time.perf_counter() - begin
+		return metrics
+
 	# Predice el valor de la instancia pasada como parametro
 	# @param modelName: Nombre del fichero que contiene el modelo generado en weka
 	# @param x: La instancia que se pretende clasificar
@@ -27,28 +290,23 @@ class Weka:
 	# @return pred: La clase que predice
 	#
 	def predict(self, modelName, x, arffName, debug=False):
-		# Carga el arrf para conocer la estructura de las instancias
-		loader = Loader(classname="weka.core.converters.ArffLoader")
-		data = loader.load_file(arffName)
+		if self.client is not None:
+			return self.client.predict(modelName, x, arffName, debug)
+		self.ensure_jvm()
+		return self._predict(modelName, x, arffName, debug)
 
-		# Se asume que la clase es el ultimo atributo
-		data.class_is_last()
-
-		# Carga del modelo generado en Weka
-		objects = serialization.read_all(modelName)
-		cls = Classifier(jobject=objects[0])
-		if(debug): 
-			print("Loaded model...")
-			print(cls)
+	def _predict(self, modelName, x, arffName, debug=False):
+		# El modelo y la cabecera del arff se cargan una sola vez y se reutilizan
+		cls, data = self.registry.get(modelName, arffName, debug)
 
 		# Se crea la instancia correspondiente a la entrada y se clasifica
 		if(debug): print(("Input", x))
 
-		# Anyade un valor tonto para la clase de la instancia
+		# Anyade un valor tonto para la clase de la instancia, en su posicion
 		if data.class_attribute.is_nominal:
-			x.append('a')
+			x.insert(data.class_index, 'a')
 		else:
-			x.append(0)
+			x.insert(data.class_index, 0)
 		
 		# Convierte los valores nominales a la posicion entera que ocupa dentro de sus lista
 		for i in range(0, data.num_attributes):
@@ -66,6 +324,73 @@ class Weka:
 
 		return pred
 
+	# Predice la clase de todas las filas de una matriz en un unico Instances
+	# @param modelName: Nombre del fichero que contiene el modelo generado en weka
+	# @param X: Matriz 2-D (numpy o lista de listas) con una instancia por fila, sin la clase
+	# @param arffName: El nombre del fichero arff que se ha utilizado para generar el modelo en Weka
+	# @return preds: Array con la clase predicha para cada fila
+	#
+	def predict_batch(self, modelName, X, arffName, debug=False):
+		if self.client is not None:
+			return self.client.predict_batch(modelName, X, arffName, debug)
+		data, dists = self._distributions(modelName, X, arffName, debug)
+		if not data.class_attribute.is_nominal:
+			return dists[:, 0]
+		if len(dists) == 0:
+			return np.array([], dtype=object)
+		labels = np.array([data.class_attribute.value(j) for j in range(data.class_attribute.num_values)], dtype=object)
+		return labels[np.argmax(dists, axis=1)]
+
+	# Igual que predict_batch pero devuelve la distribucion de probabilidad de cada fila
+	# @return dists: Array (filas x valores de la clase)
+	#
+	def distribution_batch(self, modelName, X, arffName, debug=False):
+		if self.client is not None:
+			return self.client.distribution_batch(modelName, X, arffName, debug)
+		return self._distributions(modelName, X, arffName, debug)[1]
+
+	def _distributions(self, modelName, X, arffName, debug=False):
+		self.ensure_jvm()
+		cls, header = self.registry.get(modelName, arffName, debug)
+		if len(X) == 0:
+			# Sin filas no hay nada que clasificar (reshape(0, -1) no sabria el ancho)
+			num_values = header.class_attribute.num_values if header.class_attribute.is_nominal else 1
+			return header, np.empty((0, num_values))
+		batch = self._to_instances(header, X)
+		if(debug): print(("Batch", batch.num_instances))
+
+		# Si el clasificador lo permite se clasifica todo el lote en una sola llamada
+		if getattr(cls, "is_batchpredictor", False):
+			dists = np.asarray(cls.distributions_for_instances(batch), dtype=float)
+		else:
+			dists = np.array([cls.distribution_for_instance(batch.get_instance(i)) for i in range(batch.num_instances)], dtype=float)
+		return header, dists.reshape(batch.num_instances, -1)
+
+	# Construye un Instances con la estructura de header a partir de las filas de X
+	def _to_instances(self, header, X):
+		rows = list(X)
+		num_attributes = header.num_attributes
+		values = np.full((len(rows), num_attributes), np.nan)
+
+		# Convierte cada columna una sola vez; los nominales se traducen con un diccionario
+		# construido a partir de los valores del atributo en lugar de preguntar a la JVM por celda
+		for i in range(num_attributes):
+			if i == header.class_index:
+				continue
+			attribute = header.attribute(i)
+			# Las filas no traen la clase: los atributos que la siguen estan una posicion antes
+			column = [row[i - (i > header.class_index)] for row in rows]
+			if attribute.is_nominal:
+				index = {attribute.value(j): j for j in range(attribute.num_values)}
+				values[:, i] = [index[str(v)] for v in column]
+			else:
+				values[:, i] = np.asarray(column, dtype=float)
+
+		batch = Instances.template_instances(header, len(rows))
+		for row in values:
+			batch.add_instance(Instance.create_instance(row.tolist()))
+		return batch
+
 ################################# DEBUG ##############################################
 #weka = Weka()
 #weka.start_jvm()
@@ -0,0 +1,258 @@
+"""
+Training, cross-validation and hyperparameter sweeps for the Weka agents
+Builds .model files from a log instead of the Weka GUI, and evaluates
+classifier configurations with k-fold cross-validation. A sweep is the
+cartesian product of the values given with --param (e.g. depth, K and the
+seed S of RandomTree) and runs across a process pool where every worker
+starts its own JVM.
+
+Every result is cached under a key made of the sha256 of the dataset
+content and the classifier, its options, the folds, the CV seed and the
+class attribute, so re-running an unchanged sweep (or training an already
+trained configuration) only reads the cache. Editing the log changes its
+hash and invalidates the entries that used it.
+
+Usage:
+    python weka_training.py cv snake_game_log_hand.arff --classifier RandomTree --options "-depth 7"
+    python weka_training.py sweep snake_game_log_hand.arff --param depth=0,5,7,10 --param K=0,3,5 --param S=1,2,3
+    python weka_training.py sweep snake_game_log_hand.arff --classifier J48 --param C=0.1,0.25,0.5 --param M=2,5
+    python weka_training.py train snake_game_log_hand.arff --classifier J48 --options "-C 0.25 -M 2" --out j48.model
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import shlex
+import shutil
+import time
+from multiprocessing.util import Finalize
+
+from arff_reader import read_header
+from features import CLASS_NAME
+
+DEFAULT_CACHE = ".weka_cache"
+
+_weka = None
+_init_error = None
+
+
+def dataset_digest(path, block_size=1 << 20):
+    """sha256 of the file content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def class_attribute(arff, class_name=None):
+    """
+    Class attribute of a run: class_name, else New_direction when present, else the last attribute.
+    Weka.load_data is always given the resolved name (on its own it takes the last attribute).
+    """
+    with open(arff, "r") as file:
+        names = read_header(file).names
+    if class_name is None:
+        return CLASS_NAME if CLASS_NAME in names else names[-1]
+    if class_name not in names:
+        raise ValueError("%s has no attribute %r" % (arff, class_name))
+    return class_name
+
+
+def config_key(digest, classifier, options, **settings):
+    # Does not import wekaI, so fully cached runs never need javabridge
+    config = {"dataset": digest, "classifier": classifier, "options": list(options)}
+    config.update(settings)
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """One JSON file per cross-validation result and one .model file per trained model."""
+
+    def __init__(self, directory=DEFAULT_CACHE):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key, extension=".json"):
+        return os.path.join(self.directory, key + extension)
+
+    def get(self, key):
+        try:
+            with open(self.path(key)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        # Written under a temporary name so an interrupted sweep never leaves half a file
+        tmp = self.path(key, ".json.tmp")
+        with open(tmp, "w") as file:
+            json.dump(result, file)
+        os.replace(tmp, self.path(key))
+
+
+def expand_grid(base_options, params):
+    """
+    Option lists for every combination of params, a list of (name, values) pairs:
+    [("depth", ["5", "7"]), ("K", ["0", "3"])] -> 4 configurations.
+    """
+    names = [name for name, _ in params]
+    configs = []
+    for values in itertools.product(*[values for _, values in params]):
+        options = list(base_options)
+        for name, value in zip(names, values):
+            options += ["-" + name, value]
+        configs.append(options)
+    return configs
+
+
+def _init_worker():
+    # A failing initializer makes the pool respawn workers forever: keep the
+    # error and raise it from the tasks instead
+    global _weka, _init_error
+    try:
+        from wekaI import Weka
+        _weka = Weka()
+        _weka.start_jvm()
+        Finalize(None, _weka.stop_jvm, exitpriority=10)
+    except Exception as error:
+        _init_error = error
+
+
+def _cross_validate(task):
+    if _init_error is not None:
+        raise _init_error
+    key, arff, classifier, options, folds, seed, class_name = task
+    return key, _weka.cross_validate(arff, classifier, options, folds, seed, class_name)
+
+
+def sweep(arff, classifier="RandomTree", configs=((),), folds=10, seed=1, class_name=None, workers=None,
+          cache=None, progress=None):
+    """
+    Cross-validates every option list in configs and returns one dict per configuration
+    (options, metrics and whether it came from the cache), in the order of configs.
+    """
+    cache = cache or ResultCache()
+    # Keyed on the resolved name, never on "the default"
+    class_name = class_attribute(arff, class_name)
+    digest = dataset_digest(arff)
+    keys = [config_key(digest, classifier, options, folds=folds, seed=seed, class_name=class_name)
+            for options in configs]
+    results = {key: cache.get(key) for key in keys}
+    cached = {key for key, result in results.items() if result is not None}
+    tasks = [(key, arff, classifier, list(options), folds, seed, class_name)
+             for key, options in zip(keys, configs) if results[key] is None]
+    # Duplicated configurations are only evaluated once
+    tasks = list({task[0]: task for task in tasks}.values())
+
+    if tasks:
+        # Fail here rather than in every worker when javabridge or Weka is missing
+        import wekaI  # noqa: F401
+        workers = min(workers or os.cpu_count(), len(tasks))
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=_init_worker) as pool:
+            for key, metrics in pool.imap_unordered(_cross_validate, tasks):
+                # Stored as soon as it arrives: an interrupted sweep resumes where it stopped
+                cache.put(key, metrics)
+                results[key] = metrics
+                if progress is not None:
+                    progress(len([r for r in results.values() if r is not None]), len(results))
+            # Normal worker exit runs the finalizer that stops each JVM
+            pool.close()
+            pool.join()
+
+    return [{"options": list(options), "metrics": results[key], "cached": key in cached, "key": key}
+            for key, options in zip(keys, configs)]
+
+
+def train(arff, classifier="RandomTree", options=(), out=None, class_name=None, cache=None, weka=None):
+    """Trains on the whole file and writes the model to out; returns True when it came from the cache."""
+    cache = cache or ResultCache()
+    class_name = class_attribute(arff, class_name)
+    key = config_key(dataset_digest(arff), classifier, options, class_name=class_name, model=True)
+    cached = cache.path(key, ".model")
+    if os.path.exists(cached):
+        shutil.copyfile(cached, out)
+        return True
+
+    own = weka is None
+    if own:
+        from wekaI import Weka
+        weka = Weka()
+        weka.start_jvm()
+    try:
+        weka.train(arff, classifier, options, cached + ".tmp", class_name)
+        os.replace(cached + ".tmp", cached)
+    finally:
+        # Nothing half-written is left in the cache when training fails
+        if os.path.exists(cached + ".tmp"):
+            os.remove(cached + ".tmp")
+        if own:
+            weka.stop_jvm()
+    shutil.copyfile(cached, out)
+    return False
+
+
+def _score(result):
+    metrics = result["metrics"]
+    return metrics.get("percent_correct", -metrics["root_mean_squared_error"])
+
+
+def _print_results(results):
+    print("%-40s %9s %7s %8s %8s" % ("options", "correct", "kappa", "rmse", "seconds"))
+    for result in results:
+        metrics = result["metrics"]
+        print("%-40s %8.2f%% %7.3f %8.4f %8.1f%s" % (
+            " ".join(result["options"]) or "(defaults)", metrics.get("percent_correct", float("nan")),
+            metrics.get("kappa", float("nan")), metrics["root_mean_squared_error"], metrics["seconds"],
+            "  (cached)" if result["cached"] else ""))
+
+
+def _parse_param(text):
+    name, _, values = text.partition("=")
+    if not values:
+        raise argparse.ArgumentTypeError("Expected NAME=v1,v2,... got %r" % text)
+    return name.lstrip("-"), values.split(",")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train and cross-validate Weka classifiers on the game logs")
+    parser.add_argument("command", choices=["cv", "sweep", "train"])
+    parser.add_argument("arff")
+    parser.add_argument("--classifier", default="RandomTree", help="RandomTree, J48, ... or a full class name")
+    parser.add_argument("--options", default="",
+                        help='Weka options, e.g. "-depth 7 -K 0" (--options=-U for a single flag)')
+    parser.add_argument("--param", type=_parse_param, action="append", default=[], metavar="NAME=v1,v2",
+                        help="Swept option (repeat for a grid)")
+    parser.add_argument("--class", dest="class_name", default=None,
+                        help="Class attribute (default: New_direction, else the last one)")
+    parser.add_argument("--folds", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the cross-validation folds")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache", default=DEFAULT_CACHE)
+    parser.add_argument("--out", default=None, help="Model file for train")
+    parser.add_argument("--save-best", default=None, metavar="MODEL", help="Train the best swept configuration")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache)
+    base = shlex.split(args.options)
+    start = time.perf_counter()
+    if args.command == "train":
+        out = args.out or os.path.splitext(os.path.basename(args.arff))[0] + ".model"
+        hit = train(args.arff, args.classifier, base, out, args.class_name, cache)
+        print("Wrote %s%s in %.2fs" % (out, " (cached)" if hit else "", time.perf_counter() - start))
+    else:
+        configs = expand_grid(base, args.param) if args.command == "sweep" else [base]
+        results = sweep(args.arff, args.classifier, configs, args.folds, args.seed, args.class_name,
+                        args.workers, cache, progress=lambda done, total: print("[%d/%d]" % (done, total)))
+        results.sort(key=_score, reverse=True)
+        _print_results(results)
+        print("%d configurations (%d cached) in %.2fs"
+              % (len(results), sum(r["cached"] for r in results), time.perf_counter() - start))
+        if args.save_best:
+            best = results[0]["options"]
+            hit = train(args.arff, args.classifier, best, args.save_best, args.class_name, cache)
+            print("Wrote %s (%s)%s" % (args.save_best, " ".join(best), " (cached)" if hit else ""))